@@ -3,6 +3,10 @@ Configuration des badges pour le système de réputation BLIZZ
 Focus uniquement sur les vendeurs - Badges visuels personnalisés
 """
 
+from bisect import bisect_right
+from functools import lru_cache
+from types import MappingProxyType
+
 # Définir les badges vendeurs uniquement (insignes IA sans texte pour compatibilité internationale)
 SELLER_BADGES = [
     {
@@ -72,20 +76,18 @@ BADGE_TRANSLATIONS = {
     }
 }
 
+# Seuils précompilés (triés) pour la recherche binaire du badge
+SELLER_BADGE_THRESHOLDS = [badge['min_score'] for badge in SELLER_BADGES]
+
+def get_seller_badge_index(score):
+    """Retourne l'indice dans SELLER_BADGES du badge correspondant au score"""
+    if score is None or score < 0:
+        return 0  # Bronze par défaut
+    return max(bisect_right(SELLER_BADGE_THRESHOLDS, score) - 1, 0)
+
 def get_seller_badge(score):
     """Retourne le badge approprié selon le score vendeur"""
-    if score is None or score < 0:
-        return SELLER_BADGES[0]  # Bronze par défaut
-    
-    # Trouver le badge le plus élevé correspondant au score
-    appropriate_badge = SELLER_BADGES[0]
-    for badge in SELLER_BADGES:
-        if score >= badge['min_score']:
-            appropriate_badge = badge
-        else:
-            break
-    
-    return appropriate_badge
+    return SELLER_BADGES[get_seller_badge_index(score)]
 
 def get_badge_by_level(level):
     """Retourne un badge par son niveau"""
@@ -100,12 +102,13 @@ def get_translated_badge_name(badge, language='fr'):
         return BADGE_TRANSLATIONS[language][badge['level']]
     return badge['name']  # Fallback vers le nom français par défaut
 
+@lru_cache(maxsize=None)
+def get_translated_badge(index, language='fr'):
+    """Retourne un badge traduit partagé et immuable (mis en cache par processus)"""
+    badge = SELLER_BADGES[index]
+    translated_badge = dict(badge, name=get_translated_badge_name(badge, language))
+    return MappingProxyType(translated_badge)
+
 def get_seller_badge_with_translation(score, language='fr'):
-    """Retourne le badge avec le nom traduit selon la langue"""
-    badge = get_seller_badge(score)
-    if badge:
-        # Créer une copie du badge avec le nom traduit
-        translated_badge = badge.copy()
-        translated_badge['name'] = get_translated_badge_name(badge, language)
-        return translated_badge
-    return badge
+    """Retourne le badge avec le nom traduit selon la langue (objet partagé en lecture seule)"""
+    return get_translated_badge(get_seller_badge_index(score), language)
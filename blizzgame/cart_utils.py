@@ -0,0 +1,211 @@
+"""
+Utilitaires du panier de la boutique BLIZZ
+Totaux calculés en base (une requête), dénormalisés sur Cart, badge servi depuis la session
+et passage de commande atomique (réservation du stock, lignes créées en masse)
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .inventory_utils import reserve_stock
+from .models import Cart, CartItem, Order, OrderItem
+
+# Nombre d'articles mis en cache dans la session pour le badge de navigation
+CART_COUNT_SESSION_KEY = 'cart_count'
+# Panier anonyme à fusionner lors de la connexion
+CART_ID_SESSION_KEY = 'cart_id'
+# Paniers inactifs supprimés par la commande cleanup_abandoned_carts
+ABANDONED_CART_DAYS = getattr(settings, 'ABANDONED_CART_DAYS', 30)
+
+LINE_TOTAL = F('price') * F('quantity')
+
+
+def _latest_cart(carts):
+    return carts.order_by('-updated_at').first()
+
+
+def get_cart(request):
+    """Panier courant, sans aucune écriture ; None tant que le visiteur n'a rien ajouté"""
+    if request.user.is_authenticated:
+        return _latest_cart(Cart.objects.filter(user=request.user))
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+    return _latest_cart(Cart.objects.filter(session_key=session_key, user__isnull=True))
+
+
+def get_or_create_cart(request):
+    """Panier courant, créé au premier ajout (ni session ni ligne Cart pour une simple visite)"""
+    cart = get_cart(request)
+    if cart is not None:
+        return cart
+    if request.user.is_authenticated:
+        return Cart.objects.create(user=request.user)
+    if not request.session.session_key:
+        request.session.create()
+    cart = Cart.objects.create(session_key=request.session.session_key)
+    # La clé de session change à la connexion : l'identifiant du panier permet de le retrouver
+    request.session[CART_ID_SESSION_KEY] = str(cart.pk)
+    return cart
+
+
+def merge_session_cart(request, user):
+    """
+    Rattache le panier anonyme à l'utilisateur qui vient de se connecter. S'il a déjà un
+    panier, les lignes communes sont cumulées (bulk_update) et les autres déplacées en un
+    seul UPDATE, puis le panier anonyme est supprimé. Nombre de requêtes constant.
+    """
+    cart_id = request.session.pop(CART_ID_SESSION_KEY, None)
+    if not cart_id:
+        return None
+    with transaction.atomic():
+        anonymous = Cart.objects.filter(pk=cart_id, user__isnull=True).first()
+        if anonymous is None:
+            return None
+        target = _latest_cart(Cart.objects.filter(user=user))
+        if target is None:
+            Cart.objects.filter(pk=anonymous.pk).update(user=user, session_key=None, updated_at=timezone.now())
+            return anonymous
+
+        incoming = list(anonymous.items.all())
+        existing = {
+            (item.product_id, item.variant_id): item
+            for item in target.items.filter(product_id__in={item.product_id for item in incoming})
+        }
+        merged, moved = [], []
+        for item in incoming:
+            current = existing.get((item.product_id, item.variant_id))
+            if current is None:
+                moved.append(item.pk)
+            else:
+                current.quantity += item.quantity
+                merged.append(current)
+        if merged:
+            CartItem.objects.bulk_update(merged, ['quantity'])
+        if moved:
+            CartItem.objects.filter(pk__in=moved).update(cart=target)
+        anonymous.delete()
+        refresh_cart_totals(target)
+    return target
+
+
+def compute_cart_totals(cart_id):
+    """Retourne (nombre d'articles, montant total) en un seul agrégat"""
+    totals = CartItem.objects.filter(cart_id=cart_id).aggregate(
+        total_items=Sum('quantity'),
+        total_price=Sum(LINE_TOTAL, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    return totals['total_items'] or 0, totals['total_price'] or 0
+
+
+def refresh_cart_totals(cart):
+    """
+    Recalcule les totaux dénormalisés du panier dans un unique UPDATE à sous-requêtes,
+    sans fenêtre entre lecture et écriture, puis recharge les champs de l'instance.
+    """
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    Cart.objects.filter(pk=cart.pk).update(
+        updated_at=timezone.now(),
+        items_count=Coalesce(Subquery(lines.annotate(total=Sum('quantity')).values('total')), 0),
+        total_price=Coalesce(
+            Subquery(lines.annotate(
+                total=Sum(LINE_TOTAL, output_field=DecimalField(max_digits=12, decimal_places=2))
+            ).values('total')),
+            Value(0), output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+    cart.refresh_from_db(fields=['items_count', 'total_price', 'updated_at'])
+    return cart
+
+
+def remember_cart_count(request, cart):
+    # Évite une écriture de session quand le compteur n'a pas changé
+    if request.session.get(CART_COUNT_SESSION_KEY) != cart.items_count:
+        request.session[CART_COUNT_SESSION_KEY] = cart.items_count
+
+
+def forget_cart_count(request):
+    request.session.pop(CART_COUNT_SESSION_KEY, None)
+
+
+def get_cart_count(request):
+    """
+    Nombre d'articles du badge : lu dans la session ; en son absence (nouvelle session,
+    connexion), une seule lecture du compteur dénormalisé qui est ensuite mémorisée.
+    """
+    count = request.session.get(CART_COUNT_SESSION_KEY)
+    if count is not None:
+        return count
+    if not request.user.is_authenticated and not request.session.session_key:
+        return 0
+    cart = get_cart(request)
+    count = cart.items_count if cart is not None else 0
+    request.session[CART_COUNT_SESSION_KEY] = count
+    return count
+
+
+def get_cart_items(cart):
+    """Lignes du panier avec produit et variante chargés pour l'affichage"""
+    return list(cart.items.select_related('product', 'variant').order_by('created_at'))
+
+
+# ===== Passage de commande =====
+
+def place_order(cart, user, customer):
+    """
+    Transforme le panier en commande en une seule transaction : lignes chargées avec
+    produit et variante, commande créée, stock réservé, lignes créées (bulk_create), panier vidé.
+    customer contient les champs client et livraison de Order. Lève OutOfStock.
+    """
+    with transaction.atomic():
+        lines = get_cart_items(cart)
+        subtotal = sum((line.get_total_price() for line in lines), 0)
+        order = Order.objects.create(
+            user=user if user is not None and user.is_authenticated else None,
+            subtotal=subtotal,
+            total_amount=subtotal,
+            **customer,
+        )
+        reserve_stock(order, lines)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line.product,
+                variant=line.variant,
+                product_name=line.product.name,
+                product_price=line.price,
+                quantity=line.quantity,
+                total_price=line.get_total_price(),
+            )
+            for line in lines
+        ])
+        cart.items.all().delete()
+        Cart.objects.filter(pk=cart.pk).update(items_count=0, total_price=0)
+        cart.items_count, cart.total_price = 0, 0
+    return order
+
+
+# ===== Paniers abandonnés =====
+
+def abandoned_carts(days=ABANDONED_CART_DAYS, include_users=False):
+    """Paniers non modifiés depuis days jours (anonymes seulement par défaut)"""
+    carts = Cart.objects.filter(updated_at__lt=timezone.now() - timedelta(days=days))
+    if not include_users:
+        carts = carts.filter(user__isnull=True)
+    return carts
+
+
+def delete_carts_in_batches(carts, batch_size=1000):
+    """Supprime les paniers par lots d'identifiants pour garder des transactions courtes"""
+    deleted = 0
+    while True:
+        ids = list(carts.order_by('updated_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id__in=ids).delete()
+            Cart.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
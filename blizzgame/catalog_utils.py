@@ -0,0 +1,442 @@
+"""
+Utilitaires du catalogue de la boutique BLIZZ
+Navigation à facettes : arbre des catégories (chemin matérialisé, cache par processus), tranches de prix, tags, attributs des variantes
+et disponibilité, avec le nombre de produits de chaque valeur calculé par agrégats SQL
+"""
+
+import threading
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from .models import Product, ProductCategory, ProductFacetValue, ProductImage, ProductVariant
+from .search_utils import product_text_filter
+
+TAG_FACET = 'tag'
+ATTRIBUTE_FACET_PREFIX = 'attr:'
+FACET_VALUE_MAX_LENGTH = ProductFacetValue._meta.get_field('value').max_length
+
+# (clé, libellé, borne basse incluse, borne haute exclue) en FCFA
+PRICE_BUCKETS = getattr(settings, 'SHOP_PRICE_BUCKETS', [
+    ('0-5000', 'Moins de 5 000 FCFA', None, 5000),
+    ('5000-15000', '5 000 - 15 000 FCFA', 5000, 15000),
+    ('15000-30000', '15 000 - 30 000 FCFA', 15000, 30000),
+    ('30000-60000', '30 000 - 60 000 FCFA', 30000, 60000),
+    ('60000+', 'Plus de 60 000 FCFA', 60000, None),
+])
+
+PRODUCT_SORTS = {
+    'name': 'name',
+    '-name': '-name',
+    'price': 'price',
+    '-price': '-price',
+    'created_at': 'created_at',
+    '-created_at': '-created_at',
+    # Valeurs historiques du gabarit des catégories
+    'price_asc': 'price',
+    'price_desc': '-price',
+}
+
+# Nombre maximal de valeurs affichées pour les tags et chaque attribut
+FACET_VALUES_LIMIT = 20
+
+IN_STOCK_Q = Q(stock__isnull=True) | Q(stock__gt=0)
+
+# Galerie des produits affichés en liste : une requête pour toute la page, dans l'ordre d'affichage
+PRODUCT_IMAGES_PREFETCH = Prefetch('images', queryset=ProductImage.objects.order_by('order', 'created_at'))
+
+
+def with_images(products):
+    """Précharge les images d'un queryset de produits (get_main_image, carrousel)"""
+    return products.prefetch_related(PRODUCT_IMAGES_PREFETCH)
+
+
+# ===== Index des facettes =====
+
+def product_facet_rows(product, variants):
+    """Valeurs de facettes d'un produit : ses tags et les attributs de ses variantes actives"""
+    rows = set()
+    for tag in product.tags or []:
+        if isinstance(tag, str) and tag.strip():
+            rows.add((TAG_FACET, tag.strip()[:FACET_VALUE_MAX_LENGTH]))
+    for variant in variants:
+        if variant.is_active and variant.value:
+            rows.add((f'{ATTRIBUTE_FACET_PREFIX}{variant.name}'[:110], variant.value[:FACET_VALUE_MAX_LENGTH]))
+    return rows
+
+
+def index_product_facets(product_id):
+    """Reconstruit l'index des facettes d'un produit"""
+    product = Product.objects.filter(pk=product_id).first()
+    with transaction.atomic():
+        ProductFacetValue.objects.filter(product_id=product_id).delete()
+        if product is None:
+            return
+        rows = product_facet_rows(product, ProductVariant.objects.filter(product=product))
+        ProductFacetValue.objects.bulk_create([
+            ProductFacetValue(product=product, facet=facet, value=value) for facet, value in rows
+        ])
+
+
+def rebuild_facet_index(batch_size=500):
+    """Reconstruit l'index complet ; retourne le nombre de valeurs indexées"""
+    variants = defaultdict(list)
+    for variant in ProductVariant.objects.filter(is_active=True):
+        variants[variant.product_id].append(variant)
+    total = 0
+    with transaction.atomic():
+        ProductFacetValue.objects.all().delete()
+        batch = []
+        for product in Product.objects.only('id', 'tags').iterator(chunk_size=batch_size):
+            batch.extend(
+                ProductFacetValue(product_id=product.pk, facet=facet, value=value)
+                for facet, value in product_facet_rows(product, variants[product.pk])
+            )
+            if len(batch) >= batch_size:
+                ProductFacetValue.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        ProductFacetValue.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+# ===== Arbre des catégories =====
+
+CATEGORY_TREE_VERSION_KEY = 'catalog:category_tree_version'
+
+
+class CategoryTree:
+    """
+    Arbre complet des catégories chargé en une requête. Une catégorie est visible si elle et
+    tous ses ancêtres sont actifs ; ancêtres et sous-arbres se lisent sur le chemin matérialisé.
+    Les instances sont partagées entre requêtes : à traiter en lecture seule.
+    """
+
+    def __init__(self, categories):
+        self.by_id = {category.pk: category for category in categories}
+        self.children = defaultdict(list)
+        for category in sorted(categories, key=lambda c: c.name):
+            self.children[category.parent_id].append(category)
+        self.visible = {
+            category.pk for category in categories
+            if all(pk in self.by_id and self.by_id[pk].is_active for pk in self.path_ids(category))
+        }
+        self.by_slug = {category.slug: category for category in categories if category.pk in self.visible}
+
+    @staticmethod
+    def path_ids(category):
+        """Identifiants de la racine jusqu'à la catégorie incluse"""
+        return [uuid.UUID(segment) for segment in category.path.split('/') if segment]
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def visible_children(self, parent_id):
+        return [category for category in self.children.get(parent_id, []) if category.pk in self.visible]
+
+    def ancestors(self, category):
+        """Fil d'Ariane : catégories parentes, de la racine au parent direct"""
+        return [self.by_id[pk] for pk in self.path_ids(category)[:-1]]
+
+    def descendant_ids(self, category):
+        """La catégorie et ses sous-catégories visibles"""
+        ids, stack = [], [category]
+        while stack:
+            current = stack.pop()
+            ids.append(current.pk)
+            stack.extend(self.visible_children(current.pk))
+        return ids
+
+    def products_q(self, category, prefix='category__'):
+        """
+        Produits de la catégorie et de ses descendants : intervalle sur le chemin (index),
+        moins les sous-arbres masqués par une catégorie inactive
+        """
+        q = Q(**{f'{prefix}{key}': value for key, value in ProductCategory.subtree_range(category.path).items()})
+        for pk in self.descendant_ids(category):
+            for child in self.children.get(pk, []):
+                if child.pk not in self.visible:
+                    q &= ~Q(**{f'{prefix}{key}': value for key, value in ProductCategory.subtree_range(child.path).items()})
+        return q
+
+    def rollup(self, own_counts):
+        """Comptes par catégorie visible, sous-catégories comprises, à partir des comptes propres"""
+        totals = defaultdict(int)
+        for category_id, count in own_counts.items():
+            category = self.by_id.get(category_id)
+            if category is None or category_id not in self.visible:
+                continue
+            for pk in self.path_ids(category):
+                totals[pk] += count
+        return totals
+
+
+class CategoryTreeCache:
+    """
+    Cache de l'arbre dans chaque processus. Il est rechargé quand la version partagée
+    (cache Django) change ; invalidate() la renouvelle après chaque modification de catégorie.
+    """
+
+    def __init__(self):
+        self._tree = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = cache.get_or_set(CATEGORY_TREE_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+        with self._lock:
+            if self._tree is not None and self._version == version:
+                return self._tree
+        # La version est lue avant le chargement : une modification concurrente forcera un rechargement
+        tree = CategoryTree(list(ProductCategory.objects.all()))
+        with self._lock:
+            self._tree, self._version = tree, version
+        return tree
+
+    def invalidate(self):
+        cache.set(CATEGORY_TREE_VERSION_KEY, uuid.uuid4().hex, None)
+        with self._lock:
+            self._tree = None
+
+
+category_tree_cache = CategoryTreeCache()
+
+
+def get_category_tree():
+    return category_tree_cache.get()
+
+
+def invalidate_category_tree():
+    category_tree_cache.invalidate()
+
+
+def top_categories(limit=None):
+    """
+    Catégories racines visibles avec leur nombre de sous-catégories et de produits actifs,
+    descendants compris : l'arbre vient du cache, les produits d'un seul GROUP BY
+    """
+    tree = get_category_tree()
+    totals = tree.rollup(dict(
+        Product.objects.filter(status='active').order_by().values_list('category_id').annotate(count=Count('pk'))
+    ))
+    roots = tree.visible_children(None)[:limit]
+    return [{
+        'slug': category.slug,
+        'name': category.name,
+        'description': category.description,
+        'image': category.image,
+        'subcategories_count': len(tree.visible_children(category.pk)),
+        'products_count': totals.get(category.pk, 0),
+    } for category in roots]
+
+
+# ===== Filtres =====
+
+def _decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def parse_catalog_filters(params, category=None):
+    """Filtres de navigation lus depuis les paramètres GET (plusieurs valeurs = OU)"""
+    attributes = defaultdict(set)
+    for raw in params.getlist('attr'):
+        name, _, value = raw.partition(':')
+        if name and value:
+            attributes[name].add(value)
+    buckets = {key for key, *_ in PRICE_BUCKETS}
+    return {
+        'q': (params.get('q') or '').strip(),
+        'category': category.slug if category else (params.get('category') or ''),
+        'min_price': _decimal(params.get('min_price') or params.get('price_min')),
+        'max_price': _decimal(params.get('max_price') or params.get('price_max')),
+        'price_buckets': [key for key in params.getlist('price') if key in buckets],
+        'tags': sorted(set(params.getlist('tag'))),
+        'attributes': {name: sorted(values) for name, values in attributes.items()},
+        'featured': params.get('featured') == '1',
+        'in_stock': params.get('in_stock') == '1',
+        'sort': params.get('sort') if params.get('sort') in PRODUCT_SORTS else '-created_at',
+    }
+
+
+def _price_bucket_q(key):
+    for bucket_key, _, low, high in PRICE_BUCKETS:
+        if bucket_key == key:
+            q = Q()
+            if low is not None:
+                q &= Q(price__gte=low)
+            if high is not None:
+                q &= Q(price__lt=high)
+            return q
+    return Q()
+
+
+def _facet_filter(facet, values):
+    return Q(pk__in=ProductFacetValue.objects.filter(facet=facet, value__in=values).values('product'))
+
+
+def filter_products(filters, tree, skip=()):
+    """
+    Produits actifs correspondant aux filtres, en ignorant ceux de skip : une facette est
+    comptée sans son propre filtre pour que ses autres valeurs restent proposées.
+    """
+    products = product_text_filter(Product.objects.filter(status='active'), filters['q'])
+
+    if 'category' not in skip and filters['category']:
+        category = tree.get(filters['category'])
+        if category is None:
+            return products.none()
+        products = products.filter(tree.products_q(category))
+
+    if 'price' not in skip:
+        if filters['min_price'] is not None:
+            products = products.filter(price__gte=filters['min_price'])
+        if filters['max_price'] is not None:
+            products = products.filter(price__lte=filters['max_price'])
+        if filters['price_buckets']:
+            bucket_q = Q()
+            for key in filters['price_buckets']:
+                bucket_q |= _price_bucket_q(key)
+            products = products.filter(bucket_q)
+
+    if 'tags' not in skip and filters['tags']:
+        products = products.filter(_facet_filter(TAG_FACET, filters['tags']))
+
+    for name, values in filters['attributes'].items():
+        if f'attr:{name}' not in skip:
+            products = products.filter(_facet_filter(f'{ATTRIBUTE_FACET_PREFIX}{name}', values))
+
+    if 'featured' not in skip and filters['featured']:
+        products = products.filter(is_featured=True)
+    if 'in_stock' not in skip and filters['in_stock']:
+        products = products.filter(IN_STOCK_Q)
+    return products
+
+
+# ===== Comptes par facette =====
+
+def _category_facet(filters, tree):
+    """Arbre des catégories avec le nombre de produits, sous-catégories comprises (un GROUP BY)"""
+    totals = tree.rollup(dict(
+        filter_products(filters, tree, skip={'category'})
+        .order_by().values_list('category_id').annotate(count=Count('pk'))
+    ))
+    entries = []
+
+    def walk(parent_id):
+        for category in tree.visible_children(parent_id):
+            count = totals.get(category.pk, 0)
+            if count or category.slug == filters['category']:
+                entries.append({
+                    'slug': category.slug,
+                    'name': category.name,
+                    'depth': category.depth,
+                    'count': count,
+                    'selected': category.slug == filters['category'],
+                })
+                walk(category.pk)
+
+    walk(None)
+    return entries
+
+
+def _price_facet(filters, tree):
+    """Nombre de produits par tranche de prix en un seul agrégat conditionnel"""
+    counts = filter_products(filters, tree, skip={'price'}).aggregate(**{
+        f'bucket_{index}': Count('pk', filter=_price_bucket_q(key))
+        for index, (key, *_) in enumerate(PRICE_BUCKETS)
+    })
+    return [
+        {
+            'key': key,
+            'label': label,
+            'count': counts[f'bucket_{index}'],
+            'selected': key in filters['price_buckets'],
+        }
+        for index, (key, label, *_) in enumerate(PRICE_BUCKETS)
+    ]
+
+
+def _value_counts(filters, tree, facet_filter, skip):
+    """GROUP BY (facette, valeur) sur l'index pour les produits filtrés"""
+    products = filter_products(filters, tree, skip=skip)
+    return (
+        ProductFacetValue.objects.filter(facet_filter, product__in=products.values('pk'))
+        .values('facet', 'value')
+        .annotate(count=Count('product', distinct=True))
+        .order_by('facet', '-count', 'value')
+    )
+
+
+def _tag_facet(filters, tree):
+    rows = _value_counts(filters, tree, Q(facet=TAG_FACET), skip={'tags'})[:FACET_VALUES_LIMIT]
+    return [
+        {'value': row['value'], 'count': row['count'], 'selected': row['value'] in filters['tags']}
+        for row in rows
+    ]
+
+
+def _attribute_facets(filters, tree):
+    """
+    Attributs des variantes. Sans attribut sélectionné, une seule requête couvre tous les
+    attributs ; chaque attribut sélectionné est recompté sans son propre filtre.
+    """
+    selected = filters['attributes']
+    rows = list(_value_counts(
+        filters, tree,
+        Q(facet__startswith=ATTRIBUTE_FACET_PREFIX) & ~Q(facet__in=[f'{ATTRIBUTE_FACET_PREFIX}{n}' for n in selected]),
+        skip=set(),
+    ))
+    for name in selected:
+        facet = f'{ATTRIBUTE_FACET_PREFIX}{name}'
+        rows.extend(_value_counts(filters, tree, Q(facet=facet), skip={facet}))
+
+    grouped = defaultdict(list)
+    for row in rows:
+        name = row['facet'][len(ATTRIBUTE_FACET_PREFIX):]
+        if len(grouped[name]) < FACET_VALUES_LIMIT:
+            grouped[name].append({
+                'value': row['value'],
+                'param': f"{name}:{row['value']}",
+                'count': row['count'],
+                'selected': row['value'] in selected.get(name, ()),
+            })
+    return [{'name': name, 'values': values} for name, values in sorted(grouped.items())]
+
+
+def _flag_facets(filters, tree):
+    """Produits mis en avant et en stock, en un seul agrégat"""
+    products = filter_products(filters, tree, skip={'featured', 'in_stock'})
+    featured_q, in_stock_q = Q(is_featured=True), IN_STOCK_Q
+    counts = products.aggregate(
+        featured=Count('pk', filter=featured_q & (in_stock_q if filters['in_stock'] else Q())),
+        in_stock=Count('pk', filter=in_stock_q & (featured_q if filters['featured'] else Q())),
+    )
+    return {
+        'featured': {'count': counts['featured'], 'selected': filters['featured']},
+        'in_stock': {'count': counts['in_stock'], 'selected': filters['in_stock']},
+    }
+
+
+def browse_catalog(params, category=None):
+    """
+    Recherche à facettes. Retourne (produits triés, filtres, facettes) ; les produits sont un
+    queryset à paginer, les facettes quelques requêtes d'agrégat indépendantes du nombre de produits.
+    """
+    tree = get_category_tree()
+    filters = parse_catalog_filters(params, category)
+    products = with_images(filter_products(filters, tree).order_by(PRODUCT_SORTS[filters['sort']], '-pk'))
+    facets = {
+        'categories': _category_facet(filters, tree),
+        'prices': _price_facet(filters, tree),
+        'tags': _tag_facet(filters, tree),
+        'attributes': _attribute_facets(filters, tree),
+        **_flag_facets(filters, tree),
+    }
+    return products, filters, facets
@@ -0,0 +1,130 @@
+"""
+Passerelle WebSocket du chat BLIZZ (ASGI)
+Une connexion par discussion : /ws/chat/<private|group|transaction>/<uuid>/
+Le serveur pousse les événements « message », « presence » et « resync » ;
+le client peut envoyer {"type": "ping"} pour maintenir la connexion.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from http.cookies import CookieError, SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.http.request import validate_host
+from .chat_utils import ChatSubscription, chat_channel, get_chat_broker, user_can_access_chat
+
+logger = logging.getLogger(__name__)
+
+CHAT_SOCKET_PATH_RE = re.compile(
+    r'^/ws/chat/(?P<kind>private|group|transaction)/(?P<chat_id>[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12})/$'
+)
+
+# Codes de fermeture applicatifs (plage 4000-4999)
+CLOSE_NOT_FOUND = 4404
+CLOSE_FORBIDDEN = 4403
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin1')
+    return None
+
+
+def _origin_allowed(scope):
+    """Refuse les connexions ouvertes depuis un autre site (le cookie de session serait envoyé)"""
+    origin = _header(scope, b'origin')
+    if origin is None:
+        return True
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    return validate_host(urlparse(origin).hostname or '', allowed_hosts)
+
+
+def _get_scope_user(scope):
+    """Retrouve l'utilisateur à partir du cookie de session de la poignée de main"""
+    cookies = SimpleCookie()
+    try:
+        cookies.load(_header(scope, b'cookie') or '')
+    except CookieError:
+        return AnonymousUser()
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return AnonymousUser()
+    engine = import_module(settings.SESSION_ENGINE)
+    return get_user(SimpleNamespace(session=engine.SessionStore(morsel.value)))
+
+
+@sync_to_async
+def _authorize(scope, kind, chat_id):
+    user = _get_scope_user(scope)
+    if user_can_access_chat(user, kind, chat_id):
+        return user
+    return None
+
+
+async def _pump(subscription, send):
+    """Envoie au client les événements de sa file, dans l'ordre"""
+    while True:
+        event = await subscription.queue.get()
+        await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+
+async def _reject(send, code):
+    """
+    Accepte puis ferme avec le code applicatif : un refus avant l'acceptation arrive au
+    navigateur comme une poignée de main échouée (1006) et le client ne saurait pas se replier
+    """
+    await send({'type': 'websocket.accept'})
+    await send({'type': 'websocket.close', 'code': code})
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    match = CHAT_SOCKET_PATH_RE.match(scope['path'])
+    if not match:
+        await _reject(send, CLOSE_NOT_FOUND)
+        return
+    kind, chat_id = match.group('kind'), match.group('chat_id')
+
+    user = await _authorize(scope, kind, chat_id) if _origin_allowed(scope) else None
+    if user is None:
+        await _reject(send, CLOSE_FORBIDDEN)
+        return
+
+    await send({'type': 'websocket.accept'})
+    broker = get_chat_broker()
+    channel = chat_channel(kind, chat_id)
+    subscription = ChatSubscription(asyncio.get_running_loop())
+    broker.subscribe(channel, subscription, user.pk)
+    pump = asyncio.create_task(_pump(subscription, send))
+
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] != 'websocket.receive':
+                continue
+            try:
+                data = json.loads(event.get('text') or '{}')
+            except ValueError:
+                continue
+            if data.get('type') == 'ping':
+                subscription.deliver({'type': 'pong'})
+    except Exception as e:
+        logger.error(f"Erreur WebSocket sur {channel}: {e}")
+    finally:
+        broker.unsubscribe(channel, subscription, user.pk)
+        pump.cancel()
@@ -0,0 +1,454 @@
+"""
+Utilitaires du chat BLIZZ
+Contrôle d'accès, historique incrémental, lecture, boîte de réception
+et diffusion en temps réel (publication/abonnement)
+"""
+
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import (
+    Chat, Group, GroupMembership, GroupMessage, InboxEntry, Message, PrivateConversation, PrivateMessage
+)
+from .search_utils import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Types de discussion diffusés : conversation privée, groupe, chat de transaction
+CHAT_KINDS = ('private', 'group', 'transaction')
+
+# Nombre d'événements en attente par connexion avant resynchronisation forcée
+CHAT_SOCKET_QUEUE_SIZE = getattr(settings, 'CHAT_SOCKET_QUEUE_SIZE', 100)
+
+# Durée maximale (secondes) d'une requête d'historique en attente (long-poll)
+CHAT_LONG_POLL_TIMEOUT = getattr(settings, 'CHAT_LONG_POLL_TIMEOUT', 25)
+
+CHAT_HISTORY_LIMIT = 50
+
+INBOX_PREVIEW_LENGTH = InboxEntry._meta.get_field('last_message_preview').max_length
+
+
+def chat_channel(kind, chat_id):
+    return f'{kind}:{chat_id}'
+
+
+def get_or_create_conversation(user_a, user_b):
+    """
+    Conversation privée entre deux utilisateurs : une recherche sur la paire canonique
+    (plus petit id, plus grand id) couverte par l'index unique. Création sûre en concurrence :
+    get_or_create relit la ligne si une insertion simultanée viole la contrainte d'unicité.
+    """
+    user1, user2 = sorted((user_a, user_b), key=lambda user: user.pk)
+    conversation, _ = PrivateConversation.objects.get_or_create(user1=user1, user2=user2)
+    return conversation
+
+
+def user_can_access_chat(user, kind, chat_id):
+    """Vérifie que l'utilisateur participe à la discussion"""
+    if not user.is_authenticated:
+        return False
+    if kind == 'private':
+        return PrivateConversation.objects.filter(Q(user1=user) | Q(user2=user), id=chat_id).exists()
+    if kind == 'group':
+        return GroupMembership.objects.filter(group_id=chat_id, user=user, is_active=True).exists()
+    if kind == 'transaction':
+        return Chat.objects.filter(
+            Q(transaction__buyer=user) | Q(transaction__seller=user), id=chat_id
+        ).exists()
+    return False
+
+
+def serialize_chat_message(message):
+    """Représentation JSON commune aux messages privés, de groupe et de transaction"""
+    return {
+        'id': str(message.id),
+        'sender_id': message.sender_id,
+        'sender': message.sender.username,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'time': message.created_at.strftime('%H:%M'),
+    }
+
+
+def chat_messages_queryset(kind, chat_id):
+    if kind == 'private':
+        return PrivateMessage.objects.filter(conversation_id=chat_id)
+    if kind == 'group':
+        return GroupMessage.objects.filter(group_id=chat_id)
+    return Message.objects.filter(chat_id=chat_id)
+
+
+def get_chat_messages(kind, chat_id, since=None, limit=CHAT_HISTORY_LIMIT):
+    """
+    Historique incrémental d'une discussion, trié par (created_at, id).
+    Sans curseur : les `limit` derniers messages. Avec `since` : uniquement les messages
+    postérieurs au curseur. Retourne {'messages', 'cursor', 'has_more'} ; le curseur est
+    à renvoyer tel quel dans `since` à l'appel suivant.
+    """
+    messages = chat_messages_queryset(kind, chat_id).select_related('sender')
+    decoded = decode_cursor(since, 'created_at') if since else None
+    if decoded is None:
+        # Curseur absent ou invalide : derniers messages, comme au premier chargement
+        since = None
+
+    if decoded:
+        created_at, pk = decoded
+        messages = list(
+            messages.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            .order_by('created_at', 'id')[:limit + 1]
+        )
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+    else:
+        messages = list(messages.order_by('-created_at', '-id')[:limit])[::-1]
+        has_more = False
+
+    return {
+        'messages': [serialize_chat_message(message) for message in messages],
+        'cursor': encode_cursor(messages[-1], 'created_at') if messages else since,
+        'has_more': has_more,
+    }
+
+
+# ===== Lecture des groupes (filigrane par membre) =====
+
+def _after_watermark(read_at, read_message_id):
+    """Messages postérieurs au filigrane (created_at, id)"""
+    return Q(created_at__gt=read_at) | Q(created_at=read_at, id__gt=read_message_id)
+
+
+def get_group_unread_count(user, group_id):
+    """Nombre de messages non lus d'un groupe : un COUNT sur l'index (group, created_at, id)"""
+    membership = GroupMembership.objects.filter(group_id=group_id, user=user, is_active=True).values(
+        'last_read_at', 'last_read_message_id', 'joined_at'
+    ).first()
+    if membership is None:
+        return 0
+    messages = GroupMessage.objects.filter(group_id=group_id).exclude(sender=user)
+    if membership['last_read_at'] is None:
+        # Sans filigrane, l'historique antérieur à l'arrivée dans le groupe est considéré lu
+        return messages.filter(created_at__gt=membership['joined_at']).count()
+    return messages.filter(_after_watermark(membership['last_read_at'], membership['last_read_message_id'])).count()
+
+
+def get_group_unread_counts(user):
+    """{group_id: non lus} pour tous les groupes actifs de l'utilisateur, en une requête"""
+    unread = (
+        GroupMessage.objects.filter(group=OuterRef('group'))
+        .exclude(sender=OuterRef('user'))
+        .filter(
+            Q(created_at__gt=Coalesce(OuterRef('last_read_at'), OuterRef('joined_at')))
+            | Q(created_at=OuterRef('last_read_at'), id__gt=OuterRef('last_read_message_id'))
+        )
+        .order_by()
+        .values('group')
+        .annotate(count=Count('pk'))
+        .values('count')[:1]
+    )
+    return dict(
+        GroupMembership.objects.filter(user=user, is_active=True)
+        .annotate(unread=Coalesce(Subquery(unread), 0))
+        .values_list('group_id', 'unread')
+    )
+
+
+def mark_group_read(user, group_id, until=None):
+    """
+    Marque les messages d'un groupe comme lus en un seul UPDATE du filigrane.
+    until : couple (created_at, id) du dernier message lu ; par défaut le dernier message du groupe.
+    Le filigrane n'avance jamais à reculons.
+    """
+    memberships = GroupMembership.objects.filter(group_id=group_id, user=user)
+    inbox = InboxEntry.objects.filter(user=user, group_id=group_id)
+    if until is None:
+        latest = GroupMessage.objects.filter(group_id=OuterRef('group_id')).order_by('-created_at', '-id')
+        inbox.update(unread_count=0)
+        return memberships.update(
+            last_read_at=Coalesce(Subquery(latest.values('created_at')[:1]), F('last_read_at')),
+            last_read_message=Coalesce(Subquery(latest.values('id')[:1]), F('last_read_message')),
+        )
+    read_at, read_message_id = until
+    updated = memberships.filter(
+        Q(last_read_at__isnull=True)
+        | Q(last_read_at__lt=read_at)
+        | Q(last_read_at=read_at, last_read_message_id__lt=read_message_id)
+    ).update(last_read_at=read_at, last_read_message_id=read_message_id)
+    if updated:
+        inbox.update(unread_count=get_group_unread_count(user, group_id))
+    return updated
+
+
+def mark_private_read(user, conversation_id):
+    """Marque comme lus les messages reçus dans une conversation privée"""
+    updated = PrivateMessage.objects.filter(conversation_id=conversation_id, is_read=False).exclude(
+        sender=user
+    ).update(is_read=True, read_at=timezone.now())
+    InboxEntry.objects.filter(user=user, conversation_id=conversation_id, unread_count__gt=0).update(unread_count=0)
+    return updated
+
+
+# ===== Boîte de réception =====
+
+def update_inbox_for_message(message):
+    """
+    Répercute un nouveau message dans la boîte de réception de chaque participant :
+    dernier message, date d'activité et non-lus (+1, sauf pour l'expéditeur), en un UPDATE.
+    """
+    if isinstance(message, PrivateMessage):
+        kind, target = 'private', {'conversation_id': message.conversation_id}
+        conversation = message.conversation
+        participants = {conversation.user1_id, conversation.user2_id}
+        PrivateConversation.objects.filter(pk=conversation.pk).update(last_message_at=message.created_at)
+    else:
+        kind, target = 'group', {'group_id': message.group_id}
+        participants = set(
+            GroupMembership.objects.filter(group_id=message.group_id, is_active=True).values_list('user_id', flat=True)
+        )
+        Group.objects.filter(pk=message.group_id).update(last_message_at=message.created_at)
+    if not participants:
+        return
+
+    last_message = {
+        'last_message_at': message.created_at,
+        'last_message_id': message.id,
+        'last_message_preview': message.content[:INBOX_PREVIEW_LENGTH],
+        'last_sender_id': message.sender_id,
+    }
+    updated = InboxEntry.objects.filter(user_id__in=participants, **target).update(
+        unread_count=Case(When(user_id=message.sender_id, then=Value(0)), default=F('unread_count') + 1),
+        **last_message,
+    )
+    if updated < len(participants):
+        # Premiers messages (ou nouveaux membres) : entrées manquantes créées
+        InboxEntry.objects.bulk_create(
+            [
+                InboxEntry(user_id=user_id, kind=kind, unread_count=int(user_id != message.sender_id),
+                           **target, **last_message)
+                for user_id in participants
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def get_inbox(user, limit=50):
+    """Boîte de réception triée par activité : une requête sur l'index (user, -last_message_at)"""
+    members_count = (
+        GroupMembership.objects.filter(group=OuterRef('group'), is_active=True)
+        .order_by()
+        .values('group')
+        .annotate(count=Count('pk'))
+        .values('count')[:1]
+    )
+    return list(
+        InboxEntry.objects.filter(user=user)
+        .select_related('conversation__user1__profile', 'conversation__user2__profile', 'group', 'last_sender')
+        .annotate(members_count=Coalesce(Subquery(members_count), 0))
+        .order_by('-last_message_at')[:limit]
+    )
+
+
+def serialize_inbox_entry(entry, user):
+    """Données d'affichage d'une conversation de la boîte de réception"""
+    data = {
+        'type': entry.kind,
+        'last_message': entry.last_message_preview,
+        'last_message_time': entry.last_message_at,
+        'last_sender': entry.last_sender.username if entry.last_sender else None,
+        'unread_count': entry.unread_count,
+    }
+    if entry.kind == 'private':
+        conversation = entry.conversation
+        other = conversation.user2 if conversation.user1_id == user.id else conversation.user1
+        profile = getattr(other, 'profile', None)
+        data.update({
+            'id': conversation.id,
+            'other_user': other,
+            'name': other.username,
+            'avatar': profile.profileimg.url if profile and profile.profileimg else None,
+        })
+    else:
+        data.update({
+            'id': entry.group.id,
+            'name': entry.group.name,
+            'avatar': entry.group.avatar.url if entry.group.avatar else None,
+            'members_count': entry.members_count,
+        })
+    return data
+
+
+def message_channel(message):
+    """Canal de diffusion d'un message selon son modèle"""
+    if hasattr(message, 'conversation_id'):
+        return chat_channel('private', message.conversation_id)
+    if hasattr(message, 'group_id'):
+        return chat_channel('group', message.group_id)
+    return chat_channel('transaction', message.chat_id)
+
+
+# ===== Publication / abonnement =====
+
+class ChatSubscription:
+    """
+    Abonnement d'une connexion WebSocket : file bornée consommée dans la boucle asyncio
+    de la connexion. Un client trop lent ne bloque jamais l'émetteur : sa file est vidée
+    et remplacée par un événement « resync » qui lui demande de recharger via HTTP.
+    """
+
+    def __init__(self, loop, maxsize=CHAT_SOCKET_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        """À appeler depuis la boucle de la connexion"""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {'type': 'resync'}
+        self.queue.put_nowait(event)
+
+    def push(self, event):
+        """Dépôt thread-safe (depuis une vue synchrone ou un signal)"""
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, event)
+        except RuntimeError:
+            # Boucle fermée : la connexion est en cours de fermeture
+            pass
+
+
+class InProcessBroker:
+    """
+    Courtier de messages en mémoire, limité au processus courant : les WebSockets et les
+    envois HTTP doivent être servis par le même processus ASGI. Pour plusieurs processus,
+    fournir un courtier externe de même interface via settings.CHAT_BROKER.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._new_event = threading.Condition(self._lock)
+        self._subscriptions = defaultdict(set)
+        self._presence = defaultdict(Counter)
+        self._versions = Counter()
+        self._waiters = defaultdict(set)
+
+    def subscribe(self, channel, subscription, user_id):
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+            self._presence[channel][user_id] += 1
+            joined = self._presence[channel][user_id] == 1
+        if joined:
+            self._broadcast_presence(channel)
+        else:
+            subscription.push({'type': 'presence', 'online': self.online_users(channel)})
+
+    def unsubscribe(self, channel, subscription, user_id):
+        with self._lock:
+            self._subscriptions[channel].discard(subscription)
+            if not self._subscriptions[channel]:
+                del self._subscriptions[channel]
+            presence = self._presence[channel]
+            presence[user_id] -= 1
+            left = presence[user_id] <= 0
+            if left:
+                del presence[user_id]
+            if not presence:
+                del self._presence[channel]
+        if left:
+            self._broadcast_presence(channel)
+
+    def online_users(self, channel):
+        with self._lock:
+            return sorted(self._presence.get(channel, ()))
+
+    def version(self, channel):
+        """Nombre de publications sur le canal, à relever avant une lecture suivie d'une attente"""
+        with self._lock:
+            return self._versions[channel]
+
+    def publish(self, channel, event):
+        """Diffuse un événement aux abonnés et réveille les requêtes en attente (long-poll)"""
+        with self._lock:
+            self._versions[channel] += 1
+            self._new_event.notify_all()
+            waiters = self._waiters.pop(channel, ())
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass
+        self._broadcast(channel, event)
+
+    def wait(self, channel, timeout, version=None):
+        """
+        Bloque le thread courant jusqu'à une publication sur le canal postérieure à `version`
+        (par défaut : la prochaine). Retourne False si le délai expire.
+        """
+        with self._lock:
+            if version is None:
+                version = self._versions[channel]
+            return self._new_event.wait_for(lambda: self._versions[channel] != version, timeout)
+
+    async def wait_async(self, channel, timeout, version=None):
+        """Équivalent asynchrone de wait(), sans occuper de thread pendant l'attente"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            if version is not None and self._versions[channel] != version:
+                return True
+            self._waiters[channel].add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(channel)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[channel]
+
+    def _broadcast(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def _broadcast_presence(self, channel):
+        self._broadcast(channel, {'type': 'presence', 'online': self.online_users(channel)})
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_chat_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = getattr(settings, 'CHAT_BROKER', 'blizzgame.chat_utils.InProcessBroker')
+                _broker = import_string(broker_class)()
+    return _broker
+
+
+def publish_chat_message(message):
+    """Diffuse un nouveau message à tous les participants connectés"""
+    try:
+        get_chat_broker().publish(
+            message_channel(message),
+            {'type': 'message', 'message': serialize_chat_message(message)},
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la diffusion du message {message.id}: {e}")
@@ -9,6 +9,7 @@ import uuid
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
+from .inventory_utils import commit_order_stock, release_order_stock
 from .models import ShopCinetPayTransaction, Order
 import logging
 
@@ -194,6 +195,7 @@ def handle_cinetpay_notification(notification_data):
             order.payment_status = 'paid'
             order.status = 'processing'
             order.save()
+            commit_order_stock(order)
             
             # Créer la commande sur Shopify
             from .shopify_utils import create_shopify_order_from_blizz_order, mark_order_as_paid_in_shopify
@@ -219,6 +221,7 @@ def handle_cinetpay_notification(notification_data):
             order.payment_status = 'failed'
             order.status = 'cancelled'
             order.save()
+            release_order_stock(order)
             
             logger.info(f"Paiement échoué pour: {transaction_id}")
             return True
@@ -0,0 +1,22 @@
+"""
+Processeurs de contexte BLIZZ
+"""
+
+from django.utils.functional import SimpleLazyObject
+from .cart_utils import get_cart_count
+from .notification_utils import get_cached_unread_notification_count
+
+
+def notifications(request):
+    """Compteur du badge de notifications, évalué seulement si le gabarit l'affiche"""
+    user = getattr(request, 'user', None)
+    if user is None:
+        return {}
+    return {'unread_notifications_count': SimpleLazyObject(lambda: get_cached_unread_notification_count(user))}
+
+
+def cart(request):
+    """Badge du panier : lu dans la session, sans requête tant que le compteur y est mémorisé"""
+    if not hasattr(request, 'session'):
+        return {}
+    return {'cart_count': SimpleLazyObject(lambda: get_cart_count(request))}
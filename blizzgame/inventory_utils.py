@@ -0,0 +1,208 @@
+"""
+Utilitaires d'inventaire de la boutique BLIZZ
+Réservation du stock par UPDATE conditionnel, expiration des réservations des commandes
+impayées et synchronisation des niveaux de stock Shopify
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+from .models import Order, Product, ProductVariant, StockReservation
+from .shop_cache_utils import invalidate_catalog
+
+logger = logging.getLogger(__name__)
+
+# Durée pendant laquelle le stock d'une commande impayée reste réservé
+STOCK_RESERVATION_MINUTES = getattr(settings, 'STOCK_RESERVATION_MINUTES', 30)
+
+
+class OutOfStock(Exception):
+    """Stock insuffisant pour au moins une ligne du panier ; la commande est annulée"""
+
+
+def _stock_owner(line):
+    """Le stock est suivi sur la variante si elle en a un, sinon sur le produit"""
+    if line.variant is not None and line.variant.stock is not None:
+        return ProductVariant, line.variant_id
+    if line.product.stock is not None:
+        return Product, line.product_id
+    return None, None
+
+
+def _status_after_restock():
+    # Un produit en rupture redevient disponible dès qu'une unité lui est rendue
+    return Case(When(status='out_of_stock', then=Value('active')), default=F('status'))
+
+
+def _status_for_stock(stock):
+    """Statut d'un produit dont le stock vient d'être fixé à une valeur absolue"""
+    if stock == 0:
+        return Case(When(status='active', then=Value('out_of_stock')), default=F('status'))
+    return _status_after_restock()
+
+
+def reserve_stock(order, lines):
+    """
+    Décrémente le stock de toutes les lignes avec un UPDATE conditionnel par table
+    (stock = stock - n WHERE stock >= n) puis enregistre les réservations de la commande :
+    le nombre de requêtes ne dépend pas du nombre de lignes. Lève OutOfStock si une seule
+    ligne ne peut être servie ; à appeler dans une transaction pour tout annuler.
+    """
+    wanted = defaultdict(lambda: defaultdict(int))
+    for line in lines:
+        model, pk = _stock_owner(line)
+        if model is not None:
+            wanted[model][pk] += line.quantity
+
+    for model, quantities in wanted.items():
+        needed = Case(*[When(pk=pk, then=Value(n)) for pk, n in quantities.items()])
+        updates = {'stock': F('stock') - needed}
+        if model is Product:
+            # Le produit passe en rupture quand sa dernière unité est réservée
+            updates['status'] = Case(When(stock=needed, then=Value('out_of_stock')), default=F('status'))
+        updated = model.objects.filter(pk__in=quantities, stock__gte=needed).update(**updates)
+        if updated != len(quantities):
+            raise OutOfStock()
+
+    expires_at = timezone.now() + timedelta(minutes=STOCK_RESERVATION_MINUTES)
+    StockReservation.objects.bulk_create([
+        StockReservation(
+            order=order,
+            product_id=pk if model is Product else None,
+            variant_id=pk if model is ProductVariant else None,
+            quantity=quantity,
+            expires_at=expires_at,
+        )
+        for model, quantities in wanted.items()
+        for pk, quantity in quantities.items()
+    ])
+
+
+def release_reservation(reservation):
+    """
+    Rend au stock les unités d'une réservation active. Le passage à « released » est
+    conditionnel : si deux processus libèrent la même réservation, un seul rend le stock.
+    """
+    with transaction.atomic():
+        claimed = StockReservation.objects.filter(pk=reservation.pk, status='active').update(status='released')
+        if not claimed:
+            return False
+        if reservation.variant_id:
+            ProductVariant.objects.filter(pk=reservation.variant_id, stock__isnull=False).update(
+                stock=F('stock') + reservation.quantity
+            )
+        elif reservation.product_id:
+            Product.objects.filter(pk=reservation.product_id, stock__isnull=False).update(
+                stock=F('stock') + reservation.quantity, status=_status_after_restock()
+            )
+    return True
+
+
+def release_order_stock(order):
+    """Libère les réservations encore actives d'une commande (paiement refusé, annulation)"""
+    released = 0
+    for reservation in StockReservation.objects.filter(order=order, status='active'):
+        released += release_reservation(reservation)
+    return released
+
+
+def commit_order_stock(order):
+    """Le paiement est confirmé : les réservations actives deviennent définitives"""
+    committed = StockReservation.objects.filter(order=order, status='active').update(status='committed')
+    if not committed and StockReservation.objects.filter(order=order, status='released').exists():
+        logger.warning(
+            f"Commande {order.order_number} payée après expiration de sa réservation : stock à vérifier"
+        )
+    return committed
+
+
+def expired_reservations(now=None):
+    return StockReservation.objects.filter(
+        status='active', expires_at__lte=now or timezone.now()
+    ).exclude(order__payment_status='paid')
+
+
+def release_expired_reservations(now=None):
+    """
+    Libère les réservations expirées des commandes impayées et annule ces commandes
+    si elles sont toujours en attente de paiement. Retourne (commandes, réservations).
+    """
+    released = 0
+    order_ids = set()
+    for reservation in expired_reservations(now).order_by('expires_at'):
+        if release_reservation(reservation):
+            released += 1
+            order_ids.add(reservation.order_id)
+    if order_ids:
+        Order.objects.filter(pk__in=order_ids, payment_status='pending', status='pending').update(
+            status='cancelled', updated_at=timezone.now()
+        )
+    return len(order_ids), released
+
+
+# ===== Synchronisation Shopify =====
+
+def _active_reserved(model, pk):
+    field = 'variant' if model is ProductVariant else 'product'
+    return StockReservation.objects.filter(**{field: pk, 'status': 'active'}).aggregate(
+        total=Sum('quantity')
+    )['total'] or 0
+
+
+def _local_stock(model, pk, available):
+    """Stock vendable localement : niveau Shopify moins les réservations pas encore transmises"""
+    if available is None:
+        return None
+    return max(int(available) - _active_reserved(model, pk), 0)
+
+
+def apply_shopify_inventory(product, product_data):
+    """
+    Met à jour le stock d'un produit (première variante Shopify) et de ses variantes locales
+    à partir du payload produit. Une variante sans gestion de stock Shopify n'est pas suivie.
+    """
+    variants = product_data.get('variants') or []
+    if not variants:
+        return
+    by_id = {str(variant.get('id')): variant for variant in variants}
+
+    def tracked_quantity(variant):
+        if variant.get('inventory_management') != 'shopify':
+            return None
+        return variant.get('inventory_quantity')
+
+    first = variants[0]
+    stock = _local_stock(Product, product.pk, tracked_quantity(first))
+    Product.objects.filter(pk=product.pk).update(
+        stock=stock,
+        status=_status_for_stock(stock),
+        shopify_inventory_item_id=str(first['inventory_item_id']) if first.get('inventory_item_id') else None,
+    )
+    product.refresh_from_db(fields=['stock', 'status', 'shopify_inventory_item_id'])
+
+    for local in ProductVariant.objects.filter(product=product, shopify_variant_id__in=by_id):
+        variant = by_id[local.shopify_variant_id]
+        ProductVariant.objects.filter(pk=local.pk).update(
+            stock=_local_stock(ProductVariant, local.pk, tracked_quantity(variant)),
+            shopify_inventory_item_id=str(variant['inventory_item_id']) if variant.get('inventory_item_id') else None,
+        )
+
+
+def apply_shopify_inventory_level(inventory_item_id, available):
+    """Webhook inventory_levels/update : applique le nouveau niveau à l'article correspondant"""
+    inventory_item_id = str(inventory_item_id)
+    updated = 0
+    for model in (ProductVariant, Product):
+        for pk in model.objects.filter(shopify_inventory_item_id=inventory_item_id).values_list('pk', flat=True):
+            updates = {'stock': _local_stock(model, pk, available)}
+            if model is Product:
+                updates['status'] = _status_for_stock(updates['stock'])
+            updated += model.objects.filter(pk=pk).update(**updates)
+    if updated:
+        # UPDATE direct, sans signal : les pages affichant la disponibilité sont périmées ici
+        invalidate_catalog()
+    return updated
@@ -0,0 +1,140 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings
+from blizzgame.models import Product, ProductCategory
+from blizzgame.search_utils import (
+    PRODUCT_AUTOCOMPLETE_LIMIT, PRODUCT_FTS_TABLE, autocomplete_products, index_products, search_products
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_PREFIX = 'benchmark-search'
+
+# Cache isolé : les suggestions du catalogue synthétique n'atteignent pas le cache configuré
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': BENCHMARK_PREFIX}
+}
+
+GAMES = ['fortnite', 'valorant', 'minecraft', 'fifa', 'pubg', 'warzone', 'roblox', 'league', 'apex', 'overwatch']
+KINDS = ['manette', 'casque', 'clavier', 'souris', 'tapis', 'carte', 'figurine', 'sweat', 'tshirt', 'casquette']
+ADJECTIVES = ['édition', 'collector', 'pro', 'ultra', 'rgb', 'sans-fil', 'limitée', 'officielle', 'mécanique', 'légère']
+FILLER = [
+    'livraison', 'rapide', 'garantie', 'qualité', 'gaming', 'confort', 'design', 'compatible', 'console', 'pc',
+    'joueurs', 'compétition', 'stock', 'original', 'premium', 'couleur', 'noir', 'blanc', 'rouge', 'bleu',
+]
+
+# Requêtes mesurées : terme fréquent, terme rare, plusieurs mots, préfixe, accent
+QUERIES = ['manette', 'fortnite casque', 'collector valorant figurine', 'sans fil', 'mecanique', 'clav', 'rgb pro']
+AUTOCOMPLETE_QUERIES = ['ma', 'man', 'manet', 'for', 'fortnite ca', 'val', 'souris u']
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la recherche plein texte des produits sur un catalogue synthétique (100 000 produits "
+        "par défaut) : classement BM25, autocomplétion et parcours LIKE de référence. "
+        "Le catalogue est créé dans une base temporaire (comme celle des tests), détruite à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Taille du catalogue synthétique')
+        parser.add_argument('--repeat', type=int, default=20, help='Exécutions par requête')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Taille des lots de création')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                f"Base {connection.vendor} : mesure du classement SearchRank sans index FTS5"
+            ))
+        with override_settings(CACHES=BENCHMARK_CACHES), tempfile.TemporaryDirectory() as directory:
+            old_name = connection.settings_dict['NAME']
+            test_settings = connection.settings_dict['TEST']
+            old_test_name = test_settings.get('NAME')
+            if connection.vendor == 'sqlite':
+                # Base sur disque plutôt qu'en mémoire, pour des mesures comparables à la production
+                test_settings['NAME'] = os.path.join(directory, f'{BENCHMARK_PREFIX}.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self._run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = old_test_name
+
+        self.stdout.write(self.style.SUCCESS("Benchmark terminé"))
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        category = ProductCategory.objects.create(slug=BENCHMARK_PREFIX, name='Benchmark recherche')
+
+        start = time.perf_counter()
+        created = self._create_catalog(category, options['products'], options['batch_size'], rng)
+        self.stdout.write(f"{created} produits créés et indexés en {time.perf_counter() - start:.1f}s")
+        logger.info(f"Benchmark recherche : {created} produits créés dans {connection.settings_dict['NAME']}")
+
+        self.stdout.write("Recherche classée (search_products, 20 résultats) :")
+        for query in QUERIES:
+            self._report(query, lambda q=query: search_products(q), options['repeat'])
+
+        self.stdout.write("Autocomplétion (autocomplete_products, sans cache) :")
+        for query in AUTOCOMPLETE_QUERIES:
+            def run(q=query):
+                cache.delete(f"product_autocomplete:{PRODUCT_AUTOCOMPLETE_LIMIT}:{q.replace(' ', '+')}")
+                return autocomplete_products(q)
+            self._report(query, run, options['repeat'])
+
+        self.stdout.write("Référence LIKE %terme% sur nom et description :")
+        for query in QUERIES[:3]:
+            def like(q=query):
+                return list(
+                    Product.objects.filter(status='active')
+                    .filter(Q(name__icontains=q) | Q(description__icontains=q))
+                    .order_by('name')[:20]
+                )
+            self._report(query, like, max(options['repeat'] // 4, 1))
+
+    def _create_catalog(self, category, count, batch_size, rng):
+        created = 0
+        while created < count:
+            batch = []
+            for index in range(created, min(created + batch_size, count)):
+                game, kind, adjective = rng.choice(GAMES), rng.choice(KINDS), rng.choice(ADJECTIVES)
+                filler = ' '.join(rng.choices(FILLER, k=30))
+                batch.append(Product(
+                    name=f'{kind.capitalize()} {game.capitalize()} {adjective} #{index}',
+                    slug=f'{BENCHMARK_PREFIX}-{index}',
+                    category=category,
+                    short_description=f'{kind} {adjective} pour {game}',
+                    description=f'<p><strong>{kind}</strong> {filler}</p><ul><li>{game}</li></ul>',
+                    price=Decimal(rng.randint(500, 100000)) / 100,
+                    tags=[game, kind],
+                ))
+            Product.objects.bulk_create(batch)
+            index_products(batch)
+            created += len(batch)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f"INSERT INTO {PRODUCT_FTS_TABLE}({PRODUCT_FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute('ANALYZE')
+        return created
+
+    def _report(self, label, func, repeat):
+        timings = []
+        results = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = len(func())
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(int(len(timings) * 0.95), len(timings) - 1)]
+        self.stdout.write(
+            f"  {label!r:32} médiane {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms  ({results} résultats)"
+        )
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from importlib import import_module
+from blizzgame.cart_utils import ABANDONED_CART_DAYS, abandoned_carts, delete_carts_in_batches
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Supprime par lots les paniers inactifs depuis N jours et les sessions expirées'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=ABANDONED_CART_DAYS,
+            help=f'Inactivité en jours au-delà de laquelle un panier est supprimé (défaut: {ABANDONED_CART_DAYS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de paniers supprimés par transaction',
+        )
+        parser.add_argument(
+            '--include-users',
+            action='store_true',
+            help='Supprime aussi les paniers inactifs des utilisateurs connectés (anonymes seulement par défaut)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche le nombre de paniers qui seraient supprimés sans les supprimer',
+        )
+
+    def handle(self, *args, **options):
+        carts = abandoned_carts(options['days'], options['include_users'])
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f"Mode dry-run: {carts.count()} paniers inactifs depuis {options['days']} jours seraient supprimés")
+            )
+            return
+
+        deleted = delete_carts_in_batches(carts, options['batch_size'])
+
+        # Les sessions des visiteurs anonymes expirent de leur côté
+        engine = import_module(settings.SESSION_ENGINE)
+        try:
+            engine.SessionStore.clear_expired()
+        except NotImplementedError:
+            self.stdout.write(self.style.WARNING("Le moteur de session ne permet pas la purge des sessions expirées"))
+
+        if deleted:
+            self.stdout.write(self.style.SUCCESS(f'✅ {deleted} paniers abandonnés supprimés'))
+            logger.info(f"Nettoyage des paniers: {deleted} paniers inactifs depuis {options['days']} jours supprimés")
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucun panier abandonné à supprimer'))
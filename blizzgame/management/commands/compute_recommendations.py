@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from blizzgame.recommendation_utils import (
+    RECOMMENDATIONS_HISTORY_DAYS, RECOMMENDATIONS_TOP_K, compute_recommendations
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les produits recommandés (achats communs et tags partagés) "
+        "et remplace les voisins stockés de chaque produit"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=RECOMMENDATIONS_TOP_K, help='Voisins conservés par produit')
+        parser.add_argument('--days', type=int, default=RECOMMENDATIONS_HISTORY_DAYS, help='Commandes prises en compte (jours)')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Calcule les voisins sans modifier la table",
+        )
+
+    def handle(self, *args, **options):
+        products, rows = compute_recommendations(options['top_k'], options['days'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Mode dry-run: {rows} voisins calculés pour {products} produits'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'✅ Recommandations recalculées: {rows} voisins pour {products} produits'))
+        logger.info(f"Recommandations recalculées: {rows} voisins pour {products} produits")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from blizzgame.notification_utils import rebuild_unread_counts
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les compteurs de notifications non lues et corrige ceux qui ont dérivé'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les compteurs incorrects sans les modifier',
+        )
+
+    def handle(self, *args, **options):
+        drifted = rebuild_unread_counts(dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            for user_id, (old, new) in sorted(drifted.items()):
+                self.stdout.write(f'  utilisateur {user_id}: {old or 0} -> {new}')
+            self.stdout.write(self.style.WARNING(f'Mode dry-run: {len(drifted)} compteurs seraient corrigés'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(drifted)} compteurs de notifications corrigés'))
+        if drifted:
+            logger.info(f"Compteurs de notifications corrigés: {len(drifted)}")
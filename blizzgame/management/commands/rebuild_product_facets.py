@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from blizzgame.catalog_utils import rebuild_facet_index
+from blizzgame.models import ProductFacetValue
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index des facettes du catalogue (tags et attributs des variantes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Affiche la taille actuelle de l'index sans le reconstruire",
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'Mode dry-run: {ProductFacetValue.objects.count()} valeurs actuellement indexées')
+            )
+            return
+
+        total = rebuild_facet_index()
+        self.stdout.write(self.style.SUCCESS(f'✅ Index des facettes reconstruit: {total} valeurs'))
+        logger.info(f"Index des facettes reconstruit: {total} valeurs")
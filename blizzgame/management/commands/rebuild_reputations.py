@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from blizzgame.models import UserReputation
+from blizzgame.reputation_utils import COUNTER_FIELDS, aggregate_rating_counters, apply_counters
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les compteurs, scores et badges de réputation de tous les utilisateurs à partir des évaluations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de réputations écrites par requête',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche le nombre de réputations concernées sans les modifier',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Une seule requête GROUP BY pour tous les utilisateurs
+        counters = aggregate_rating_counters()
+        reputations = {rep.user_id: rep for rep in UserReputation.objects.all()}
+
+        to_update = []
+        to_create = []
+        for user_id, user_counters in counters.items():
+            reputation = reputations.pop(user_id, None)
+            if reputation is None:
+                to_create.append(apply_counters(UserReputation(user_id=user_id), user_counters))
+            else:
+                to_update.append(apply_counters(reputation, user_counters))
+
+        # Les réputations sans évaluation sont remises à zéro
+        for reputation in reputations.values():
+            to_update.append(apply_counters(reputation, {}))
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Mode dry-run: {len(to_update)} réputations seraient mises à jour, {len(to_create)} créées'
+                )
+            )
+            return
+
+        now = timezone.now()
+        for reputation in to_update:
+            reputation.last_updated = now
+
+        with transaction.atomic():
+            UserReputation.objects.bulk_update(
+                to_update,
+                COUNTER_FIELDS + ['seller_score', 'seller_badge', 'last_updated'],
+                batch_size=batch_size,
+            )
+            UserReputation.objects.bulk_create(to_create, batch_size=batch_size)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {len(to_update)} réputations mises à jour, {len(to_create)} créées')
+        )
+        logger.info(f"Reconstruction des réputations: {len(to_update)} mises à jour, {len(to_create)} créées")
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from blizzgame.badge_config import SELLER_BADGES
+from blizzgame.models import UserReputation
+from blizzgame.reputation_utils import projected_seller_badges, recompute_seller_scores
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def badge_histogram():
+    return dict(UserReputation.objects.order_by().values_list('seller_badge').annotate(count=Count('pk')))
+
+
+class Command(BaseCommand):
+    help = 'Recalcule en masse les scores et badges vendeurs à partir des compteurs (après réglage de badge_config)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Nombre de réputations recalculées par UPDATE',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche la distribution des badges après recalcul sans rien écrire',
+        )
+
+    def handle(self, *args, **options):
+        before = badge_histogram()
+
+        if options['dry_run']:
+            after, changed = projected_seller_badges()
+            self._write_histogram(before, after)
+            self.stdout.write(self.style.WARNING(f'Mode dry-run: {changed} badges changeraient'))
+            return
+
+        # Un UPDATE par tranche de clés primaires : verrous courts sur les grandes tables
+        recomputed = 0
+        last_pk = 0
+        while True:
+            bounds = list(
+                UserReputation.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[options['batch_size'] - 1:options['batch_size']]
+            )
+            batch = UserReputation.objects.filter(pk__gt=last_pk)
+            if bounds:
+                batch = batch.filter(pk__lte=bounds[0])
+            recomputed += recompute_seller_scores(batch)
+            if not bounds:
+                break
+            last_pk = bounds[0]
+
+        self._write_histogram(before, badge_histogram())
+        self.stdout.write(self.style.SUCCESS(f'✅ {recomputed} réputations recalculées'))
+        logger.info(f"Recalcul des badges: {recomputed} réputations recalculées")
+
+    def _write_histogram(self, before, after):
+        total = sum(before.values()) or 1
+        self.stdout.write('Badge        Avant    Après')
+        order = [badge['level'] for badge in SELLER_BADGES]
+        for level in sorted(set(before) | set(after), key=lambda lvl: (order.index(lvl) if lvl in order else -1, lvl)):
+            bar = '#' * round(after.get(level, 0) * 40 / total)
+            self.stdout.write(f'{level:<10} {before.get(level, 0):>7} {after.get(level, 0):>8}  {bar}')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blizzgame.inventory_utils import STOCK_RESERVATION_MINUTES, expired_reservations, release_expired_reservations
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        f'Rend au stock les réservations des commandes impayées depuis plus de '
+        f'{STOCK_RESERVATION_MINUTES} minutes et annule ces commandes (à planifier, ex. toutes les 5 minutes)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les réservations qui seraient libérées sans les libérer',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        if options['dry_run']:
+            reservations = expired_reservations(now).select_related('order')
+            count = reservations.count()
+            self.stdout.write(
+                self.style.WARNING(f'Mode dry-run: {count} réservations expirées seraient libérées')
+            )
+            for reservation in reservations[:10]:
+                self.stdout.write(
+                    f'- #{reservation.order.order_number}: {reservation.quantity} unité(s), '
+                    f'expirée le {reservation.expires_at:%d/%m/%Y %H:%M}'
+                )
+            if count > 10:
+                self.stdout.write(f'... et {count - 10} autres')
+            return
+
+        orders, released = release_expired_reservations(now)
+        if released:
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ {released} réservations libérées ({orders} commandes annulées)')
+            )
+            logger.info(f"Libération du stock: {released} réservations expirées, {orders} commandes")
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucune réservation expirée'))
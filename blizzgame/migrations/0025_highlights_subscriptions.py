@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0024_remove_notification_group_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Highlight',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('video', models.FileField(upload_to='highlights_videos/')),
+                ('caption', models.TextField(blank=True, max_length=500)),
+                ('hashtags', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('views_count', models.IntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highlights', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HighlightComment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('content', models.TextField(max_length=300)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('highlight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='blizzgame.highlight')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highlight_comments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HighlightShare',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('highlight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='blizzgame.highlight')),
+                ('shared_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='received_highlight_shares', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highlight_shares', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HighlightLike',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('highlight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='blizzgame.highlight')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highlight_likes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('highlight', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='HighlightView',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('highlight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='views', to='blizzgame.highlight')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='highlight_views', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('highlight', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSubscription',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('subscribed_to', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscribers', to=settings.AUTH_USER_MODEL)),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('subscriber', models.F('subscribed_to')), _negated=True), name='no_self_subscription')],
+                'unique_together': {('subscriber', 'subscribed_to')},
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_post_fts(apps, schema_editor):
+    # Index plein texte FTS5 (SQLite uniquement), alimenté ensuite par les signaux de Post
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blizzgame_post_fts USING fts5("
+        "post_id UNINDEXED, title, caption, custom_game_name, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    Post = apps.get_model('blizzgame', 'Post')
+    # rowid = 64 premiers bits de l'UUID, comme search_utils.fts_rowid
+    rows = [
+        (
+            int.from_bytes(post.pk.bytes[:8], 'big', signed=True),
+            post.pk.hex,
+            post.title or '',
+            post.caption or '',
+            post.custom_game_name or '',
+        )
+        for post in Post.objects.only('title', 'caption', 'custom_game_name').iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO blizzgame_post_fts "
+            "(rowid, post_id, title, caption, custom_game_name) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_post_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS blizzgame_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0025_highlights_subscriptions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['game_type', '-created_at', '-id'], name='post_game_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_sold', '-created_at', '-id'], name='post_sold_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['price', 'id'], name='post_price_idx'),
+        ),
+        migrations.RunPython(create_post_fts, drop_post_fts),
+    ]
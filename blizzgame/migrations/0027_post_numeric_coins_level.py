@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:32
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée de blizzgame.models.parse_numeric_value : une migration ne dépend pas du code courant des modèles
+NUMERIC_VALUE_RE = re.compile(r'(\d{1,3}(?:[ .,\u00a0\u202f]\d{3})+|\d+(?:[.,]\d+)?)\s*([kKmM])?\b')
+NUMERIC_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+
+def parse_numeric_value(text):
+    match = NUMERIC_VALUE_RE.search(text or '')
+    if not match:
+        return None
+    number, suffix = match.groups()
+    if re.fullmatch(r'\d+[.,](?:\d{1,2}|\d{4,})', number):
+        value = float(number.replace(',', '.'))
+    else:
+        value = int(re.sub(r'\D', '', number))
+    if suffix:
+        value *= NUMERIC_SUFFIXES[suffix.lower()]
+    return min(int(value), 2 ** 63 - 1)
+
+
+def backfill_numeric_values(apps, schema_editor):
+    Post = apps.get_model('blizzgame', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'coins', 'level').iterator(chunk_size=2000):
+        post.coins_value = parse_numeric_value(post.coins)
+        post.level_value = parse_numeric_value(post.level)
+        if post.coins_value is not None or post.level_value is not None:
+            batch.append(post)
+        if len(batch) >= 2000:
+            Post.objects.bulk_update(batch, ['coins_value', 'level_value'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['coins_value', 'level_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0026_post_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='coins_value',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='level_value',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        # Remplissage avant la création des index
+        migrations.RunPython(backfill_numeric_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['game_type', 'level_value'], name='post_game_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['game_type', 'coins_value'], name='post_game_coins_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['game_type', 'price'], name='post_game_price_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0027_post_numeric_coins_level'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['subscribed_to', 'subscriber'], name='subscription_reverse_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index sur LOWER(username) pour la recherche d'utilisateurs par préfixe.
+    La table auth_user appartient à django.contrib.auth : l'index est créé en SQL brut.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blizzgame', '0028_subscription_reverse_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS blizzgame_user_username_lower_idx ON auth_user (LOWER(username))',
+            reverse_sql='DROP INDEX IF EXISTS blizzgame_user_username_lower_idx',
+        ),
+    ]
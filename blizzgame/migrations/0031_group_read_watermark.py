@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    """Initialise le filigrane avec le dernier message déjà marqué lu (GroupMessageRead)"""
+    GroupMembership = apps.get_model('blizzgame', 'GroupMembership')
+    GroupMessageRead = apps.get_model('blizzgame', 'GroupMessageRead')
+    latest_read = GroupMessageRead.objects.filter(
+        user=OuterRef('user'), message__group=OuterRef('group')
+    ).order_by('-message__created_at', '-message__id')
+    GroupMembership.objects.filter(Exists(latest_read)).update(
+        last_read_at=Subquery(latest_read.values('message__created_at')[:1]),
+        last_read_message=Subquery(latest_read.values('message')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0030_chat_message_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmembership',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupmembership',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blizzgame.groupmessage'),
+        ),
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:43
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+
+def _preview(message):
+    return message.content[:120] if message else ''
+
+
+def backfill_inbox(apps, schema_editor):
+    """Date du dernier message réelle et entrées de boîte de réception pour l'existant"""
+    PrivateConversation = apps.get_model('blizzgame', 'PrivateConversation')
+    PrivateMessage = apps.get_model('blizzgame', 'PrivateMessage')
+    Group = apps.get_model('blizzgame', 'Group')
+    GroupMembership = apps.get_model('blizzgame', 'GroupMembership')
+    GroupMessage = apps.get_model('blizzgame', 'GroupMessage')
+    InboxEntry = apps.get_model('blizzgame', 'InboxEntry')
+
+    entries = []
+    for conversation in PrivateConversation.objects.iterator():
+        messages = PrivateMessage.objects.filter(conversation=conversation)
+        last = messages.order_by('-created_at', '-id').first()
+        last_message_at = last.created_at if last else conversation.created_at
+        PrivateConversation.objects.filter(pk=conversation.pk).update(last_message_at=last_message_at)
+        for user_id in {conversation.user1_id, conversation.user2_id}:
+            entries.append(InboxEntry(
+                user_id=user_id, kind='private', conversation=conversation,
+                last_message_at=last_message_at, last_message_id=last.id if last else None,
+                last_message_preview=_preview(last), last_sender_id=last.sender_id if last else None,
+                unread_count=messages.filter(is_read=False).exclude(sender_id=user_id).count(),
+            ))
+
+    for group in Group.objects.iterator():
+        messages = GroupMessage.objects.filter(group=group)
+        last = messages.order_by('-created_at', '-id').first()
+        last_message_at = last.created_at if last else group.created_at
+        Group.objects.filter(pk=group.pk).update(last_message_at=last_message_at)
+        for membership in GroupMembership.objects.filter(group=group, is_active=True):
+            if membership.last_read_at is None:
+                unread = messages.filter(created_at__gt=membership.joined_at)
+            else:
+                unread = messages.filter(
+                    Q(created_at__gt=membership.last_read_at)
+                    | Q(created_at=membership.last_read_at, id__gt=membership.last_read_message_id)
+                )
+            entries.append(InboxEntry(
+                user_id=membership.user_id, kind='group', group=group,
+                last_message_at=last_message_at, last_message_id=last.id if last else None,
+                last_message_preview=_preview(last), last_sender_id=last.sender_id if last else None,
+                unread_count=unread.exclude(sender_id=membership.user_id).count(),
+            ))
+
+    InboxEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0031_group_read_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='group',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='privateconversation',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('private', 'Conversation privée'), ('group', 'Groupe')], max_length=10)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_message_id', models.UUIDField(blank=True, null=True)),
+                ('last_message_preview', models.CharField(blank=True, max_length=120)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='blizzgame.privateconversation')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='blizzgame.group')),
+                ('last_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='inbox_user_recent_idx')],
+                'unique_together': {('user', 'conversation'), ('user', 'group')},
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
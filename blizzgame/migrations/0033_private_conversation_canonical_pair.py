@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def merge_duplicate_pairs(apps, schema_editor):
+    """
+    Remet chaque conversation dans l'ordre canonique (user1 < user2). Si la paire canonique
+    existe déjà, les messages et entrées de boîte de réception y sont fusionnés.
+    """
+    PrivateConversation = apps.get_model('blizzgame', 'PrivateConversation')
+    PrivateMessage = apps.get_model('blizzgame', 'PrivateMessage')
+    InboxEntry = apps.get_model('blizzgame', 'InboxEntry')
+
+    for duplicate in PrivateConversation.objects.filter(user1__gt=F('user2')).order_by('created_at'):
+        canonical = PrivateConversation.objects.filter(user1_id=duplicate.user2_id, user2_id=duplicate.user1_id).first()
+        if canonical is None:
+            PrivateConversation.objects.filter(pk=duplicate.pk).update(user1=F('user2'), user2=F('user1'))
+            continue
+
+        PrivateMessage.objects.filter(conversation=duplicate).update(conversation=canonical)
+        for entry in InboxEntry.objects.filter(conversation=duplicate):
+            target = InboxEntry.objects.filter(conversation=canonical, user_id=entry.user_id).first()
+            if target is None:
+                InboxEntry.objects.filter(pk=entry.pk).update(conversation=canonical)
+                continue
+            target.unread_count += entry.unread_count
+            if entry.last_message_at > target.last_message_at:
+                target.last_message_at = entry.last_message_at
+                target.last_message_id = entry.last_message_id
+                target.last_message_preview = entry.last_message_preview
+                target.last_sender_id = entry.last_sender_id
+            target.save()
+            entry.delete()
+
+        PrivateConversation.objects.filter(pk=canonical.pk).update(
+            last_message_at=max(canonical.last_message_at, duplicate.last_message_at),
+            is_active=canonical.is_active or duplicate.is_active,
+        )
+        duplicate.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0032_chat_inbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='privateconversation',
+            constraint=models.CheckConstraint(condition=models.Q(('user1__lte', models.F('user2'))), name='private_conversation_canonical_pair'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_product_facets(apps, schema_editor):
+    Product = apps.get_model('blizzgame', 'Product')
+    ProductVariant = apps.get_model('blizzgame', 'ProductVariant')
+    ProductFacetValue = apps.get_model('blizzgame', 'ProductFacetValue')
+    rows = set()
+    for product_id, tags in Product.objects.values_list('id', 'tags'):
+        for tag in tags or []:
+            if isinstance(tag, str) and tag.strip():
+                rows.add((product_id, 'tag', tag.strip()[:100]))
+    for product_id, name, value in ProductVariant.objects.filter(is_active=True).values_list('product_id', 'name', 'value'):
+        if value:
+            rows.add((product_id, f'attr:{name}'[:110], value[:100]))
+    ProductFacetValue.objects.bulk_create(
+        [ProductFacetValue(product_id=product_id, facet=facet, value=value) for product_id, facet, value in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0039_cart_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=110)),
+                ('value', models.CharField(max_length=100)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_values', to='blizzgame.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['facet', 'value', 'product'], name='product_facet_value_idx')],
+                'unique_together': {('product', 'facet', 'value')},
+            },
+        ),
+        migrations.RunPython(backfill_product_facets, migrations.RunPython.noop),
+    ]
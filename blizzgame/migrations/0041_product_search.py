@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:02
+
+from html import unescape
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def create_product_fts(apps, schema_editor):
+    # Index plein texte FTS5 des produits (SQLite uniquement), alimenté ensuite par les signaux de Product.
+    # prefix='2 3' : index des préfixes courts pour l'autocomplétion
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blizzgame_product_fts USING fts5("
+        "product_id UNINDEXED, name, tags, short_description, description, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    Product = apps.get_model('blizzgame', 'Product')
+    # rowid = 64 premiers bits de l'UUID, comme search_utils.fts_rowid
+    rows = [
+        (
+            int.from_bytes(product.pk.bytes[:8], 'big', signed=True),
+            product.pk.hex,
+            product.name or '',
+            ' '.join(tag for tag in (product.tags or []) if isinstance(tag, str)),
+            product.short_description or '',
+            unescape(strip_tags(product.description or '')),
+        )
+        for product in Product.objects.only('name', 'tags', 'short_description', 'description').iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO blizzgame_product_fts "
+            "(rowid, product_id, name, tags, short_description, description) VALUES (%s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS blizzgame_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0040_product_facets'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_fts, drop_product_fts),
+    ]
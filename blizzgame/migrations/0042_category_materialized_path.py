@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    # Chemins calculés de la racine vers les feuilles ; une catégorie hors de tout arbre (cycle) devient racine
+    ProductCategory = apps.get_model('blizzgame', 'ProductCategory')
+    categories = {category.pk: category for category in ProductCategory.objects.all()}
+    children = {}
+    for category in categories.values():
+        children.setdefault(category.parent_id if category.parent_id in categories else None, []).append(category)
+
+    def walk(parent, path, depth):
+        for category in children.get(parent, []):
+            category.path, category.depth = f'{path}{category.pk.hex}/', depth
+            walk(category.pk, category.path, depth + 1)
+
+    walk(None, '', 0)
+    for category in categories.values():
+        if not category.path:
+            category.parent_id, category.path, category.depth = None, f'{category.pk.hex}/', 0
+    ProductCategory.objects.bulk_update(categories.values(), ['parent', 'path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blizzgame', '0041_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=500),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
+import re
+import secrets
+import threading
+import time
 import uuid
-from django.db import models
+from django.db import models, transaction as db_transaction
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator
 from django.utils import timezone
 import json
@@ -103,6 +109,10 @@ class UserSubscription(models.Model):
     
     class Meta:
         unique_together = ['subscriber', 'subscribed_to']
+        indexes = [
+            # Parcours inverse du graphe (abonnés d'un utilisateur) pour les auto-jointures
+            models.Index(fields=['subscribed_to', 'subscriber'], name='subscription_reverse_idx'),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=~models.Q(subscriber=models.F('subscribed_to')),
@@ -126,9 +136,8 @@ class Profile(models.Model):
     @property
     def friends_count(self):
         """Compte le nombre d'amis (abonnements mutuels)"""
-        user_subscriptions = set(self.user.subscriptions.values_list('subscribed_to_id', flat=True))
-        user_subscribers = set(self.user.subscribers.values_list('subscriber_id', flat=True))
-        return len(user_subscriptions.intersection(user_subscribers))
+        from .social_utils import get_friends_count
+        return get_friends_count(self.user)
     
     @property
     def subscribers_count(self):
@@ -153,6 +162,25 @@ class Profile(models.Model):
     def __str__(self):
         return self.user.username
 
+# Nombre avec séparateurs de milliers (5 000, 5.000, 5,000) ou décimal (1.5), suffixe k/M optionnel
+NUMERIC_VALUE_RE = re.compile(r'(\d{1,3}(?:[ .,\u00a0\u202f]\d{3})+|\d+(?:[.,]\d+)?)\s*([kKmM])?\b')
+NUMERIC_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+def parse_numeric_value(text):
+    """Extrait la première valeur numérique d'un texte libre ("5k UC" -> 5000, "Niveau 50" -> 50)"""
+    match = NUMERIC_VALUE_RE.search(text or '')
+    if not match:
+        return None
+    number, suffix = match.groups()
+    # Une partie après séparateur de 3 chiffres est un groupe de milliers, sinon une décimale
+    if re.fullmatch(r'\d+[.,](?:\d{1,2}|\d{4,})', number):
+        value = float(number.replace(',', '.'))
+    else:
+        value = int(re.sub(r'\D', '', number))
+    if suffix:
+        value *= NUMERIC_SUFFIXES[suffix.lower()]
+    return min(int(value), 2 ** 63 - 1)
+
 class Post(models.Model):
     GAME_CHOICES = [
         ('FreeFire', 'FreeFire'),
@@ -181,6 +209,34 @@ class Post(models.Model):
     custom_game_name = models.CharField(max_length=100, blank=True, null=True)
     coins = models.CharField(max_length=100, default='')
     level = models.CharField(max_length=50, default='')
+    # Valeurs numériques normalisées depuis coins/level (renseignées à l'enregistrement)
+    coins_value = models.BigIntegerField(null=True, blank=True, editable=False)
+    level_value = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Index composites pour les combinaisons filtre + tri de la recherche (keyset sur id)
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['game_type', '-created_at', '-id'], name='post_game_recent_idx'),
+            models.Index(fields=['is_sold', '-created_at', '-id'], name='post_sold_recent_idx'),
+            models.Index(fields=['price', 'id'], name='post_price_idx'),
+            models.Index(fields=['game_type', 'level_value'], name='post_game_level_idx'),
+            models.Index(fields=['game_type', 'coins_value'], name='post_game_coins_idx'),
+            models.Index(fields=['game_type', 'price'], name='post_game_price_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.coins_value = parse_numeric_value(self.coins)
+        self.level_value = parse_numeric_value(self.level)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'coins' in update_fields:
+                update_fields.add('coins_value')
+            if 'level' in update_fields:
+                update_fields.add('level_value')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
 
     def get_game_display_name(self):
         if self.game_type == 'other' and self.custom_game_name:
@@ -316,6 +372,9 @@ class ProductCategory(models.Model):
     image = models.ImageField(upload_to='category_images/', null=True, blank=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
     is_active = models.BooleanField(default=True)
+    # Chemin matérialisé « <id racine>/.../<id>/ » : les descendants partagent ce préfixe
+    path = models.CharField(max_length=500, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -326,6 +385,36 @@ class ProductCategory(models.Model):
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def subtree_range(path):
+        """Bornes [path, path + U+FFFF) du sous-arbre : exploitables par l'index, contrairement à LIKE"""
+        return {'path__gte': path, 'path__lt': path + '\uffff'}
+
+    def clean(self):
+        if self.parent_id and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError({
+                'parent': "Une catégorie ne peut pas être placée sous elle-même ou sous une de ses sous-catégories"
+            })
+
+    def save(self, *args, **kwargs):
+        """Recalcule le chemin ; si la catégorie change de parent, son sous-arbre est déplacé en un UPDATE"""
+        old_path, old_depth = self.path, self.depth
+        parent = self.parent if self.parent_id else None
+        if parent is not None and old_path and parent.path.startswith(old_path):
+            raise ValueError("Cycle dans l'arbre des catégories")
+        self.path = f"{parent.path if parent else ''}{self.pk.hex}/"
+        self.depth = parent.depth + 1 if parent else 0
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'path', 'depth'}
+
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                ProductCategory.objects.filter(**self.subtree_range(old_path)).exclude(pk=self.pk).update(
+                    path=Concat(models.Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=models.F('depth') + (self.depth - old_depth),
+                )
+
 class Product(models.Model):
     STATUS_CHOICES = [
         ('active', 'Actif'),
@@ -347,6 +436,9 @@ class Product(models.Model):
     featured_image = models.ImageField(upload_to='product_images/', null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     is_featured = models.BooleanField(default=False)
+    # Quantité disponible ; None : stock non suivi (vente sans limite)
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    shopify_inventory_item_id = models.CharField(max_length=100, null=True, blank=True)
     meta_title = models.CharField(max_length=200, blank=True)
     meta_description = models.CharField(max_length=300, blank=True)
     
@@ -371,9 +463,50 @@ class Product(models.Model):
     def get_main_image(self):
         if self.featured_image:
             return self.featured_image
-        first_image = self.images.first()
+        # Lit le cache de prefetch_related (catalog_utils.PRODUCT_IMAGES_PREFETCH) ; un filter()
+        # ou order_by() ici relancerait une requête par produit dans les listes
+        first_image = next(iter(self.images.all()), None)
         return first_image.image if first_image else None
 
+class ProductFacetValue(models.Model):
+    """
+    Index des facettes d'un produit (tags, attributs des variantes actives), reconstruit à
+    chaque modification du produit ou de ses variantes : les comptes par valeur sont de simples GROUP BY.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='facet_values')
+    # 'tag' ou 'attr:<nom de l'attribut>' (ex. 'attr:Taille')
+    facet = models.CharField(max_length=110)
+    value = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ['product', 'facet', 'value']
+        indexes = [
+            models.Index(fields=['facet', 'value', 'product'], name='product_facet_value_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.facet}={self.value}"
+
+class ProductRecommendation(models.Model):
+    """
+    Voisins les plus proches d'un produit (achats communs et tags partagés), recalculés
+    hors ligne par la commande compute_recommendations : la fiche produit les lit en une requête.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['product', 'recommended']
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='product_recommendation_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} (#{self.rank})"
+
 class ProductImage(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
@@ -393,6 +526,9 @@ class ProductVariant(models.Model):
     price_adjustment = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     shopify_variant_id = models.CharField(max_length=100, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Stock propre à la variante ; None : le stock du produit s'applique
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    shopify_inventory_item_id = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -404,6 +540,33 @@ class ProductVariant(models.Model):
     def get_final_price(self):
         return self.product.price + self.price_adjustment
 
+# Numéros de commande ordonnés dans le temps : millisecondes (48 bits) + 32 bits aléatoires,
+# en base 32 de Crockford. Dans une même milliseconde, la partie aléatoire est incrémentée
+# (comme les ULID monotones), ce qui exclut toute collision au sein d'un processus.
+ORDER_NUMBER_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_order_number_lock = threading.Lock()
+_order_number_state = [0, 0]
+
+
+def generate_order_number():
+    with _order_number_lock:
+        millis = time.time_ns() // 1_000_000
+        last_millis, last_random = _order_number_state
+        if millis <= last_millis:
+            millis, entropy = last_millis, (last_random + 1) & 0xFFFFFFFF
+            if entropy == 0:
+                millis += 1
+        else:
+            entropy = secrets.randbits(32)
+        _order_number_state[:] = [millis, entropy]
+    value = (millis << 32) | entropy
+    chars = []
+    for _ in range(16):
+        value, digit = divmod(value, 32)
+        chars.append(ORDER_NUMBER_ALPHABET[digit])
+    return 'BLZ' + ''.join(reversed(chars))
+
+
 # Modèles de panier et commande
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -411,16 +574,27 @@ class Cart(models.Model):
     session_key = models.CharField(max_length=40, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Totaux dénormalisés, recalculés en base à chaque modification des lignes (cart_utils)
+    items_count = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Recherche du panier courant (visiteur ou utilisateur) et purge des paniers inactifs
+            models.Index(fields=['session_key', '-updated_at'], name='cart_session_idx'),
+            models.Index(fields=['user', '-updated_at'], name='cart_user_idx'),
+            models.Index(fields=['updated_at'], name='cart_updated_idx'),
+        ]
 
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.total_price
 
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.items_count
 
     @property
     def is_empty(self):
-        return not self.items.exists()
+        return self.items_count == 0
 
     def __str__(self):
         return f"Cart {self.id} - {self.user.username if self.user else 'Anonymous'}"
@@ -507,13 +681,8 @@ class Order(models.Model):
         return f"Order #{self.order_number}"
 
     def generate_order_number(self):
-        """Génère un numéro de commande unique"""
-        import random
-        import string
-        while True:
-            number = 'BLZ' + ''.join(random.choices(string.digits, k=8))
-            if not Order.objects.filter(order_number=number).exists():
-                return number
+        """Génère un numéro de commande unique, sans requête de vérification"""
+        return generate_order_number()
 
     def save(self, *args, **kwargs):
         if not self.order_number:
@@ -534,6 +703,32 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity}x {self.product_name}"
 
+class StockReservation(models.Model):
+    """Unités retirées du stock pour une commande, rendues si elle n'est pas payée à temps"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('committed', 'Confirmée'),
+        ('released', 'Libérée'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    # Exactement un des deux : le niveau auquel le stock a été décrémenté
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='stock_reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Réservation {self.quantity}x pour #{self.order.order_number} ({self.status})"
+
 # Transaction CinetPay pour la boutique (dropshipping)
 class ShopCinetPayTransaction(models.Model):
     STATUS_CHOICES = [
@@ -602,24 +797,12 @@ class UserReputation(models.Model):
         return get_seller_badge(float(self.seller_score))
 
     def update_reputation(self):
-        from .badge_config import get_seller_badge
+        from .reputation_utils import compute_seller_score
         
-        # Calcul du score vendeur avec facteur de confiance
-        if self.seller_total_transactions > 0:
-            base_score = (self.seller_successful_transactions / self.seller_total_transactions) * 100
-            confidence_factor = min(self.seller_total_transactions / 10, 1.0)
-            volume_adjusted_score = base_score * confidence_factor
-            
-            # Obtenir le badge potentiel et son facteur
-            potential_badge = get_seller_badge(volume_adjusted_score)
-            badge_factor = potential_badge.get('factor', 1.0) if potential_badge else 1.0
-            
-            # Score final avec facteur de badge
-            self.seller_score = volume_adjusted_score * badge_factor
-            
-            # Badge final
-            final_badge = get_seller_badge(self.seller_score)
-            self.seller_badge = final_badge['level'] if final_badge else 'bronze'
+        # Calcul du score vendeur avec facteur de confiance et facteur de badge
+        result = compute_seller_score(self.seller_successful_transactions, self.seller_total_transactions)
+        if result:
+            self.seller_score, self.seller_badge = result
         
         self.save()
 
@@ -673,6 +856,9 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['chat', 'created_at', 'id'], name='message_chat_created_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} at {self.created_at}"
@@ -688,6 +874,7 @@ class Notification(models.Model):
         ('group_invite', 'Invitation de groupe'),
         ('friend_request', "Demande d'ami"),
         ('friend_accept', 'Amitié acceptée'),
+        ('new_highlight', 'Nouveau highlight'),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -701,13 +888,54 @@ class Notification(models.Model):
     # Relations optionnelles
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
+    # Regroupement : les notifications non lues de même clé sont fusionnées (« 5 nouveaux messages »)
+    coalesce_key = models.CharField(max_length=100, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    link = models.CharField(max_length=200, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Fil paginé (lues et non lues, ou non lues seules) et marquage en masse
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notification_feed_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_recent_idx'),
+            models.Index(
+                fields=['coalesce_key', 'user'], name='notification_coalesce_idx',
+                condition=models.Q(is_read=False),
+            ),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.title}"
 
+class NotificationMute(models.Model):
+    """
+    Mise en sourdine des notifications d'un utilisateur : un type (vide = tous les types),
+    éventuellement limité à un groupe, jusqu'à une date (vide = sans limite)
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_mutes')
+    notification_type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES, blank=True)
+    group = models.ForeignKey('Group', on_delete=models.CASCADE, null=True, blank=True, related_name='notification_mutes')
+    muted_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'notification_type'], name='notification_mute_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mute {self.notification_type or 'all'} for {self.user.username}"
+
+class NotificationCounter(models.Model):
+    """Compteur de notifications non lues, maintenu à l'écriture (évite un COUNT(*) par page)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} notifications non lues"
+
 # Modèles pour les informations de paiement vendeur
 class SellerPaymentInfo(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -767,7 +995,8 @@ class Group(models.Model):
     avatar = models.ImageField(upload_to='group_avatars/', null=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_groups')
     created_at = models.DateTimeField(auto_now_add=True)
-    last_message_at = models.DateTimeField(auto_now=True)
+    # Mis à jour à l'envoi d'un message uniquement (pas à chaque sauvegarde du groupe)
+    last_message_at = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     max_members = models.IntegerField(default=100)
 
@@ -786,6 +1015,11 @@ class GroupMembership(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
     left_at = models.DateTimeField(null=True, blank=True)
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='added_members')
+    # Filigrane de lecture : dernier message lu (created_at, id). Les messages postérieurs sont non lus.
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    last_read_message = models.ForeignKey(
+        'GroupMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
 
     class Meta:
         unique_together = ['user', 'group']
@@ -805,6 +1039,10 @@ class GroupMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Historique incrémental : (created_at, id) sert de curseur « since »
+            models.Index(fields=['group', 'created_at', 'id'], name='groupmsg_group_created_idx'),
+        ]
 
     def __str__(self):
         return f"Group message from {self.sender.username} in {self.group.name}"
@@ -823,12 +1061,28 @@ class PrivateConversation(models.Model):
     user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='private_chats_as_user1')
     user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='private_chats_as_user2')
     created_at = models.DateTimeField(auto_now_add=True)
-    last_message_at = models.DateTimeField(auto_now=True)
+    # Mis à jour à l'envoi d'un message uniquement
+    last_message_at = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
 
     class Meta:
+        # Paire canonique (plus petit id, plus grand id) : une seule conversation par couple d'utilisateurs
         unique_together = ['user1', 'user2']
         ordering = ['-last_message_at']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(user1__lte=models.F('user2')),
+                name='private_conversation_canonical_pair'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.user1_id is not None and self.user2_id is not None and self.user1_id > self.user2_id:
+            self.user1, self.user2 = self.user2, self.user1
+        super().save(*args, **kwargs)
+
+    def get_other_user(self, user):
+        return self.user2 if self.user1_id == user.id else self.user1
 
     def __str__(self):
         return f"Conversation between {self.user1.username} and {self.user2.username}"
@@ -846,10 +1100,45 @@ class PrivateMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Historique incrémental : (created_at, id) sert de curseur « since »
+            models.Index(fields=['conversation', 'created_at', 'id'], name='privatemsg_conv_created_idx'),
+        ]
 
     def __str__(self):
         return f"Private message from {self.sender.username}"
 
+class InboxEntry(models.Model):
+    """
+    Entrée de la boîte de réception d'un participant (conversation privée ou groupe).
+    Dernier message et compteur de non-lus sont dénormalisés à l'envoi de chaque message.
+    """
+    KIND_CHOICES = [
+        ('private', 'Conversation privée'),
+        ('group', 'Groupe'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_entries')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    conversation = models.ForeignKey(PrivateConversation, on_delete=models.CASCADE, null=True, blank=True, related_name='inbox_entries')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='inbox_entries')
+    last_message_at = models.DateTimeField(default=timezone.now)
+    last_message_id = models.UUIDField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=120, blank=True)
+    last_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['user', 'conversation'], ['user', 'group']]
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['user', '-last_message_at'], name='inbox_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Inbox {self.kind} of {self.user.username}"
+
 # Modèles d'amitié
 class FriendRequest(models.Model):
     STATUS_CHOICES = [
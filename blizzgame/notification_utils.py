@@ -0,0 +1,345 @@
+"""
+Utilitaires de notifications BLIZZ
+Diffusion en masse par lots depuis une file en arrière-plan, regroupement des rafales,
+mises en sourdine, compteur de non-lus maintenu à l'écriture et fil paginé par curseur
+"""
+
+import logging
+import queue
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import CharField, Count, F, Q, Value
+from django.db.models.functions import Cast, Concat, Greatest, Left
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    GroupMembership, GroupMessage, Highlight, Notification, NotificationCounter, NotificationMute,
+    PrivateMessage, UserSubscription
+)
+from .search_utils import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+
+# Diffusion dans un thread de fond (par défaut) ou directement après la transaction de la requête
+NOTIFICATION_FANOUT_ASYNC = getattr(settings, 'NOTIFICATION_FANOUT_ASYNC', True)
+
+TITLE_MAX_LENGTH = Notification._meta.get_field('title').max_length
+PREVIEW_LENGTH = 120
+
+NOTIFICATION_PAGE_SIZE = 20
+# Badge de la barre de navigation : invalidé à chaque variation du compteur
+NOTIFICATION_COUNT_CACHE_TIMEOUT = getattr(settings, 'NOTIFICATION_COUNT_CACHE_TIMEOUT', 60)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ===== Compteur de non-lus =====
+
+def _unread_cache_key(user_id):
+    return f'notification_unread:{user_id}'
+
+
+def increment_unread_counts(user_ids, delta=1):
+    """Ajoute delta au compteur de chaque utilisateur (créé au besoin), en deux requêtes"""
+    if not user_ids:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+    )
+    NotificationCounter.objects.filter(user_id__in=user_ids).update(unread_count=F('unread_count') + delta)
+    cache.delete_many([_unread_cache_key(user_id) for user_id in user_ids])
+
+
+def decrement_unread_count(user_id, delta=1):
+    if delta:
+        NotificationCounter.objects.filter(user_id=user_id).update(
+            unread_count=Greatest(F('unread_count') - delta, Value(0))
+        )
+        cache.delete(_unread_cache_key(user_id))
+
+
+def rebuild_unread_counts(dry_run=False):
+    """
+    Recalcule les compteurs à partir des notifications non lues (un seul GROUP BY) et corrige
+    ceux qui ont dérivé (suppressions en masse, UPDATE directs). Retourne {utilisateur: (ancien, nouveau)}.
+    """
+    actual = dict(
+        Notification.objects.filter(is_read=False).order_by().values_list('user_id').annotate(unread=Count('id'))
+    )
+    stored = dict(NotificationCounter.objects.values_list('user_id', 'unread_count'))
+    drifted = {
+        user_id: (stored.get(user_id), actual.get(user_id, 0))
+        for user_id in actual.keys() | stored.keys()
+        if stored.get(user_id, 0) != actual.get(user_id, 0)
+    }
+    if dry_run or not drifted:
+        return drifted
+
+    with transaction.atomic():
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id) for user_id, (old, _) in drifted.items() if old is None],
+            ignore_conflicts=True,
+        )
+        NotificationCounter.objects.bulk_update(
+            [NotificationCounter(user_id=user_id, unread_count=new) for user_id, (_, new) in drifted.items()],
+            ['unread_count'],
+            batch_size=NOTIFICATION_BATCH_SIZE,
+        )
+    cache.delete_many([_unread_cache_key(user_id) for user_id in drifted])
+    return drifted
+
+
+def get_unread_notification_count(user):
+    """Nombre de notifications non lues, lu depuis le compteur maintenu"""
+    if not user.is_authenticated:
+        return 0
+    return NotificationCounter.objects.filter(user=user).values_list('unread_count', flat=True).first() or 0
+
+
+def get_cached_unread_notification_count(user):
+    """Compteur du badge de navigation, servi depuis le cache entre deux variations"""
+    if not user.is_authenticated:
+        return 0
+    key = _unread_cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = get_unread_notification_count(user)
+        cache.set(key, count, NOTIFICATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def mark_notification_read(user, notification_id):
+    """Marque une notification comme lue ; le compteur n'est décrémenté qu'au premier marquage"""
+    updated = Notification.objects.filter(id=notification_id, user=user, is_read=False).update(is_read=True)
+    decrement_unread_count(user.id, updated)
+    return updated
+
+
+def _up_to_cursor(cursor):
+    """Notifications du début du fil jusqu'au curseur inclus (ordre -created_at, -id)"""
+    decoded = decode_cursor(cursor, 'created_at')
+    if decoded is None:
+        return None
+    created_at, pk = decoded
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gte=pk)
+
+
+def mark_notifications_read(user, cursor=None):
+    """
+    Marque comme lues toutes les notifications non lues, ou seulement celles du début du fil
+    jusqu'au curseur d'une page déjà affichée, en un seul UPDATE. Retourne le nombre marqué.
+    """
+    notes = Notification.objects.filter(user=user, is_read=False)
+    if cursor:
+        up_to = _up_to_cursor(cursor)
+        if up_to is None:
+            return 0
+        notes = notes.filter(up_to)
+    updated = notes.update(is_read=True)
+    decrement_unread_count(user.id, updated)
+    return updated
+
+
+# ===== Fil de notifications =====
+
+def get_notifications(user, cursor=None, unread_only=False, limit=NOTIFICATION_PAGE_SIZE):
+    """
+    Page du fil de notifications, de la plus récente à la plus ancienne (pagination keyset).
+    Retourne (notifications, curseur_suivant) ; curseur_suivant vaut None sur la dernière page.
+    """
+    notes = Notification.objects.filter(user=user)
+    if unread_only:
+        notes = notes.filter(is_read=False)
+    if cursor:
+        decoded = decode_cursor(cursor, 'created_at')
+        if decoded:
+            created_at, pk = decoded
+            notes = notes.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # Le gabarit n'utilise que transaction_id et message_id : aucune jointure nécessaire
+    notes = list(notes.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(notes[limit - 1], 'created_at') if len(notes) > limit else None
+    return notes[:limit], next_cursor
+
+
+def serialize_notification(note):
+    return {
+        'id': str(note.id),
+        'type': note.type,
+        'title': note.title,
+        'content': note.content,
+        'count': note.count,
+        'link': note.link,
+        'is_read': note.is_read,
+        'created_at': note.created_at.isoformat(),
+        'time': note.created_at.strftime('%d/%m/%Y %H:%M'),
+        'cursor': encode_cursor(note, 'created_at'),
+    }
+
+
+# ===== Diffusion =====
+
+def filter_muted(user_ids, notification_type, group_id=None):
+    """Retire les destinataires ayant mis ce type de notification (ou ce groupe) en sourdine"""
+    mutes = NotificationMute.objects.filter(
+        Q(muted_until__isnull=True) | Q(muted_until__gt=timezone.now()),
+        user_id__in=user_ids,
+        notification_type__in=['', notification_type],
+    )
+    if group_id:
+        mutes = mutes.filter(Q(group__isnull=True) | Q(group_id=group_id))
+    else:
+        mutes = mutes.filter(group__isnull=True)
+    muted = set(mutes.values_list('user_id', flat=True))
+    return [user_id for user_id in user_ids if user_id not in muted]
+
+
+def _coalesced_title(template):
+    """Titre SQL « {count} ... » calculé à partir du compteur de chaque ligne regroupée"""
+    prefix, _, suffix = template.partition('{count}')
+    return Left(
+        Concat(Value(prefix), Cast(F('count') + 1, output_field=CharField()), Value(suffix), output_field=CharField()),
+        TITLE_MAX_LENGTH,
+    )
+
+
+def fan_out_notification(user_ids, notification_type, title, content, coalesce_key='',
+                         coalesced_title=None, group_id=None, link='', **relations):
+    """
+    Crée une notification par destinataire, par lots de NOTIFICATION_BATCH_SIZE (bulk_create).
+    Avec coalesce_key, un destinataire qui a déjà une notification non lue de même clé voit
+    celle-ci mise à jour (compteur +1, titre coalesced_title où {count} est remplacé) au lieu
+    d'en recevoir une nouvelle. Retourne le nombre de notifications créées.
+    """
+    created = 0
+    for chunk in _chunks(list(dict.fromkeys(user_ids)), NOTIFICATION_BATCH_SIZE):
+        chunk = filter_muted(chunk, notification_type, group_id)
+        if not chunk:
+            continue
+        with transaction.atomic():
+            if coalesce_key:
+                pending = Notification.objects.filter(coalesce_key=coalesce_key, user_id__in=chunk, is_read=False)
+                coalesced = set(pending.values_list('user_id', flat=True))
+                if coalesced:
+                    updates = {'count': F('count') + 1, 'content': content, 'created_at': timezone.now()}
+                    if coalesced_title:
+                        updates['title'] = _coalesced_title(coalesced_title)
+                    pending.update(**updates)
+                    chunk = [user_id for user_id in chunk if user_id not in coalesced]
+
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id, type=notification_type, title=title[:TITLE_MAX_LENGTH], content=content,
+                    coalesce_key=coalesce_key, link=link, **relations,
+                )
+                for user_id in chunk
+            ])
+            # Une notification regroupée reste un seul élément non lu
+            increment_unread_counts(chunk)
+        created += len(chunk)
+    return created
+
+
+class NotificationQueue:
+    """
+    File de diffusion en arrière-plan : un thread démon par processus exécute les tâches
+    hors du chemin de la requête. Les tâches en attente sont perdues à l'arrêt du processus.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, func, *args, **kwargs):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-fanout', daemon=True)
+                self._thread.start()
+        self._queue.put((func, args, kwargs))
+
+    def join(self):
+        """Attend la fin des tâches en cours (commandes de gestion, scripts)"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Erreur lors de la diffusion des notifications ({func.__name__}): {e}")
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+
+notification_queue = NotificationQueue()
+
+
+def enqueue_fan_out(func, *args, **kwargs):
+    """Planifie une diffusion après validation de la transaction courante"""
+    if NOTIFICATION_FANOUT_ASYNC:
+        transaction.on_commit(lambda: notification_queue.put(func, *args, **kwargs))
+    else:
+        transaction.on_commit(lambda: func(*args, **kwargs))
+
+
+# ===== Notifications métier (exécutées en arrière-plan) =====
+
+def notify_group_message(message_id):
+    message = GroupMessage.objects.select_related('group', 'sender').filter(id=message_id).first()
+    if message is None:
+        return
+    group = message.group
+    members = GroupMembership.objects.filter(group=group, is_active=True).exclude(user_id=message.sender_id)
+    fan_out_notification(
+        list(members.values_list('user_id', flat=True)),
+        'group_message',
+        title=f"Nouveau message dans {group.name}",
+        coalesced_title=f"{{count}} nouveaux messages dans {group.name}",
+        content=f"{message.sender.username}: {message.content[:PREVIEW_LENGTH]}",
+        coalesce_key=f'group_message:{group.id}',
+        group_id=group.id,
+        link=reverse('group_chat', args=[group.id]),
+    )
+
+
+def notify_private_message(message_id):
+    message = PrivateMessage.objects.select_related('conversation', 'sender').filter(id=message_id).first()
+    if message is None:
+        return
+    conversation = message.conversation
+    fan_out_notification(
+        [conversation.user2_id if conversation.user1_id == message.sender_id else conversation.user1_id],
+        'private_message',
+        title=f"Nouveau message de {message.sender.username}",
+        coalesced_title=f"{{count}} nouveaux messages de {message.sender.username}",
+        content=message.content[:PREVIEW_LENGTH],
+        coalesce_key=f'private_message:{conversation.id}',
+        link=reverse('private_chat', args=[message.sender_id]),
+    )
+
+
+def notify_new_highlight(highlight_id):
+    highlight = Highlight.objects.select_related('author').filter(id=highlight_id).first()
+    if highlight is None:
+        return
+    author = highlight.author
+    subscribers = UserSubscription.objects.filter(subscribed_to=author).values_list('subscriber_id', flat=True)
+    fan_out_notification(
+        list(subscribers),
+        'new_highlight',
+        title=f"{author.username} a publié un highlight",
+        coalesced_title=f"{author.username} a publié {{count}} highlights",
+        content=highlight.caption[:PREVIEW_LENGTH],
+        coalesce_key=f'new_highlight:{author.id}',
+        link=reverse('highlight_detail', args=[highlight.id]),
+    )
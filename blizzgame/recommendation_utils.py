@@ -0,0 +1,149 @@
+"""
+Recommandations de produits BLIZZ
+Similarité article-article calculée hors ligne à partir des achats communs (cosinus sur les
+commandes payées) et des tags partagés (Jaccard) ; les plus proches voisins de chaque produit
+sont stockés et servis à la fiche produit en une requête
+"""
+
+import heapq
+import math
+from collections import defaultdict
+from datetime import timedelta
+from itertools import combinations
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .catalog_utils import with_images
+from .models import OrderItem, Product, ProductRecommendation
+
+RECOMMENDATIONS_TOP_K = getattr(settings, 'SHOP_RECOMMENDATIONS_TOP_K', 8)
+# Ancienneté maximale des commandes prises en compte
+RECOMMENDATIONS_HISTORY_DAYS = getattr(settings, 'SHOP_RECOMMENDATIONS_HISTORY_DAYS', 365)
+
+# Poids des deux signaux dans le score final
+CO_PURCHASE_WEIGHT = 0.7
+TAG_WEIGHT = 0.3
+
+# Un panier ou un tag trop large produit un nombre quadratique de paires pour une information faible
+MAX_BASKET_SIZE = 50
+MAX_TAG_PRODUCTS = 500
+
+RELATED_PRODUCTS_LIMIT = 4
+
+
+def _order_baskets(product_ids, since):
+    """Produits distincts (parmi product_ids) de chaque commande payée depuis since"""
+    baskets = defaultdict(set)
+    rows = (
+        OrderItem.objects.filter(order__payment_status='paid', order__created_at__gte=since)
+        .exclude(order__status__in=['cancelled', 'refunded'])
+        .values_list('order_id', 'product_id')
+    )
+    for order_id, product_id in rows.iterator(chunk_size=2000):
+        if product_id in product_ids:
+            baskets[order_id].add(product_id)
+    return baskets.values()
+
+
+def _symmetric(pair_scores):
+    similarity = defaultdict(dict)
+    for (a, b), score in pair_scores.items():
+        similarity[a][b] = similarity[b][a] = score
+    return similarity
+
+
+def co_purchase_similarity(baskets):
+    """
+    Cosinus entre les vecteurs produit x commande (matrice creuse tenue en dictionnaires) :
+    commandes communes / sqrt(commandes du premier * commandes du second)
+    """
+    orders = defaultdict(int)
+    together = defaultdict(int)
+    for basket in baskets:
+        for product_id in basket:
+            orders[product_id] += 1
+        if len(basket) > MAX_BASKET_SIZE:
+            continue
+        for pair in combinations(sorted(basket), 2):
+            together[pair] += 1
+    return _symmetric({
+        (a, b): count / math.sqrt(orders[a] * orders[b]) for (a, b), count in together.items()
+    })
+
+
+def tag_similarity(product_tags):
+    """Indice de Jaccard des tags, par index inversé : seules les paires partageant un tag sont visitées"""
+    by_tag = defaultdict(list)
+    for product_id, tags in product_tags.items():
+        for tag in tags:
+            by_tag[tag].append(product_id)
+
+    shared = defaultdict(int)
+    for products in by_tag.values():
+        if len(products) > MAX_TAG_PRODUCTS:
+            continue
+        for pair in combinations(sorted(products), 2):
+            shared[pair] += 1
+    return _symmetric({
+        (a, b): count / (len(product_tags[a]) + len(product_tags[b]) - count)
+        for (a, b), count in shared.items()
+    })
+
+
+def _normalized_tags(tags):
+    return {tag.strip().lower() for tag in (tags or []) if isinstance(tag, str) and tag.strip()}
+
+
+def compute_neighbours(top_k=RECOMMENDATIONS_TOP_K, days=RECOMMENDATIONS_HISTORY_DAYS):
+    """Retourne {produit: [(voisin, score), ...]} pour les produits actifs, meilleurs voisins d'abord"""
+    product_tags = {
+        pk: _normalized_tags(tags)
+        for pk, tags in Product.objects.filter(status='active').values_list('pk', 'tags').iterator(chunk_size=2000)
+    }
+    since = timezone.now() - timedelta(days=days)
+    co_purchase = co_purchase_similarity(_order_baskets(product_tags.keys(), since))
+    tags = tag_similarity(product_tags)
+
+    neighbours = {}
+    for product_id in co_purchase.keys() | tags.keys():
+        bought, tagged = co_purchase.get(product_id, {}), tags.get(product_id, {})
+        scores = {
+            other: CO_PURCHASE_WEIGHT * bought.get(other, 0) + TAG_WEIGHT * tagged.get(other, 0)
+            for other in bought.keys() | tagged.keys()
+        }
+        # Égalités départagées par identifiant pour un résultat stable d'un calcul à l'autre
+        neighbours[product_id] = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], item[0].hex))
+    return neighbours
+
+
+def compute_recommendations(top_k=RECOMMENDATIONS_TOP_K, days=RECOMMENDATIONS_HISTORY_DAYS, dry_run=False):
+    """Recalcule et remplace toutes les recommandations. Retourne (produits, lignes)"""
+    neighbours = compute_neighbours(top_k, days)
+    rows = [
+        ProductRecommendation(product_id=product_id, recommended_id=other, rank=rank, score=score)
+        for product_id, ranked in neighbours.items()
+        for rank, (other, score) in enumerate(ranked, start=1)
+    ]
+    if not dry_run:
+        with transaction.atomic():
+            ProductRecommendation.objects.all().delete()
+            ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(neighbours), len(rows)
+
+
+def get_related_products(product, limit=RELATED_PRODUCTS_LIMIT):
+    """
+    Produits liés : voisins précalculés (une requête sur l'index product, rank), complétés
+    au besoin par les nouveautés de la même catégorie tant que le calcul n'a pas couvert le produit
+    """
+    related = list(with_images(
+        Product.objects.filter(recommended_for__product=product, status='active')
+        .order_by('recommended_for__rank')[:limit]
+    ))
+    if len(related) < limit:
+        related += list(with_images(
+            Product.objects.filter(category_id=product.category_id, status='active')
+            .exclude(pk__in=[product.pk, *(p.pk for p in related)])
+            .order_by('-created_at')[:limit - len(related)]
+        ))
+    return related
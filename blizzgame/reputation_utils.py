@@ -0,0 +1,282 @@
+"""
+Utilitaires pour le système de réputation BLIZZ
+Application incrémentale des évaluations et résumés de réputation
+"""
+
+from collections import defaultdict
+from django.db.models import F, Value, Case, When, Count, CharField, FloatField, ExpressionWrapper
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
+from .badge_config import SELLER_BADGES, get_seller_badge, get_seller_badge_with_translation
+from .models import UserReputation, UserRating
+
+# Nombre de transactions à partir duquel le score n'est plus pénalisé par le volume
+CONFIDENCE_THRESHOLD = 10
+
+TOTAL_COUNTERS = {
+    'seller': 'seller_total_transactions',
+    'buyer': 'buyer_total_transactions',
+}
+
+# Compteur incrémenté pour chaque issue d'évaluation, selon le rôle évalué
+OUTCOME_COUNTERS = {
+    'seller': {
+        'success': 'seller_successful_transactions',
+        'failed': 'seller_failed_transactions',
+        'disputed': 'seller_failed_transactions',
+        'fraudulent': 'seller_fraudulent_transactions',
+    },
+    'buyer': {
+        'success': 'buyer_successful_transactions',
+        'failed': 'buyer_failed_transactions',
+        'disputed': 'buyer_disputed_transactions',
+        'fraudulent': 'buyer_failed_transactions',
+    },
+}
+
+COUNTER_FIELDS = sorted(
+    set(TOTAL_COUNTERS.values()) | {field for counters in OUTCOME_COUNTERS.values() for field in counters.values()}
+)
+
+
+def compute_seller_score(successful, total):
+    """
+    Calcule le score vendeur et le niveau de badge à partir des compteurs.
+    Retourne None si le vendeur n'a aucune transaction.
+    """
+    if total <= 0:
+        return None
+    base_score = (successful / total) * 100
+    confidence_factor = min(total / CONFIDENCE_THRESHOLD, 1.0)
+    volume_adjusted_score = base_score * confidence_factor
+
+    # Facteur du badge potentiel puis badge final
+    potential_badge = get_seller_badge(volume_adjusted_score)
+    score = volume_adjusted_score * potential_badge.get('factor', 1.0)
+    return score, get_seller_badge(score)['level']
+
+
+def _tiered(value, then):
+    """Construit un CASE SQL sur les seuils de badge (du plus élevé au plus bas)"""
+    whens = [
+        When(GreaterThanOrEqual(value, badge['min_score']), then=then(badge))
+        for badge in reversed(SELLER_BADGES[1:])
+    ]
+    return Case(*whens, default=then(SELLER_BADGES[0]))
+
+
+def _seller_score_expressions(successful, total):
+    """
+    Équivalent SQL de compute_seller_score, pour recalculer le score et le badge
+    dans le même UPDATE que les compteurs.
+    """
+    base_score = ExpressionWrapper(successful * Value(100.0) / total, output_field=FloatField())
+    confidence_factor = Least(
+        ExpressionWrapper(total / Value(float(CONFIDENCE_THRESHOLD)), output_field=FloatField()),
+        Value(1.0),
+    )
+    volume_adjusted_score = ExpressionWrapper(base_score * confidence_factor, output_field=FloatField())
+    score = _tiered(
+        volume_adjusted_score,
+        lambda badge: ExpressionWrapper(
+            volume_adjusted_score * Value(badge.get('factor', 1.0)), output_field=FloatField()
+        ),
+    )
+    level = _tiered(score, lambda badge: Value(badge['level']))
+
+    # Sans transaction, le score et le badge existants sont conservés
+    has_transactions = GreaterThan(total, 0)
+    return (
+        Case(When(has_transactions, then=score), default=F('seller_score'), output_field=FloatField()),
+        Case(When(has_transactions, then=level), default=F('seller_badge'), output_field=CharField()),
+    )
+
+
+def _seller_score_from_counters():
+    return _seller_score_expressions(F('seller_successful_transactions'), F('seller_total_transactions'))
+
+
+def recompute_seller_scores(reputations=None):
+    """
+    Recalcule en un seul UPDATE le score et le badge vendeur à partir des compteurs stockés
+    (mêmes expressions que apply_reputation_deltas). Retourne le nombre de réputations recalculées.
+    """
+    if reputations is None:
+        reputations = UserReputation.objects.all()
+    score, badge = _seller_score_from_counters()
+    return reputations.filter(seller_total_transactions__gt=0).update(
+        seller_score=score, seller_badge=badge, last_updated=timezone.now()
+    )
+
+
+def projected_seller_badges(reputations=None):
+    """
+    Badges qu'attribuerait recompute_seller_scores, sans rien écrire (un seul GROUP BY).
+    Retourne ({badge: nombre de réputations}, nombre de badges qui changeraient).
+    """
+    if reputations is None:
+        reputations = UserReputation.objects.all()
+    _, badge = _seller_score_from_counters()
+    projected = reputations.order_by().annotate(projected_badge=badge)
+    histogram = dict(projected.values_list('projected_badge').annotate(count=Count('pk')))
+    return histogram, projected.exclude(projected_badge=F('seller_badge')).count()
+
+
+def _rating_deltas(rating_type, outcome, sign):
+    return {
+        TOTAL_COUNTERS[rating_type]: sign,
+        OUTCOME_COUNTERS[rating_type][outcome]: sign,
+    }
+
+
+def apply_reputation_deltas(user_id, deltas, create=True):
+    """
+    Applique des variations de compteurs à la réputation d'un utilisateur en un seul UPDATE
+    atomique (expressions F()). Le score et le badge vendeur sont recalculés dans la même requête.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    new_values = {field: F(field) + Value(delta) for field, delta in deltas.items()}
+    updates = dict(new_values)
+    if any(field.startswith('seller_') for field in deltas):
+        successful = new_values.get('seller_successful_transactions', F('seller_successful_transactions'))
+        total = new_values.get('seller_total_transactions', F('seller_total_transactions'))
+        updates['seller_score'], updates['seller_badge'] = _seller_score_expressions(successful, total)
+    updates['last_updated'] = timezone.now()
+
+    if not UserReputation.objects.filter(user_id=user_id).update(**updates) and create:
+        UserReputation.objects.get_or_create(user_id=user_id)
+        UserReputation.objects.filter(user_id=user_id).update(**updates)
+
+
+def apply_rating_change(user_id, previous=None, current=None):
+    """
+    Répercute la création, la modification ou la suppression d'une évaluation.
+    previous et current sont des couples (rating_type, outcome) ou None.
+    """
+    deltas = defaultdict(int)
+    if previous:
+        for field, delta in _rating_deltas(*previous, -1).items():
+            deltas[field] += delta
+    if current:
+        for field, delta in _rating_deltas(*current, 1).items():
+            deltas[field] += delta
+    # Une suppression seule (ex: cascade depuis l'utilisateur) ne crée pas de réputation
+    apply_reputation_deltas(user_id, deltas, create=current is not None)
+
+
+def aggregate_rating_counters(ratings=None):
+    """
+    Agrège les évaluations en compteurs de réputation par utilisateur (une seule requête GROUP BY).
+    Retourne {user_id: {champ_compteur: valeur}}.
+    """
+    if ratings is None:
+        ratings = UserRating.objects.all()
+    rows = (
+        ratings.order_by()
+        .values('user_id', 'rating_type', 'outcome')
+        .annotate(count=Count('id'))
+    )
+
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for row in rows:
+        rating_type, outcome = row['rating_type'], row['outcome']
+        if outcome not in OUTCOME_COUNTERS.get(rating_type, {}):
+            continue
+        user_counters = counters[row['user_id']]
+        user_counters[TOTAL_COUNTERS[rating_type]] += row['count']
+        user_counters[OUTCOME_COUNTERS[rating_type][outcome]] += row['count']
+    return counters
+
+
+def apply_counters(reputation, counters):
+    """Remplace les compteurs d'une réputation (sans sauvegarder) et recalcule le score vendeur"""
+    for field in COUNTER_FIELDS:
+        setattr(reputation, field, counters.get(field, 0))
+    result = compute_seller_score(reputation.seller_successful_transactions, reputation.seller_total_transactions)
+    if result:
+        reputation.seller_score, reputation.seller_badge = result
+    else:
+        reputation.seller_score = UserReputation._meta.get_field('seller_score').default
+        reputation.seller_badge = UserReputation._meta.get_field('seller_badge').default
+    return reputation
+
+
+def update_user_reputation(user):
+    """Reconstruit entièrement la réputation d'un utilisateur à partir de ses évaluations"""
+    counters = aggregate_rating_counters(UserRating.objects.filter(user=user)).get(user.id, {})
+    reputation, _ = UserReputation.objects.get_or_create(user=user)
+    apply_counters(reputation, counters)
+    reputation.save()
+    return reputation
+
+
+def create_transaction_rating(transaction, rating_type, outcome, notes=None):
+    """
+    Enregistre (ou met à jour) l'évaluation du vendeur ou de l'acheteur d'une transaction.
+    Les compteurs de réputation sont mis à jour par les signaux de UserRating.
+    """
+    rated_user = transaction.seller if rating_type == 'seller' else transaction.buyer
+    rating, _ = UserRating.objects.update_or_create(
+        user=rated_user,
+        transaction=transaction,
+        rating_type=rating_type,
+        defaults={'outcome': outcome, 'notes': notes},
+    )
+    return rating
+
+
+def get_user_reputation_summary(user):
+    """Retourne un résumé de la réputation vendeur et acheteur d'un utilisateur"""
+    reputation = UserReputation.objects.filter(user=user).first()
+    if reputation is None:
+        reputation = UserReputation(user=user)
+
+    seller_score = float(reputation.seller_score)
+    return {
+        'seller': {
+            'total_transactions': reputation.seller_total_transactions,
+            'successful_transactions': reputation.seller_successful_transactions,
+            'failed_transactions': reputation.seller_failed_transactions,
+            'fraudulent_transactions': reputation.seller_fraudulent_transactions,
+            'score': seller_score,
+            'badge': get_seller_badge(seller_score),
+        },
+        'buyer': {
+            'total_transactions': reputation.buyer_total_transactions,
+            'successful_transactions': reputation.buyer_successful_transactions,
+            'failed_purchases_count': reputation.buyer_failed_transactions,
+            'disputed_transactions': reputation.buyer_disputed_transactions,
+            'score': float(reputation.buyer_score),
+        },
+    }
+
+
+def get_seller_badges(user_ids, language='fr'):
+    """
+    Résout en une seule requête les badges vendeurs d'un ensemble d'utilisateurs.
+    Retourne {user_id: badge traduit}; les vendeurs sans réputation ont le badge Bronze.
+    """
+    user_ids = set(user_ids)
+    user_ids.discard(None)
+    scores = dict(
+        UserReputation.objects.filter(user_id__in=user_ids).values_list('user_id', 'seller_score')
+    ) if user_ids else {}
+    return {
+        user_id: get_seller_badge_with_translation(
+            float(scores[user_id]) if user_id in scores else None, language
+        )
+        for user_id in user_ids
+    }
+
+
+def attach_seller_badges(posts, language='fr'):
+    """Ajoute l'attribut seller_badge aux annonces d'une page (une requête pour toute la page)"""
+    posts = list(posts)
+    badges = get_seller_badges((post.author_id for post in posts), language)
+    for post in posts:
+        post.seller_badge = badges.get(post.author_id)
+    return posts
@@ -0,0 +1,421 @@
+"""
+Utilitaires de recherche pour les annonces de comptes gaming (Post) et les produits de la boutique
+Index plein texte, filtres, pagination par curseur (keyset), classement BM25 et autocomplétion
+"""
+
+import base64
+import json
+import re
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from html import unescape
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q, TextField
+from django.db.models.functions import Cast
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.html import strip_tags
+from .models import Post, Product
+
+POST_FTS_TABLE = 'blizzgame_post_fts'
+
+# Tri -> (champ, décroissant). L'id sert toujours de départage pour le curseur.
+POST_SORTS = {
+    'created_at': ('created_at', True),
+    'price_asc': ('price', False),
+    'price_desc': ('price', True),
+    'title': ('title', False),
+    'level_desc': ('level_value', True),
+    'coins_desc': ('coins_value', True),
+}
+
+# Champs numériques normalisés : les annonces sans valeur sont exclues de ces tris
+NUMERIC_SORT_FIELDS = ('level_value', 'coins_value')
+
+DATE_FILTERS = {
+    'today': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+}
+
+SEARCH_PAGE_SIZE = 20
+
+
+# ===== Index plein texte (SQLite FTS5) =====
+
+def _uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def fts_rowid(pk):
+    """
+    Rowid FTS5 d'une annonce ou d'un produit : les 64 premiers bits de son UUID. Les mises à jour
+    et suppressions passent par la clé rowid, une colonne UNINDEXED n'étant lisible que par parcours complet.
+    """
+    return int.from_bytes(pk.bytes[:8], 'big', signed=True)
+
+
+def index_post(post):
+    """Met à jour l'entrée plein texte d'une annonce"""
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {POST_FTS_TABLE} (rowid, post_id, title, caption, custom_game_name) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            [fts_rowid(post.pk), post.pk.hex, post.title or '', post.caption or '', post.custom_game_name or ''],
+        )
+
+
+def unindex_post(post_id):
+    """Supprime une annonce de l'index plein texte"""
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_FTS_TABLE} WHERE rowid = %s', [fts_rowid(post_id)])
+
+
+def _fts_match_expression(query):
+    """Transforme la saisie utilisateur en requête FTS5 sûre (préfixes en ET)"""
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def full_text_filter(posts, query):
+    """Restreint un queryset d'annonces aux résultats d'une recherche plein texte"""
+    query = (query or '').strip()
+    if not query:
+        return posts
+
+    if _uses_fts():
+        match = _fts_match_expression(query)
+        if not match:
+            return posts
+        return posts.filter(
+            id__in=RawSQL(f'SELECT post_id FROM {POST_FTS_TABLE} WHERE {POST_FTS_TABLE} MATCH %s', (match,))
+        )
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+        vector = (
+            SearchVector('title', weight='A')
+            + SearchVector('caption', weight='B')
+            + SearchVector('custom_game_name', weight='B')
+        )
+        return posts.annotate(search=vector).filter(search=SearchQuery(query, search_type='websearch'))
+
+    return posts.filter(
+        Q(title__icontains=query) | Q(caption__icontains=query) | Q(custom_game_name__icontains=query)
+    )
+
+
+# ===== Pagination par curseur =====
+
+def encode_cursor(post, field):
+    value = getattr(post, field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([str(value), str(post.pk)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, field):
+    """Retourne (valeur, id) ou None si le curseur est invalide"""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if field == 'created_at':
+            value = datetime.fromisoformat(value)
+        elif field == 'price':
+            value = Decimal(value)
+        elif field in NUMERIC_SORT_FIELDS:
+            value = int(value)
+        return value, uuid.UUID(pk)
+    except (ValueError, TypeError, AttributeError, InvalidOperation, ValidationError):
+        return None
+
+
+def _after_cursor(field, descending, value, pk):
+    op = 'lt' if descending else 'gt'
+    return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+
+
+# ===== Recherche =====
+
+def _decimal_param(params, name):
+    try:
+        return Decimal(params.get(name))
+    except (TypeError, InvalidOperation):
+        return None
+
+
+def _int_param(params, name):
+    try:
+        return int(params.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _bool_param(params, name):
+    value = params.get(name)
+    if value in ('1', 'true', 'on'):
+        return True
+    if value in ('0', 'false', 'off'):
+        return False
+    return None
+
+
+def filter_posts(params):
+    """Construit le queryset filtré des annonces à partir des paramètres GET"""
+    posts = Post.objects.all()
+
+    game = params.get('game') or params.get('game_type')
+    if game and game != 'all':
+        posts = posts.filter(game_type=game)
+
+    price_min = _decimal_param(params, 'price_min')
+    if price_min is not None:
+        posts = posts.filter(price__gte=price_min)
+    price_max = _decimal_param(params, 'price_max')
+    if price_max is not None:
+        posts = posts.filter(price__lte=price_max)
+
+    for name in ('is_sold', 'is_verified'):
+        value = _bool_param(params, name)
+        if value is not None:
+            posts = posts.filter(**{name: value})
+
+    # Niveau et pièces : une valeur numérique est un minimum, sinon recherche textuelle
+    for name in ('coins', 'level'):
+        value = (params.get(name) or '').strip()
+        # isdecimal et non isdigit : « ² » est un chiffre mais int() le refuse
+        if value.isdecimal():
+            posts = posts.filter(**{f'{name}_value__gte': int(value)})
+        elif value:
+            posts = posts.filter(**{f'{name}__icontains': value})
+        for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+            number = _int_param(params, f'{bound}_{name}')
+            if number is not None:
+                posts = posts.filter(**{f'{name}_value__{lookup}': number})
+
+    period = DATE_FILTERS.get(params.get('date'))
+    if period:
+        posts = posts.filter(created_at__gte=timezone.now() - period)
+
+    return full_text_filter(posts, params.get('q'))
+
+
+def search_posts(params, limit=SEARCH_PAGE_SIZE):
+    """
+    Recherche paginée par curseur.
+    Retourne (annonces, curseur_suivant) ; curseur_suivant vaut None sur la dernière page.
+    """
+    field, descending = POST_SORTS.get(params.get('sort'), POST_SORTS['created_at'])
+    posts = filter_posts(params)
+    if field in NUMERIC_SORT_FIELDS:
+        posts = posts.filter(**{f'{field}__isnull': False})
+
+    cursor = params.get('cursor')
+    if cursor:
+        decoded = decode_cursor(cursor, field)
+        if decoded:
+            posts = posts.filter(_after_cursor(field, descending, *decoded))
+
+    prefix = '-' if descending else ''
+    posts = list(
+        posts.select_related('author', 'author__profile')
+        .order_by(f'{prefix}{field}', f'{prefix}id')[:limit + 1]
+    )
+    next_cursor = encode_cursor(posts[limit - 1], field) if len(posts) > limit else None
+    return posts[:limit], next_cursor
+
+
+# ===== Recherche des produits de la boutique =====
+
+PRODUCT_FTS_TABLE = 'blizzgame_product_fts'
+# Colonnes indexées, dans l'ordre de la table virtuelle (après product_id)
+PRODUCT_FTS_COLUMNS = ('name', 'tags', 'short_description', 'description')
+# Poids BM25 par colonne : le nom compte plus que les tags, le résumé puis la description
+PRODUCT_FTS_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+PRODUCT_SEARCH_LIMIT = 20
+PRODUCT_AUTOCOMPLETE_LIMIT = 8
+PRODUCT_AUTOCOMPLETE_CACHE_PREFIX_LENGTH = 3
+PRODUCT_AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+
+def product_search_document(product):
+    """Texte indexé d'un produit (description sans HTML, tags séparés par des espaces)"""
+    tags = ' '.join(tag for tag in (product.tags or []) if isinstance(tag, str))
+    return {
+        'name': product.name or '',
+        'tags': tags,
+        'short_description': product.short_description or '',
+        'description': unescape(strip_tags(product.description or '')),
+    }
+
+
+def index_products(products):
+    """Met à jour les entrées plein texte d'une série de produits (import en masse)"""
+    if not _uses_fts():
+        return
+    rows = []
+    for product in products:
+        document = product_search_document(product)
+        rows.append([fts_rowid(product.pk), product.pk.hex, *(document[column] for column in PRODUCT_FTS_COLUMNS)])
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {PRODUCT_FTS_TABLE} (rowid, product_id, {", ".join(PRODUCT_FTS_COLUMNS)}) '
+            f'VALUES (%s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def index_product(product):
+    """Met à jour l'entrée plein texte d'un produit"""
+    index_products([product])
+
+
+def unindex_product(product_id):
+    """Supprime un produit de l'index plein texte"""
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {PRODUCT_FTS_TABLE} WHERE rowid = %s', [fts_rowid(product_id)])
+
+
+def _product_ranked_sql():
+    """Meilleures entrées de l'index pour une requête MATCH, de la plus pertinente à la moins pertinente"""
+    weights = ', '.join(str(weight) for weight in PRODUCT_FTS_WEIGHTS)
+    return (
+        f'SELECT product_id FROM {PRODUCT_FTS_TABLE} WHERE {PRODUCT_FTS_TABLE} MATCH %s '
+        f'ORDER BY bm25({PRODUCT_FTS_TABLE}, 0, {weights}) LIMIT %s'
+    )
+
+
+def _autocomplete_match_expression(query):
+    """Préfixes de tous les mots, limités au nom du produit"""
+    match = _fts_match_expression(query)
+    return f'name : ({match})' if match else ''
+
+
+def _ranked_active_products(products, match, limit, offset=0):
+    """
+    Classement BM25 calculé dans l'index seul (sans jointure, bien plus rapide sur les termes
+    fréquents) sur une fenêtre de candidats ; les produits inactifs sont écartés au chargement
+    et la fenêtre n'est élargie que s'ils empêchent de remplir la page.
+    """
+    window = (offset + limit) * 2
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(_product_ranked_sql(), [match, window])
+            ids = [uuid.UUID(product_id) for product_id, in cursor.fetchall()]
+        found = products.filter(status='active').in_bulk(ids)
+        ranked = [found[pk] for pk in ids if pk in found]
+        if len(ranked) >= offset + limit or len(ids) < window:
+            return ranked[offset:offset + limit]
+        window *= 4
+
+
+def _postgres_product_search(query, prefix_only_name=False):
+    """Recherche PostgreSQL : vecteur pondéré (nom A, tags B, résumé C, description D) et ts_rank"""
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+    terms = re.findall(r'\w+', query)
+    search_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw')
+    if prefix_only_name:
+        vector = SearchVector('name', weight='A')
+    else:
+        vector = (
+            SearchVector('name', weight='A')
+            + SearchVector(Cast('tags', TextField()), weight='B')
+            + SearchVector('short_description', weight='C')
+            + SearchVector('description', weight='D')
+        )
+    return (
+        Product.objects.filter(status='active')
+        .annotate(search=vector, search_rank=SearchRank(vector, search_query))
+        .filter(search=search_query)
+        .order_by('-search_rank', 'name')
+    )
+
+
+def search_products(query, limit=PRODUCT_SEARCH_LIMIT, offset=0):
+    """Produits actifs classés par pertinence (BM25 sous SQLite, ts_rank sous PostgreSQL)"""
+    query = (query or '').strip()
+    if not query:
+        return []
+
+    if _uses_fts():
+        match = _fts_match_expression(query)
+        if not match:
+            return []
+        return _ranked_active_products(Product.objects.select_related('category'), match, limit, offset)
+
+    if connection.vendor == 'postgresql':
+        return list(_postgres_product_search(query).select_related('category')[offset:offset + limit])
+
+    return list(
+        Product.objects.filter(status='active')
+        .filter(Q(name__icontains=query) | Q(short_description__icontains=query) | Q(description__icontains=query))
+        .select_related('category').order_by('name')[offset:offset + limit]
+    )
+
+
+def _autocomplete_products(query, limit):
+    if _uses_fts():
+        match = _autocomplete_match_expression(query)
+        if not match:
+            return []
+        products = _ranked_active_products(Product.objects.only('name', 'slug', 'status'), match, limit)
+        return [(product.name, product.slug) for product in products]
+
+    if connection.vendor == 'postgresql':
+        products = _postgres_product_search(query, prefix_only_name=True)
+    else:
+        products = Product.objects.filter(status='active', name__istartswith=query).order_by('name')
+    return list(products.values_list('name', 'slug')[:limit])
+
+
+def autocomplete_products(query, limit=PRODUCT_AUTOCOMPLETE_LIMIT):
+    """
+    Suggestions de produits pour la saisie en cours (préfixes sur le nom).
+    Les préfixes courts, les plus fréquents, sont mis en cache.
+    """
+    terms = re.findall(r'\w+', (query or '').lower())
+    if not terms:
+        return []
+    query = ' '.join(terms)
+    if len(query) > PRODUCT_AUTOCOMPLETE_CACHE_PREFIX_LENGTH:
+        return _autocomplete_products(query, limit)
+    key = f'product_autocomplete:{limit}:{"+".join(terms)}'
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = _autocomplete_products(query, limit)
+        cache.set(key, suggestions, PRODUCT_AUTOCOMPLETE_CACHE_TIMEOUT)
+    return suggestions
+
+
+def product_text_filter(products, query):
+    """Restreint un queryset de produits aux résultats d'une recherche plein texte"""
+    query = (query or '').strip()
+    if not query:
+        return products
+
+    if _uses_fts():
+        match = _fts_match_expression(query)
+        if not match:
+            return products
+        return products.filter(
+            id__in=RawSQL(f'SELECT product_id FROM {PRODUCT_FTS_TABLE} WHERE {PRODUCT_FTS_TABLE} MATCH %s', (match,))
+        )
+
+    if connection.vendor == 'postgresql':
+        return products.filter(pk__in=_postgres_product_search(query).values('pk'))
+
+    return products.filter(
+        Q(name__icontains=query) | Q(short_description__icontains=query) | Q(description__icontains=query)
+    )
@@ -0,0 +1,101 @@
+"""
+Cache des pages de la boutique BLIZZ
+Fragments rendus (accueil, catégories, fiche produit) indexés par la version du catalogue et
+les paramètres de la page ; une modification du catalogue change la version, et une entrée
+périmée est régénérée par une seule requête pendant que les autres servent l'ancienne
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'shop:catalog_version'
+
+# Durée pendant laquelle un fragment est servi sans vérification
+SHOP_PAGE_CACHE_TIMEOUT = getattr(settings, 'SHOP_PAGE_CACHE_TIMEOUT', 300)
+# Durée supplémentaire pendant laquelle un fragment périmé peut encore être servi
+SHOP_PAGE_CACHE_STALE_TIMEOUT = getattr(settings, 'SHOP_PAGE_CACHE_STALE_TIMEOUT', 3600)
+# Une régénération interrompue libère son verrou au bout de ce délai
+REVALIDATE_LOCK_TIMEOUT = 30
+
+_state = threading.local()
+
+
+# ===== Version du catalogue =====
+
+def get_catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_catalog():
+    """
+    Périme toutes les pages de la boutique après validation de la transaction courante.
+    Dans un bloc batch_catalog_invalidation(), l'invalidation est reportée à la fin du bloc.
+    """
+    if getattr(_state, 'depth', 0):
+        _state.pending = True
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@contextmanager
+def batch_catalog_invalidation():
+    """Regroupe les modifications d'une synchronisation en un seul changement de version"""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if not _state.depth and getattr(_state, 'pending', False):
+            _state.pending = False
+            invalidate_catalog()
+
+
+# ===== Fragments =====
+
+def _fragment_key(name, params):
+    """Clé indépendante de l'ordre des paramètres GET (et sûre pour memcached)"""
+    items = sorted(params.lists()) if hasattr(params, 'lists') else sorted(params.items())
+    digest = hashlib.md5(repr(items).encode(), usedforsecurity=False).hexdigest()
+    return f'shop_page:{name}:{digest}'
+
+
+def cached_fragment(name, params, render):
+    """
+    Retourne render() mis en cache pour (name, params) et la version courante du catalogue.
+    Une entrée périmée (version changée ou délai dépassé) est régénérée par la première requête
+    qui obtient le verrou ; les requêtes concurrentes servent l'ancienne entrée en attendant.
+    Les exceptions de render() (Http404...) ne sont pas mises en cache.
+    """
+    key = _fragment_key(name, params)
+    # Lue avant le rendu : une modification pendant celui-ci provoquera une nouvelle régénération
+    version = get_catalog_version()
+    entry = cache.get(key)
+    lock_key = None
+    if entry is not None:
+        if entry['version'] == version and entry['fresh_until'] > time.time():
+            return entry['value']
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, REVALIDATE_LOCK_TIMEOUT):
+            return entry['value']
+
+    try:
+        value = render()
+        cache.set(
+            key,
+            {'value': value, 'version': version, 'fresh_until': time.time() + SHOP_PAGE_CACHE_TIMEOUT},
+            SHOP_PAGE_CACHE_TIMEOUT + SHOP_PAGE_CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+    return value
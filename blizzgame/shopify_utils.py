@@ -12,7 +12,9 @@ from django.utils import timezone
 from django.utils.text import slugify
 from django.core.files.base import ContentFile
 from decimal import Decimal
+from .inventory_utils import apply_shopify_inventory
 from .models import ShopifyIntegration, Product, Order, OrderItem, ProductCategory, ProductImage
+from .shop_cache_utils import batch_catalog_invalidation
 import logging
 
 logger = logging.getLogger(__name__)
@@ -106,6 +108,7 @@ class ShopifyAPI:
         """
         return self._make_request('POST', f'orders/{order_id}/fulfillments.json', {'fulfillment': fulfillment_data})
 
+@batch_catalog_invalidation()
 def sync_products_from_shopify():
     """
     Synchronise les produits depuis Shopify vers la base de données locale
@@ -159,6 +162,8 @@ def sync_products_from_shopify():
                 product.shopify_variant_id = str(first_variant.get('id')) if first_variant.get('id') else None
                 product.save(update_fields=['shopify_variant_id'])
 
+            apply_shopify_inventory(product, product_data)
+
             # Images
             try:
                 _save_product_images(product, product_data)
@@ -220,6 +225,7 @@ def _save_product_images(product: Product, product_data: dict) -> None:
             logger.error(f"Échec sauvegarde image produit: {e}")
 
 
+@batch_catalog_invalidation()
 def upsert_product_from_shopify_payload(product_data: dict) -> Product:
     """
     Crée ou met à jour un produit local à partir du payload Shopify (webhook products/create|update)
@@ -264,6 +270,8 @@ def upsert_product_from_shopify_payload(product_data: dict) -> Product:
         product.shopify_variant_id = str(first_variant['id'])
         product.save(update_fields=['shopify_variant_id'])
 
+    apply_shopify_inventory(product, product_data)
+
     # Images via webhook
     try:
         _save_product_images(product, product_data)
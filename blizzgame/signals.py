@@ -0,0 +1,160 @@
+"""
+Signaux BLIZZ
+Mise à jour incrémentale de la réputation, de l'index de recherche des annonces
+et du cache du graphe d'amis ; boîte de réception et diffusion en temps réel des messages de chat ;
+notifications (diffusées en arrière-plan) et compteur de non-lus ; fusion du panier anonyme à la connexion ;
+index des facettes, index plein texte et arbre des catégories du catalogue ;
+invalidation du cache des pages de la boutique
+"""
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .cart_utils import forget_cart_count, merge_session_cart
+from .catalog_utils import index_product_facets, invalidate_category_tree
+from .chat_utils import publish_chat_message, update_inbox_for_message
+from .models import (
+    GroupMessage, Highlight, Message, Notification, Post, PrivateMessage, Product, ProductCategory, ProductImage,
+    ProductVariant, UserRating, UserSubscription
+)
+from .notification_utils import (
+    decrement_unread_count, enqueue_fan_out, notify_group_message, notify_new_highlight, notify_private_message
+)
+from .reputation_utils import apply_rating_change
+from .search_utils import PRODUCT_FTS_COLUMNS, index_post, index_product, unindex_post, unindex_product
+from .shop_cache_utils import invalidate_catalog
+from .social_utils import friend_graph_cache
+
+
+@receiver(pre_save, sender=UserRating)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Mémorise l'évaluation précédente pour n'appliquer que la différence"""
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = (
+            UserRating.objects.filter(pk=instance.pk).values_list('rating_type', 'outcome').first()
+        )
+
+
+@receiver(post_save, sender=UserRating)
+def apply_rating_to_reputation(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    current = (instance.rating_type, instance.outcome)
+    if previous != current:
+        apply_rating_change(instance.user_id, previous=previous, current=current)
+
+
+@receiver(post_delete, sender=UserRating)
+def revert_rating_from_reputation(sender, instance, **kwargs):
+    apply_rating_change(instance.user_id, previous=(instance.rating_type, instance.outcome))
+
+
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, **kwargs):
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_for_search(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def invalidate_friend_graph(sender, instance, **kwargs):
+    friend_graph_cache.invalidate(instance.subscriber_id, instance.subscribed_to_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_save, sender=PrivateMessage)
+@receiver(post_save, sender=GroupMessage)
+def broadcast_chat_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_chat_message(instance))
+
+
+@receiver(post_save, sender=PrivateMessage)
+@receiver(post_save, sender=GroupMessage)
+def update_chat_inbox(sender, instance, created, **kwargs):
+    if created:
+        update_inbox_for_message(instance)
+
+
+@receiver(post_save, sender=GroupMessage)
+def notify_group_members(sender, instance, created, **kwargs):
+    if created:
+        enqueue_fan_out(notify_group_message, instance.id)
+
+
+@receiver(post_save, sender=PrivateMessage)
+def notify_conversation_recipient(sender, instance, created, **kwargs):
+    if created:
+        enqueue_fan_out(notify_private_message, instance.id)
+
+
+@receiver(post_save, sender=Highlight)
+def notify_highlight_subscribers(sender, instance, created, **kwargs):
+    if created:
+        enqueue_fan_out(notify_new_highlight, instance.id)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """Une notification non lue supprimée (cascade d'une transaction ou d'un message, admin) sort du compteur"""
+    if not instance.is_read:
+        decrement_unread_count(instance.user_id)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    # Le panier anonyme rejoint celui de l'utilisateur ; le badge est relu une fois
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request, user)
+        forget_cart_count(request)
+
+
+@receiver(post_save, sender=Product)
+def reindex_product_facets(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_product_facets(instance.pk)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def refresh_category_tree(sender, instance, **kwargs):
+    # Après validation : un autre processus ne doit pas recharger l'arbre avant la modification
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reindex_variant_product_facets(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_product_facets(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Couvre l'admin et l'import Shopify ; les sauvegardes partielles hors texte indexé sont ignorées
+    if raw or (update_fields is not None and not set(update_fields) & set(PRODUCT_FTS_COLUMNS)):
+        return
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_for_search(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_shop_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_catalog()
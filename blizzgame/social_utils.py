@@ -0,0 +1,255 @@
+"""
+Utilitaires sociaux BLIZZ
+Statistiques de profil, graphe des abonnements et annuaire des utilisateurs
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower
+from .models import Post, Profile, Transaction, UserSubscription
+
+
+def _count_subquery(queryset, outer_field):
+    """Sous-requête scalaire COUNT(*) corrélée à l'utilisateur de la requête principale"""
+    counts = (
+        queryset.filter(**{outer_field: OuterRef('pk')})
+        .order_by()
+        .values(outer_field)
+        .annotate(count=Count('pk'))
+        .values('count')[:1]
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def get_profile_stats(user):
+    """
+    Retourne les compteurs d'un profil (publications, ventes, abonnés, abonnements, amis)
+    en une seule requête.
+    """
+    mutual_subscriptions = UserSubscription.objects.filter(
+        subscribed_to__subscriptions__subscribed_to=OuterRef('pk')
+    )
+    return User.objects.filter(pk=user.pk).annotate(
+        posts_count=_count_subquery(Post.objects.all(), 'author'),
+        sales_count=_count_subquery(Transaction.objects.filter(status='completed'), 'seller'),
+        subscribers_count=_count_subquery(UserSubscription.objects.all(), 'subscribed_to'),
+        subscriptions_count=_count_subquery(UserSubscription.objects.all(), 'subscriber'),
+        friends_count=_count_subquery(mutual_subscriptions, 'subscriber'),
+    ).values(
+        'posts_count', 'sales_count', 'subscribers_count', 'subscriptions_count', 'friends_count'
+    ).get()
+
+
+# ===== Graphe des amis (abonnements mutuels) =====
+
+class FriendGraphCache:
+    """
+    Cache mémoire par processus des listes d'adjacence du graphe d'abonnements.
+    Chaque utilisateur est stocké sous forme de deux tableaux d'entiers triés
+    (abonnements, abonnés) ; les entrées les moins récemment utilisées sont évincées.
+    """
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_users > 0
+
+    def adjacency(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                return entry
+
+        entry = (
+            array('q', sorted(UserSubscription.objects.filter(subscriber_id=user_id)
+                              .values_list('subscribed_to_id', flat=True))),
+            array('q', sorted(UserSubscription.objects.filter(subscribed_to_id=user_id)
+                              .values_list('subscriber_id', flat=True))),
+        )
+        with self._lock:
+            self._entries[user_id] = entry
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    def friend_ids(self, user_id):
+        subscriptions, subscribers = self.adjacency(user_id)
+        return set(subscriptions).intersection(subscribers)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Désactivé par défaut (0) : chaque processus a son propre cache, invalidé localement
+friend_graph_cache = FriendGraphCache(getattr(settings, 'FRIEND_GRAPH_CACHE_SIZE', 0))
+
+
+def friends_queryset(user):
+    """Amis d'un utilisateur : auto-jointure sur les abonnements dans les deux sens"""
+    return User.objects.filter(subscriptions__subscribed_to=user, subscribers__subscriber=user)
+
+
+def get_friend_ids(user):
+    if friend_graph_cache.enabled:
+        return friend_graph_cache.friend_ids(user.pk)
+    return set(friends_queryset(user).values_list('pk', flat=True))
+
+
+def get_friends_count(user):
+    if friend_graph_cache.enabled:
+        return len(friend_graph_cache.friend_ids(user.pk))
+    return UserSubscription.objects.filter(
+        subscriber=user, subscribed_to__subscriptions__subscribed_to=user
+    ).count()
+
+
+def get_friends(user):
+    """Liste des amis avec leur profil"""
+    if friend_graph_cache.enabled:
+        friends = User.objects.filter(pk__in=friend_graph_cache.friend_ids(user.pk))
+    else:
+        friends = friends_queryset(user)
+    return friends.select_related('profile').order_by('username')
+
+
+def get_common_friends(user, other):
+    """Amis communs à deux utilisateurs"""
+    return (
+        friends_queryset(user)
+        .filter(pk__in=friends_queryset(other).values('pk'))
+        .select_related('profile')
+        .order_by('username')
+    )
+
+
+def get_friend_suggestions(user, limit=10):
+    """
+    Suggestions d'amis : utilisateurs suivis par les amis de l'utilisateur,
+    classés par nombre d'amis en commun. Retourne une liste de (utilisateur, nb_amis_communs).
+    """
+    ranked = list(
+        UserSubscription.objects.filter(subscriber__in=friends_queryset(user).values('pk'))
+        .exclude(subscribed_to=user)
+        .exclude(subscribed_to__in=UserSubscription.objects.filter(subscriber=user).values('subscribed_to'))
+        .values('subscribed_to')
+        .annotate(shared=Count('subscriber', distinct=True))
+        .order_by('-shared', 'subscribed_to')[:limit]
+    )
+    users = User.objects.select_related('profile').in_bulk([row['subscribed_to'] for row in ranked])
+    return [(users[row['subscribed_to']], row['shared']) for row in ranked if row['subscribed_to'] in users]
+
+
+# ===== Annuaire des utilisateurs =====
+
+USER_SEARCH_MIN_LENGTH = 2
+USER_SEARCH_LIMIT = 20
+# Candidats retenus par niveau de correspondance avant le classement par amis communs
+USER_SEARCH_CANDIDATES = 100
+# Les résultats des préfixes courts (les plus fréquents et les plus coûteux) sont mis en cache
+USER_SEARCH_CACHE_PREFIX_LENGTH = 4
+USER_SEARCH_CACHE_TIMEOUT = 60
+
+MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING = 0, 1, 2
+
+
+def normalize_user_query(query):
+    return (query or '').strip().lower()
+
+
+def _user_search_candidates(query, game=None):
+    """
+    Retourne [(user_id, niveau)] pour une requête normalisée : correspondance exacte,
+    puis préfixe (parcours de l'index sur LOWER(username)), puis sous-chaîne si nécessaire.
+    """
+    users = User.objects.filter(is_active=True).annotate(username_lower=Lower('username'))
+    if game:
+        users = users.filter(profile__favorite_games__icontains=f'"{game}"')
+
+    # Intervalle [q, q + U+FFFF) : exploitable par l'index, contrairement à LIKE
+    prefix_range = {'username_lower__gte': query, 'username_lower__lt': query + '\uffff'}
+    candidates = [
+        (pk, MATCH_EXACT if username_lower == query else MATCH_PREFIX)
+        for pk, username_lower in users.filter(**prefix_range)
+        .order_by('username_lower').values_list('pk', 'username_lower')[:USER_SEARCH_CANDIDATES]
+    ]
+
+    # Le parcours complet par sous-chaîne n'a lieu que si les préfixes ne suffisent pas
+    if len(candidates) < USER_SEARCH_LIMIT:
+        substring_ids = (
+            users.filter(username_lower__contains=query)
+            .exclude(**prefix_range)
+            .order_by('username_lower')
+            .values_list('pk', flat=True)[:USER_SEARCH_CANDIDATES]
+        )
+        candidates.extend((pk, MATCH_SUBSTRING) for pk in substring_ids)
+    return candidates
+
+
+def _cached_user_search_candidates(query, game=None):
+    if len(query) > USER_SEARCH_CACHE_PREFIX_LENGTH:
+        return _user_search_candidates(query, game)
+    key = f'user_search:{game or ""}:{query}'
+    candidates = cache.get(key)
+    if candidates is None:
+        candidates = _user_search_candidates(query, game)
+        cache.set(key, candidates, USER_SEARCH_CACHE_TIMEOUT)
+    return candidates
+
+
+def search_users(query, viewer=None, game=None, limit=USER_SEARCH_LIMIT):
+    """
+    Recherche d'utilisateurs classée : exact, préfixe puis sous-chaîne ; à niveau égal,
+    les utilisateurs suivis par le plus d'amis du visiteur passent en premier.
+    """
+    query = normalize_user_query(query)
+    if len(query) < USER_SEARCH_MIN_LENGTH:
+        return []
+
+    tiers = dict(_cached_user_search_candidates(query, game))
+    if viewer is not None and viewer.is_authenticated:
+        tiers.pop(viewer.pk, None)
+    if not tiers:
+        return []
+
+    users = User.objects.filter(pk__in=tiers).select_related('profile')
+    if viewer is not None and viewer.is_authenticated:
+        followed_by_friends = UserSubscription.objects.filter(subscriber__in=friends_queryset(viewer).values('pk'))
+        users = users.annotate(mutual_count=_count_subquery(followed_by_friends, 'subscribed_to'))
+
+    ranked = sorted(
+        users,
+        key=lambda user: (tiers[user.pk], -getattr(user, 'mutual_count', 0), user.username.lower()),
+    )
+    return ranked[:limit]
+
+
+def serialize_user_result(user):
+    """Données affichées pour un résultat de recherche (profil chargé par select_related)"""
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = None
+    return {
+        'id': user.id,
+        'username': user.username,
+        'avatar': profile.profileimg.url if profile and profile.profileimg else None,
+        'location': profile.location if profile else '',
+        'favorite_games': profile.favorite_games if profile else [],
+        'mutual_count': getattr(user, 'mutual_count', 0),
+    }
@@ -0,0 +1,1266 @@
+import asyncio
+import base64
+import json
+import math
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Sum
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from blizzgame.cart_utils import (
+    ABANDONED_CART_DAYS, CART_COUNT_SESSION_KEY, compute_cart_totals, get_cart_count, place_order, refresh_cart_totals
+)
+from blizzgame.catalog_utils import browse_catalog, get_category_tree, invalidate_category_tree, top_categories
+from blizzgame.chat_gateway import CLOSE_FORBIDDEN, CLOSE_NOT_FOUND, websocket_application
+from blizzgame.chat_utils import (
+    CHAT_HISTORY_LIMIT, InProcessBroker, get_chat_messages, get_group_unread_count, get_group_unread_counts,
+    get_inbox, get_or_create_conversation, mark_group_read, mark_private_read, serialize_inbox_entry
+)
+from blizzgame.inventory_utils import (
+    STOCK_RESERVATION_MINUTES, OutOfStock, commit_order_stock, release_expired_reservations, release_order_stock,
+    release_reservation
+)
+from blizzgame.models import (
+    Cart, CartItem, Chat, Group, GroupMembership, GroupMessage, InboxEntry, Message, Notification,
+    NotificationCounter, Order, OrderItem, Post, PostImage, PrivateConversation, PrivateMessage, Product,
+    ProductCategory, ProductImage, ProductRecommendation, ProductVariant, Profile, StockReservation, Transaction, UserReputation,
+    UserSubscription, parse_numeric_value
+)
+from blizzgame.notification_utils import (
+    fan_out_notification, get_notifications, get_unread_notification_count, mark_notifications_read,
+    rebuild_unread_counts
+)
+from blizzgame.recommendation_utils import (
+    co_purchase_similarity, compute_recommendations, get_related_products, tag_similarity
+)
+from blizzgame.reputation_utils import compute_seller_score, recompute_seller_scores
+from blizzgame.search_utils import (
+    POST_FTS_TABLE, autocomplete_products, encode_cursor, search_posts, search_products
+)
+from blizzgame.social_utils import (
+    friend_graph_cache, get_common_friends, get_friend_ids, get_friend_suggestions, get_friends,
+    get_friends_count, get_profile_stats
+)
+
+# Champs client et livraison d'une commande passée par place_order
+CUSTOMER = {
+    'customer_email': 'client@blizz.local',
+    'customer_phone': '0000000000',
+    'customer_first_name': 'Client',
+    'customer_last_name': 'Test',
+    'shipping_address_line1': '-',
+    'shipping_city': '-',
+    'shipping_state': '-',
+    'shipping_postal_code': '-',
+    'shipping_country': 'CI',
+}
+
+# Cache propre aux tests : les vérifications le vident sans toucher au cache configuré
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'blizzgame-tests'}}
+
+
+def create_user(username):
+    user = User.objects.create_user(username=username, password='motdepasse')
+    Profile.objects.create(user=user, id_user=user.id)
+    return user
+
+
+def create_product(category, slug, price='10.00', **fields):
+    fields.setdefault('description', '')
+    return Product.objects.create(name=slug.capitalize(), slug=slug, category=category, price=Decimal(price), **fields)
+
+
+def create_message_notifications(buyer, seller, count):
+    """Notifications « nouveau message » d'une transaction, comme celles du chat acheteur/vendeur"""
+    post = Post.objects.create(user=seller.username, author=seller, title='Compte', price=10)
+    deal = Transaction.objects.create(buyer=buyer, seller=seller, post=post, amount=10)
+    chat = Chat.objects.create(transaction=deal)
+    for index in range(count):
+        message = Message.objects.create(chat=chat, sender=seller, content=f'Message {index}')
+        fan_out_notification(
+            [buyer.id], 'new_message', 'Nouveau message', message.content, transaction=deal, message=message
+        )
+    return deal
+
+
+class SellerScoreTests(TestCase):
+    """Le recalcul SQL des scores vendeurs donne le même résultat que compute_seller_score"""
+
+    COUNTERS = [(0, 0), (1, 1), (0, 3), (5, 8), (10, 10), (18, 25), (97, 100)]
+
+    def test_recompute_matches_python_formula(self):
+        UserReputation.objects.bulk_create([
+            UserReputation(
+                user=create_user(f'vendeur{index}'),
+                seller_successful_transactions=successful,
+                seller_total_transactions=total,
+                seller_score=Decimal('50.00'),
+                seller_badge='bronze',
+            )
+            for index, (successful, total) in enumerate(self.COUNTERS)
+        ])
+
+        self.assertEqual(recompute_seller_scores(), len(self.COUNTERS) - 1)
+        for reputation in UserReputation.objects.all():
+            with self.subTest(counters=(reputation.seller_successful_transactions, reputation.seller_total_transactions)):
+                expected = compute_seller_score(
+                    reputation.seller_successful_transactions, reputation.seller_total_transactions
+                )
+                if expected is None:
+                    # Sans transaction, le score existant est conservé
+                    expected = (50.0, 'bronze')
+                self.assertAlmostEqual(float(reputation.seller_score), expected[0], places=2)
+                self.assertEqual(reputation.seller_badge, expected[1])
+
+
+class ProfilePageTests(TestCase):
+    """Page profil paginée et compteurs chargés en une requête"""
+
+    def setUp(self):
+        self.seller = create_user('vendeur')
+
+    def create_posts(self, count):
+        posts = Post.objects.bulk_create([
+            Post(user=self.seller.username, author=self.seller, title=f'Annonce {index}', price=10)
+            for index in range(count)
+        ])
+        PostImage.objects.bulk_create([PostImage(post=post, image=f'post_images/{post.pk}.jpg') for post in posts])
+
+    def test_queries_do_not_grow_with_posts(self):
+        self.create_posts(40)
+        # Utilisateur, statistiques, réputation, page d'annonces, images des annonces
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('profile', args=[self.seller.username]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats']['posts_count'], 40)
+        self.assertEqual(len(response.context['posts']), 12)
+
+    def test_last_page_lists_remaining_posts(self):
+        self.create_posts(14)
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[12:])
+        response = self.client.get(reverse('profile', args=[self.seller.username]), {'page': 2})
+        self.assertEqual([post.pk for post in response.context['posts']], expected)
+        self.assertFalse(response.context['posts'].has_next())
+
+    def test_stats_count_completed_sales_and_mutual_subscriptions(self):
+        buyer, fan, friend = create_user('acheteur'), create_user('fan'), create_user('ami')
+        post = Post.objects.create(user=self.seller.username, author=self.seller, title='Compte', price=10)
+        Transaction.objects.create(buyer=buyer, seller=self.seller, post=post, amount=10, status='completed')
+        Transaction.objects.create(buyer=buyer, seller=self.seller, post=post, amount=10, status='pending')
+        UserSubscription.objects.bulk_create([
+            UserSubscription(subscriber=fan, subscribed_to=self.seller),
+            UserSubscription(subscriber=friend, subscribed_to=self.seller),
+            UserSubscription(subscriber=self.seller, subscribed_to=friend),
+        ])
+
+        self.assertEqual(get_profile_stats(self.seller), {
+            'posts_count': 1,
+            'sales_count': 1,
+            'subscribers_count': 2,
+            'subscriptions_count': 1,
+            'friends_count': 1,
+        })
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NotificationCounterTests(TestCase):
+    """Le compteur de non-lus suit les suppressions et peut être reconstruit"""
+
+    def setUp(self):
+        self.user = create_user('joueur')
+        fan_out_notification([self.user.id], 'system', 'Première', 'Contenu')
+        fan_out_notification([self.user.id], 'system', 'Seconde', 'Contenu')
+
+    def test_deleting_unread_notification_decrements_counter(self):
+        Notification.objects.filter(user=self.user, title='Première').delete()
+        self.assertEqual(get_unread_notification_count(self.user), 1)
+
+    def test_deleting_read_notification_keeps_counter(self):
+        Notification.objects.filter(user=self.user, title='Première').update(is_read=True)
+        NotificationCounter.objects.filter(user=self.user).update(unread_count=1)
+        Notification.objects.filter(user=self.user, title='Première').delete()
+        self.assertEqual(get_unread_notification_count(self.user), 1)
+
+    def test_cascade_delete_decrements_counter(self):
+        seller = create_user('vendeur')
+        deal = create_message_notifications(self.user, seller, 3)
+        self.assertEqual(get_unread_notification_count(self.user), 5)
+        deal.delete()
+        self.assertEqual(get_unread_notification_count(self.user), 2)
+
+    def test_rebuild_fixes_drifted_counters(self):
+        NotificationCounter.objects.filter(user=self.user).update(unread_count=9)
+        other = create_user('autre')
+        Notification.objects.bulk_create([Notification(user=other, type='system', title='Sans compteur', content='')])
+
+        self.assertEqual(rebuild_unread_counts(), {self.user.id: (9, 2), other.id: (None, 1)})
+        self.assertEqual(get_unread_notification_count(self.user), 2)
+        self.assertEqual(get_unread_notification_count(other), 1)
+        self.assertEqual(rebuild_unread_counts(), {})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NotificationFeedTests(TestCase):
+    """Fil de notifications paginé par curseur, liens directs vers le chat"""
+
+    def test_queries_do_not_grow_with_notifications(self):
+        buyer, seller = create_user('acheteur'), create_user('vendeur')
+        create_message_notifications(buyer, seller, 10)
+        self.client.force_login(buyer)
+        # Session et utilisateur, page de notifications avec ses relations, panier et profil du menu,
+        # compteur de non-lus, puis enregistrement de la session (BEGIN, UPDATE, COMMIT)
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse('notifications'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Voir le message', count=10)
+
+    def test_cursor_pages_and_mark_read_up_to_cursor(self):
+        user = create_user('joueur')
+        for index in range(5):
+            fan_out_notification([user.id], 'system', f'Notification {index}', 'Contenu')
+        expected = list(Notification.objects.filter(user=user).order_by('-created_at', '-id'))
+
+        pages, cursor = [], None
+        while True:
+            page, cursor = get_notifications(user, cursor, limit=2)
+            pages.append(page)
+            if not cursor:
+                break
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([note for page in pages for note in page], expected)
+
+        # « Tout marquer comme lu » depuis la première page : seules les notifications affichées
+        _, first_page_cursor = get_notifications(user, limit=2)
+        self.assertEqual(mark_notifications_read(user, first_page_cursor), 2)
+        self.assertEqual(get_unread_notification_count(user), 3)
+        self.assertEqual(get_notifications(user, unread_only=True)[0], expected[2:])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShopPageTests(TestCase):
+    """Pages de la boutique rendues sans cache, images des produits préchargées"""
+
+    def setUp(self):
+        self.category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.products = [
+            Product.objects.create(
+                name=f'Produit {index}',
+                slug=f'produit-{index}',
+                category=self.category,
+                description='Produit de test',
+                price=Decimal('10.00'),
+                is_featured=True,
+            )
+            for index in range(12)
+        ]
+        # Sans featured_image : get_main_image passe par la galerie, insérée ici dans le désordre
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'product_images/{product.slug}-{order}.jpg', order=order)
+            for product in self.products
+            for order in (2, 0, 1)
+        ])
+        cache.clear()
+
+    def test_home_queries_do_not_grow_with_products(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('shop_home'))
+        self.assertContains(response, f'product_images/{self.products[-1].slug}-0.jpg')
+
+    def test_product_list_queries_do_not_grow_with_products(self):
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse('shop_products'), {'category': self.category.slug})
+        self.assertContains(response, f'product_images/{self.products[-1].slug}-0.jpg')
+
+    def test_category_queries_do_not_grow_with_products(self):
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse('shop_category', args=[self.category.slug]))
+        self.assertContains(response, f'product_images/{self.products[-1].slug}-0.jpg')
+
+    def test_product_detail_queries_do_not_grow_with_related_products(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('shop_product_detail', args=[self.products[0].slug]))
+        # Le produit le plus récent figure parmi les produits liés
+        self.assertContains(response, f'product_images/{self.products[-1].slug}-0.jpg')
+
+    def test_main_image_is_first_gallery_image_without_query(self):
+        response = self.client.get(reverse('shop_products'))
+        with self.assertNumQueries(0):
+            main_images = {product.slug: product.get_main_image().name for product in response.context['products']}
+        self.assertEqual(main_images, {
+            product.slug: f'product_images/{product.slug}-0.jpg' for product in self.products
+        })
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Des paniers concurrents se disputent un produit à stock limité : aucune unité n'est survendue"""
+
+    WORKERS = 8
+    # SQLite n'accepte qu'un écrivain : une transaction verrouillée est rejouée
+    RETRIES = 200
+
+    def create_carts(self, stock, buyers, quantity):
+        category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        product = Product.objects.create(
+            name='Manette', slug='manette', category=category, description='', price=Decimal('1.00'), stock=stock
+        )
+        carts = []
+        for index in range(buyers):
+            cart = Cart.objects.create(session_key=f'acheteur-{index}')
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity, price=product.price)
+            carts.append(refresh_cart_totals(cart))
+        return product, carts
+
+    def checkout_concurrently(self, carts):
+        """Passe les commandes depuis WORKERS threads ; retourne le nombre de chaque issue et les erreurs"""
+        results = {'ordered': 0, 'out_of_stock': 0, 'failed': 0}
+        errors = []
+        lock = threading.Lock()
+        pending = list(carts)
+
+        def buyer():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        cart = pending.pop()
+                    outcome = 'failed'
+                    for attempt in range(self.RETRIES):
+                        try:
+                            place_order(cart, None, CUSTOMER)
+                            outcome = 'ordered'
+                            break
+                        except OutOfStock:
+                            outcome = 'out_of_stock'
+                            break
+                        except OperationalError:
+                            time.sleep(0.001 * (attempt % 10 + 1))
+                        except Exception as e:
+                            with lock:
+                                errors.append(repr(e))
+                            break
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def assert_no_overselling(self, stock, buyers, quantity):
+        product, carts = self.create_carts(stock, buyers, quantity)
+        results, errors = self.checkout_concurrently(carts)
+
+        self.assertEqual(errors, [])
+        served = stock // quantity
+        self.assertEqual(results, {'ordered': served, 'out_of_stock': buyers - served, 'failed': 0})
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total']
+        reserved = StockReservation.objects.filter(product=product).aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(sold, served * quantity)
+        self.assertEqual(reserved, sold)
+        self.assertEqual(product.stock, stock - sold)
+        self.assertEqual(product.status, 'out_of_stock' if product.stock == 0 else 'active')
+
+    def test_last_units_sold_once(self):
+        self.assert_no_overselling(stock=5, buyers=24, quantity=1)
+
+    def test_partial_quantity_left_in_stock(self):
+        # 7 unités par lots de 2 : trois commandes, une unité reste en stock
+        self.assert_no_overselling(stock=7, buyers=12, quantity=2)
+
+
+class ChatGatewayRejectionTests(SimpleTestCase):
+    """Un refus est envoyé après l'acceptation, pour que le navigateur reçoive le code applicatif"""
+
+    def connect(self, path):
+        sent = []
+
+        async def receive():
+            return {'type': 'websocket.connect'}
+
+        async def send(event):
+            sent.append(event)
+
+        async_to_sync(websocket_application)({'type': 'websocket', 'path': path, 'headers': []}, receive, send)
+        return sent
+
+    def test_unknown_path_is_closed_with_not_found(self):
+        self.assertEqual(self.connect('/ws/chat/inconnu/'), [
+            {'type': 'websocket.accept'},
+            {'type': 'websocket.close', 'code': CLOSE_NOT_FOUND},
+        ])
+
+    def test_anonymous_user_is_closed_with_forbidden(self):
+        self.assertEqual(self.connect(f'/ws/chat/group/{uuid.uuid4()}/'), [
+            {'type': 'websocket.accept'},
+            {'type': 'websocket.close', 'code': CLOSE_FORBIDDEN},
+        ])
+
+
+def malformed_cursor():
+    """Curseur bien encodé mais dont l'id n'est pas un UUID"""
+    return base64.urlsafe_b64encode(json.dumps(['2024-01-01T00:00:00', 'zz']).encode()).decode()
+
+
+class PostSearchTests(TestCase):
+    """Recherche plein texte des annonces et pagination par curseur"""
+
+    def setUp(self):
+        self.seller = create_user('vendeur')
+
+    def create_post(self, title, caption='', **fields):
+        return Post.objects.create(
+            user=self.seller.username, author=self.seller, title=title, caption=caption, price=10, **fields
+        )
+
+    def fts_row_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {POST_FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    def search_titles(self, query):
+        posts, _ = search_posts({'q': query})
+        return {post.title for post in posts}
+
+    def test_search_matches_prefixes_and_ignores_accents(self):
+        self.create_post('Compte Fortnite légendaire', 'Skins rares')
+        self.create_post('Compte Valorant', 'Immortel 3')
+
+        self.assertEqual(self.search_titles('fortn'), {'Compte Fortnite légendaire'})
+        self.assertEqual(self.search_titles('legendaire skins'), {'Compte Fortnite légendaire'})
+        self.assertEqual(self.search_titles('compte'), {'Compte Fortnite légendaire', 'Compte Valorant'})
+        self.assertEqual(self.search_titles('minecraft'), set())
+
+    def test_index_follows_updates_and_deletions(self):
+        post = self.create_post('Compte Fortnite')
+        post.title = 'Compte Minecraft'
+        post.save()
+
+        # La mise à jour remplace l'entrée existante au lieu d'en ajouter une seconde
+        self.assertEqual(self.fts_row_count(), 1)
+        self.assertEqual(self.search_titles('fortnite'), set())
+        self.assertEqual(self.search_titles('minecraft'), {'Compte Minecraft'})
+
+        post.delete()
+        self.assertEqual(self.fts_row_count(), 0)
+
+    def test_cursor_pages_cover_every_post_once(self):
+        created_at = timezone.now()
+        # Dates identiques deux à deux : l'id départage les ex aequo d'une page à l'autre
+        Post.objects.bulk_create([
+            Post(
+                user=self.seller.username, author=self.seller, title=f'Annonce {index}', price=index % 4,
+                created_at=created_at - timedelta(minutes=index // 2),
+            )
+            for index in range(11)
+        ])
+
+        for sort in ('created_at', 'price_asc', 'price_desc'):
+            with self.subTest(sort=sort):
+                seen, cursor = [], None
+                while True:
+                    params = {'sort': sort, **({'cursor': cursor} if cursor else {})}
+                    posts, cursor = search_posts(params, limit=3)
+                    seen.extend(post.pk for post in posts)
+                    if not cursor:
+                        break
+                field, descending = ('created_at', True) if sort == 'created_at' else ('price', sort == 'price_desc')
+                prefix = '-' if descending else ''
+                expected = list(Post.objects.order_by(f'{prefix}{field}', f'{prefix}id').values_list('pk', flat=True))
+                self.assertEqual(seen, expected)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        for index in range(3):
+            self.create_post(f'Annonce {index}')
+        first_page, _ = search_posts({})
+
+        self.assertEqual(search_posts({'cursor': malformed_cursor()})[0], first_page)
+        self.assertEqual(search_posts({'cursor': 'pas-du-base64'})[0], first_page)
+        response = self.client.get(reverse('index'), {'cursor': malformed_cursor()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), first_page)
+
+    def test_malformed_chat_cursor_returns_latest_messages(self):
+        buyer = create_user('acheteur')
+        deal = Transaction.objects.create(
+            buyer=buyer, seller=self.seller, post=self.create_post('Compte'), amount=10
+        )
+        chat = Chat.objects.create(transaction=deal)
+        for index in range(3):
+            Message.objects.create(chat=chat, sender=self.seller, content=f'Message {index}')
+
+        history = get_chat_messages('transaction', chat.id, since=malformed_cursor())
+        self.assertEqual([message['content'] for message in history['messages']], ['Message 0', 'Message 1', 'Message 2'])
+        self.assertNotEqual(history['cursor'], malformed_cursor())
+        # Le curseur renvoyé reprend normalement : rien de nouveau depuis le dernier message
+        self.assertEqual(get_chat_messages('transaction', chat.id, since=history['cursor'])['messages'], [])
+
+
+class TransactionChatTests(TestCase):
+    """Le chat de transaction passe par l'historique incrémental commun aux discussions"""
+
+    def setUp(self):
+        self.buyer = create_user('acheteur')
+        self.seller = create_user('vendeur')
+        post = Post.objects.create(user=self.seller.username, author=self.seller, title='Compte', price=10)
+        deal = Transaction.objects.create(buyer=self.buyer, seller=self.seller, post=post, amount=10)
+        self.chat = Chat.objects.create(transaction=deal)
+        self.url = reverse('get_messages', args=[self.chat.id])
+
+    def test_only_participants_read_messages(self):
+        self.client.force_login(create_user('curieux'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_since_returns_only_new_messages(self):
+        Message.objects.create(chat=self.chat, sender=self.seller, content='Bonjour')
+        self.client.force_login(self.buyer)
+        first = self.client.get(self.url).json()
+        self.assertEqual([message['content'] for message in first['messages']], ['Bonjour'])
+
+        self.client.force_login(self.seller)
+        sent = self.client.post(reverse('send_message', args=[self.chat.id]), {'content': 'Identifiants envoyés'}).json()
+        self.assertTrue(sent['success'])
+
+        self.client.force_login(self.buyer)
+        update = self.client.get(self.url, {'since': first['cursor']}).json()
+        self.assertEqual([message['id'] for message in update['messages']], [sent['message']['id']])
+        self.assertFalse(update['messages'][0]['is_own'])
+        self.assertEqual(self.client.get(self.url, {'since': update['cursor']}).json()['messages'], [])
+
+
+class PostNumericFilterTests(TestCase):
+    """Niveau et pièces saisis en texte libre, filtrés et triés sur leur valeur numérique"""
+
+    def setUp(self):
+        self.seller = create_user('vendeur')
+
+    def create_post(self, title, level='', coins=''):
+        return Post.objects.create(
+            user=self.seller.username, author=self.seller, title=title, price=10, level=level, coins=coins
+        )
+
+    def search_titles(self, params):
+        posts, _ = search_posts(params)
+        return [post.title for post in posts]
+
+    def test_parse_numeric_value(self):
+        cases = {
+            '5 000 UC': 5000, '5,000': 5000, '12.345.678': 12345678, '1.5k': 1500, '2M': 2000000,
+            'Niveau 50': 50, '1,25': 1, 'Diamant': None, '': None,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_numeric_value(text), expected)
+
+    def test_save_keeps_numeric_values_in_sync(self):
+        post = self.create_post('Compte', level='Niveau 40', coins='10k UC')
+        self.assertEqual((post.level_value, post.coins_value), (40, 10000))
+
+        post.level = 'Niveau 41'
+        post.save(update_fields=['level'])
+        post.refresh_from_db()
+        self.assertEqual((post.level_value, post.coins_value), (41, 10000))
+
+    def test_numeric_filters_and_sort(self):
+        self.create_post('Débutant', level='10')
+        self.create_post('Confirmé', level='Niveau 50')
+        self.create_post('Expert', level='80', coins='5 000 UC')
+        self.create_post('Classé', level='Diamant')
+
+        # Une valeur numérique est un minimum, un texte est cherché tel quel
+        self.assertEqual(self.search_titles({'level': '50', 'sort': 'level_desc'}), ['Expert', 'Confirmé'])
+        self.assertEqual(self.search_titles({'level': 'diam'}), ['Classé'])
+        self.assertEqual(self.search_titles({'min_level': '20', 'max_level': '60'}), ['Confirmé'])
+        self.assertEqual(self.search_titles({'coins': '1000'}), ['Expert'])
+        # Le tri numérique écarte les annonces sans valeur
+        self.assertEqual(self.search_titles({'sort': 'level_desc'}), ['Expert', 'Confirmé', 'Débutant'])
+
+    def test_non_decimal_digits_are_searched_as_text(self):
+        self.create_post('Compte', coins='100')
+        response = self.client.get(reverse('index'), {'coins': '²'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), [])
+
+
+class FriendGraphTests(TestCase):
+    """Amis (abonnements mutuels) et suggestions calculés en SQL, cache du graphe en option"""
+
+    def setUp(self):
+        self.alice, self.bob, self.carol, self.dave, self.erin = (
+            create_user(name) for name in ('alice', 'bob', 'carol', 'dave', 'erin')
+        )
+        self.subscribe(self.alice, self.bob, self.carol)
+        self.subscribe(self.bob, self.alice, self.dave, self.erin)
+        self.subscribe(self.carol, self.alice, self.dave)
+        # Abonnement à sens unique : erin n'est pas amie avec alice
+        self.subscribe(self.erin, self.alice)
+
+    def subscribe(self, subscriber, *users):
+        UserSubscription.objects.bulk_create([
+            UserSubscription(subscriber=subscriber, subscribed_to=user) for user in users
+        ])
+
+    def enable_graph_cache(self, size):
+        previous = friend_graph_cache.max_users
+        friend_graph_cache.max_users = size
+        friend_graph_cache.clear()
+        self.addCleanup(friend_graph_cache.clear)
+        self.addCleanup(setattr, friend_graph_cache, 'max_users', previous)
+
+    def test_friends_are_mutual_subscriptions(self):
+        self.assertEqual(get_friend_ids(self.alice), {self.bob.pk, self.carol.pk})
+        self.assertEqual(get_friends_count(self.alice), 2)
+        self.assertEqual(list(get_friends(self.alice)), [self.bob, self.carol])
+        self.assertEqual(list(get_common_friends(self.bob, self.carol)), [self.alice])
+
+    def test_suggestions_ranked_by_common_friends(self):
+        # dave est suivi par deux amis d'alice, erin par un seul ; alice elle-même est exclue
+        self.assertEqual(get_friend_suggestions(self.alice), [(self.dave, 2), (self.erin, 1)])
+
+        self.subscribe(self.alice, self.dave)
+        self.assertEqual(get_friend_suggestions(self.alice), [(self.erin, 1)])
+
+    def test_graph_cache_matches_database_and_follows_unsubscriptions(self):
+        self.enable_graph_cache(10)
+        self.assertEqual(get_friend_ids(self.alice), {self.bob.pk, self.carol.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_friends_count(self.alice), 2)
+
+        UserSubscription.objects.filter(subscriber=self.carol, subscribed_to=self.alice).delete()
+        self.assertEqual(get_friend_ids(self.alice), {self.bob.pk})
+
+    def test_graph_cache_evicts_least_recently_used(self):
+        self.enable_graph_cache(2)
+        get_friend_ids(self.alice)
+        get_friend_ids(self.bob)
+        get_friend_ids(self.alice)
+        get_friend_ids(self.carol)
+
+        with self.assertNumQueries(0):
+            get_friend_ids(self.alice)
+        # bob, le moins récemment lu, a été évincé : ses deux listes sont relues
+        with self.assertNumQueries(2):
+            get_friend_ids(self.bob)
+
+
+class ChatHistoryTests(TestCase):
+    """Historique incrémental des discussions (curseur since) et attente long-poll"""
+
+    def setUp(self):
+        self.alice, self.bob = create_user('alice'), create_user('bob')
+        self.conversation = get_or_create_conversation(self.alice, self.bob)
+        created_at = timezone.now()
+        # Messages ex aequo deux à deux : l'id départage l'ordre et le curseur
+        PrivateMessage.objects.bulk_create([
+            PrivateMessage(
+                conversation=self.conversation, sender=self.alice, content=f'Message {index}',
+                created_at=created_at + timedelta(seconds=index // 2),
+            )
+            for index in range(7)
+        ])
+        self.ordered = list(PrivateMessage.objects.order_by('created_at', 'id'))
+
+    def history(self, since=None, limit=CHAT_HISTORY_LIMIT):
+        return get_chat_messages('private', self.conversation.id, since, limit)
+
+    def test_first_load_returns_latest_messages_in_order(self):
+        history = self.history(limit=3)
+        self.assertEqual([message['id'] for message in history['messages']], [str(m.id) for m in self.ordered[-3:]])
+        self.assertEqual(history['cursor'], encode_cursor(self.ordered[-1], 'created_at'))
+
+    def test_since_pages_forward_without_gaps(self):
+        since, seen, pages = encode_cursor(self.ordered[0], 'created_at'), [], 0
+        while True:
+            history = self.history(since, limit=2)
+            seen.extend(message['id'] for message in history['messages'])
+            since, pages = history['cursor'], pages + 1
+            if not history['has_more']:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [str(m.id) for m in self.ordered[1:]])
+        self.assertEqual(self.history(since)['messages'], [])
+        self.assertEqual(self.history(since)['cursor'], since)
+
+    def test_wait_times_out_without_new_messages(self):
+        self.client.force_login(self.bob)
+        since = encode_cursor(self.ordered[-1], 'created_at')
+        response = self.client.get(
+            reverse('get_private_messages', args=[self.conversation.id]), {'since': since, 'wait': '0.05'}
+        ).json()
+        self.assertEqual((response['success'], response['messages'], response['cursor']), (True, [], since))
+
+    def test_broker_wakes_waiters_on_publish(self):
+        broker = InProcessBroker()
+
+        async def wait_for_publication():
+            loop = asyncio.get_running_loop()
+            # Publication depuis un autre thread, comme depuis une vue synchrone
+            loop.call_later(0.05, lambda: threading.Thread(
+                target=broker.publish, args=('private:test', {'type': 'message'})
+            ).start())
+            return await broker.wait_async('private:test', 5)
+
+        started = time.monotonic()
+        self.assertTrue(async_to_sync(wait_for_publication)())
+        self.assertLess(time.monotonic() - started, 5)
+        # Version relevée avant une publication : pas d'attente
+        self.assertTrue(async_to_sync(broker.wait_async)('private:test', 5, 0))
+        self.assertFalse(async_to_sync(broker.wait_async)('private:test', 0.05))
+
+
+class GroupReadWatermarkTests(TestCase):
+    """Non-lus des groupes comptés à partir du filigrane de lecture de chaque membre"""
+
+    def setUp(self):
+        self.owner, self.alice, self.bob = create_user('owner'), create_user('alice'), create_user('bob')
+        self.group = Group.objects.create(name='Escouade', created_by=self.owner)
+        for user in (self.owner, self.alice, self.bob):
+            GroupMembership.objects.create(group=self.group, user=user)
+        self.messages = [
+            GroupMessage.objects.create(group=self.group, sender=sender, content=f'Message {index}')
+            for index, sender in enumerate((self.owner, self.owner, self.alice, self.owner))
+        ]
+
+    def unread(self, user):
+        return get_group_unread_count(user, self.group.id)
+
+    def test_unread_counts_exclude_own_messages(self):
+        self.assertEqual([self.unread(user) for user in (self.owner, self.alice, self.bob)], [1, 3, 4])
+        self.assertEqual(get_group_unread_counts(self.bob), {self.group.id: 4})
+
+    def test_watermark_only_moves_forward(self):
+        second = self.messages[1]
+        self.assertEqual(mark_group_read(self.bob, self.group.id, (second.created_at, second.id)), 1)
+        self.assertEqual(self.unread(self.bob), 2)
+        self.assertEqual(InboxEntry.objects.get(user=self.bob, group=self.group).unread_count, 2)
+
+        first = self.messages[0]
+        self.assertEqual(mark_group_read(self.bob, self.group.id, (first.created_at, first.id)), 0)
+        self.assertEqual(self.unread(self.bob), 2)
+
+        mark_group_read(self.bob, self.group.id)
+        self.assertEqual(self.unread(self.bob), 0)
+        self.assertEqual(get_group_unread_counts(self.bob), {self.group.id: 0})
+        self.assertEqual(InboxEntry.objects.get(user=self.bob, group=self.group).unread_count, 0)
+
+    def test_history_before_joining_counts_as_read(self):
+        carol = create_user('carol')
+        GroupMembership.objects.create(group=self.group, user=carol)
+        self.assertEqual(self.unread(carol), 0)
+        GroupMessage.objects.create(group=self.group, sender=self.owner, content='Bienvenue')
+        self.assertEqual(get_group_unread_counts(carol), {self.group.id: 1})
+
+
+class InboxTests(TestCase):
+    """Boîte de réception dénormalisée : dernier message et non-lus mis à jour à l'envoi"""
+
+    def setUp(self):
+        self.alice, self.bob = create_user('alice'), create_user('bob')
+        self.conversation = get_or_create_conversation(self.alice, self.bob)
+
+    def send(self, sender, content):
+        return PrivateMessage.objects.create(conversation=self.conversation, sender=sender, content=content)
+
+    def entry(self, user):
+        return InboxEntry.objects.get(user=user, conversation=self.conversation)
+
+    def test_unread_counts_follow_messages_and_reads(self):
+        self.send(self.alice, 'Salut')
+        self.send(self.alice, 'Tu es là ?')
+        self.assertEqual((self.entry(self.bob).unread_count, self.entry(self.alice).unread_count), (2, 0))
+        self.assertEqual(self.entry(self.bob).last_message_preview, 'Tu es là ?')
+
+        # Répondre remet à zéro le compteur de l'expéditeur ; les messages sont marqués lus à l'ouverture
+        self.send(self.bob, 'Oui')
+        self.assertEqual((self.entry(self.bob).unread_count, self.entry(self.alice).unread_count), (0, 1))
+        self.assertEqual(mark_private_read(self.alice, self.conversation.id), 1)
+        self.assertEqual(self.entry(self.alice).unread_count, 0)
+        self.assertEqual(mark_private_read(self.bob, self.conversation.id), 2)
+        self.assertFalse(PrivateMessage.objects.filter(sender=self.alice, is_read=False).exists())
+
+    def test_inbox_sorted_by_activity_in_one_query(self):
+        group = Group.objects.create(name='Escouade', created_by=self.alice)
+        for user in (self.alice, self.bob):
+            GroupMembership.objects.create(group=group, user=user)
+        self.send(self.alice, 'Salut')
+        GroupMessage.objects.create(group=group, sender=self.alice, content='x' * 200)
+
+        with self.assertNumQueries(1):
+            inbox = [serialize_inbox_entry(entry, self.bob) for entry in get_inbox(self.bob)]
+        self.assertEqual([(chat['type'], chat['unread_count']) for chat in inbox], [('group', 1), ('private', 1)])
+        self.assertEqual(inbox[0]['members_count'], 2)
+        self.assertEqual(inbox[0]['last_message'], 'x' * 120)
+        self.assertEqual(inbox[1]['other_user'], self.alice)
+
+
+class PrivateConversationPairTests(TestCase):
+    """Une seule conversation par couple d'utilisateurs, rangée en paire canonique"""
+
+    def setUp(self):
+        self.alice, self.bob = create_user('alice'), create_user('bob')
+
+    def test_lookup_is_order_independent(self):
+        conversation = get_or_create_conversation(self.bob, self.alice)
+        self.assertEqual(get_or_create_conversation(self.alice, self.bob), conversation)
+        self.assertEqual((conversation.user1, conversation.user2), (self.alice, self.bob))
+
+        self.client.force_login(self.bob)
+        response = self.client.get(reverse('private_chat', args=[self.alice.id]))
+        self.assertEqual(response.context['conversation'], conversation)
+        self.assertEqual(PrivateConversation.objects.count(), 1)
+
+    def test_save_stores_canonical_pair(self):
+        conversation = PrivateConversation.objects.create(user1=self.bob, user2=self.alice)
+        self.assertEqual((conversation.user1, conversation.user2), (self.alice, self.bob))
+        self.assertEqual(get_or_create_conversation(self.bob, self.alice), conversation)
+
+    def test_database_rejects_non_canonical_pair(self):
+        # Écritures qui contournent save() : la contrainte CHECK reste la garantie
+        with self.assertRaises(IntegrityError):
+            PrivateConversation.objects.bulk_create([PrivateConversation(user1=self.bob, user2=self.alice)])
+
+
+class CartTests(TestCase):
+    """Totaux du panier recalculés en base et badge servi depuis la session"""
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.controller = create_product(category, 'manette', '25.00')
+        self.headset = create_product(category, 'casque', '40.50')
+
+    def add(self, product, quantity):
+        return self.client.post(reverse('add_to_cart'), {'product_id': product.id, 'quantity': quantity}).json()
+
+    def test_visit_creates_no_cart(self):
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_totals_follow_cart_lines(self):
+        self.add(self.controller, 2)
+        self.add(self.controller, 1)
+        self.assertEqual(self.add(self.headset, 1)['cart_count'], 4)
+
+        cart = Cart.objects.get()
+        self.assertEqual((cart.items_count, cart.total_price), (4, Decimal('115.50')))
+        self.assertEqual(compute_cart_totals(cart.pk), (4, Decimal('115.50')))
+        self.assertEqual(self.client.session[CART_COUNT_SESSION_KEY], 4)
+
+        line = CartItem.objects.get(product=self.controller)
+        response = self.client.post(reverse('update_cart_item'), {'item_id': line.id, 'quantity': 5}).json()
+        self.assertEqual((response['cart_count'], response['cart_total']), (6, '165.50'))
+
+        response = self.client.post(reverse('remove_from_cart'), {'item_id': line.id}).json()
+        self.assertEqual((response['cart_count'], response['cart_total']), (1, '40.50'))
+        self.assertEqual(self.client.session[CART_COUNT_SESSION_KEY], 1)
+
+    def test_badge_read_from_session(self):
+        self.add(self.controller, 3)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = self.client.session
+        # Session déjà chargée, comme par le middleware
+        self.assertIn(CART_COUNT_SESSION_KEY, request.session)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_count(request), 3)
+
+        # Sans compteur en session : une lecture du total dénormalisé, puis mémorisation
+        del request.session[CART_COUNT_SESSION_KEY]
+        with self.assertNumQueries(1):
+            self.assertEqual(get_cart_count(request), 3)
+        self.assertEqual(request.session[CART_COUNT_SESSION_KEY], 3)
+
+
+class CheckoutTests(TestCase):
+    """Passage de commande atomique : tout ou rien, nombre de requêtes constant"""
+
+    def setUp(self):
+        self.category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.cart = Cart.objects.create(session_key='acheteur')
+
+    def add_line(self, product, quantity, variant=None):
+        price = variant.get_final_price() if variant else product.price
+        CartItem.objects.create(cart=self.cart, product=product, variant=variant, quantity=quantity, price=price)
+        refresh_cart_totals(self.cart)
+
+    def test_order_copies_lines_and_empties_cart(self):
+        controller = create_product(self.category, 'manette', '25.00', stock=5)
+        shirt = create_product(self.category, 'maillot', '30.00')
+        large = ProductVariant.objects.create(product=shirt, name='Taille', value='XL', price_adjustment=Decimal('5.00'))
+        self.add_line(controller, 2)
+        self.add_line(shirt, 1, large)
+
+        order = place_order(self.cart, None, CUSTOMER)
+
+        self.assertEqual(order.subtotal, Decimal('85.00'))
+        self.assertEqual(
+            sorted(order.items.values_list('product_name', 'product_price', 'quantity', 'total_price')),
+            [('Maillot', Decimal('35.00'), 1, Decimal('35.00')), ('Manette', Decimal('25.00'), 2, Decimal('50.00'))],
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.items_count, self.cart.items.count()), (0, 0))
+        controller.refresh_from_db()
+        self.assertEqual(controller.stock, 3)
+
+    def test_out_of_stock_line_cancels_whole_order(self):
+        controller = create_product(self.category, 'manette', stock=5)
+        headset = create_product(self.category, 'casque', stock=1)
+        self.add_line(controller, 2)
+        self.add_line(headset, 2)
+
+        with self.assertRaises(OutOfStock):
+            place_order(self.cart, None, CUSTOMER)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(list(Product.objects.order_by('slug').values_list('stock', flat=True)), [1, 5])
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_queries_do_not_grow_with_lines(self):
+        for index in range(6):
+            self.add_line(create_product(self.category, f'produit-{index}', stock=10 if index % 2 else None), 1)
+        # Savepoint, lignes, commande, stock, réservations, lignes de commande, vidage, totaux, libération
+        with self.assertNumQueries(9):
+            place_order(self.cart, None, CUSTOMER)
+
+
+class StockReservationTests(TestCase):
+    """Réservations de stock : confirmées au paiement, rendues à l'annulation ou à l'expiration"""
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.controller = create_product(category, 'manette', stock=3)
+        shirt = create_product(category, 'maillot')
+        self.large = ProductVariant.objects.create(product=shirt, name='Taille', value='XL', stock=4)
+
+    def order(self, controllers=3, shirts=1):
+        cart = Cart.objects.create(session_key='acheteur')
+        CartItem.objects.create(cart=cart, product=self.controller, quantity=controllers, price=self.controller.price)
+        CartItem.objects.create(cart=cart, product=self.large.product, variant=self.large, quantity=shirts, price=1)
+        return place_order(refresh_cart_totals(cart), None, CUSTOMER)
+
+    def stock(self):
+        self.controller.refresh_from_db()
+        self.large.refresh_from_db()
+        return self.controller.stock, self.controller.status, self.large.stock
+
+    def test_release_restores_stock_once(self):
+        order = self.order()
+        self.assertEqual(self.stock(), (0, 'out_of_stock', 3))
+
+        self.assertEqual(release_order_stock(order), 2)
+        self.assertEqual(self.stock(), (3, 'active', 4))
+        # Une seconde libération (webhook rejoué, tâche concurrente) ne rend rien
+        self.assertEqual(release_order_stock(order), 0)
+        self.assertFalse(release_reservation(order.stock_reservations.first()))
+        self.assertEqual(self.stock(), (3, 'active', 4))
+
+    def test_committed_reservations_survive_expiry(self):
+        paid = self.order(controllers=1)
+        self.assertEqual(commit_order_stock(paid), 2)
+        unpaid = self.order(controllers=1)
+
+        later = timezone.now() + timedelta(minutes=STOCK_RESERVATION_MINUTES + 1)
+        self.assertEqual(release_expired_reservations(later), (1, 2))
+        self.assertEqual(self.stock(), (2, 'active', 3))
+        unpaid.refresh_from_db()
+        paid.refresh_from_db()
+        self.assertEqual((unpaid.status, paid.status), ('cancelled', 'pending'))
+        self.assertEqual(set(paid.stock_reservations.values_list('status', flat=True)), {'committed'})
+
+    def test_unexpired_reservations_are_kept(self):
+        self.order()
+        self.assertEqual(release_expired_reservations(), (0, 0))
+        self.assertEqual(self.stock(), (0, 'out_of_stock', 3))
+
+
+class AnonymousCartLifecycleTests(TestCase):
+    """Panier anonyme fusionné à la connexion, paniers abandonnés purgés par lots"""
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.controller = create_product(category, 'manette', '25.00')
+        self.headset = create_product(category, 'casque', '40.00')
+        self.user = create_user('joueur')
+
+    def add(self, product, quantity):
+        self.client.post(reverse('add_to_cart'), {'product_id': product.id, 'quantity': quantity})
+
+    def test_login_merges_anonymous_lines_into_user_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.controller, quantity=1, price=self.controller.price)
+        refresh_cart_totals(cart)
+        self.add(self.controller, 2)
+        self.add(self.headset, 1)
+
+        self.client.login(username='joueur', password='motdepasse')
+
+        self.assertEqual(list(Cart.objects.all()), [cart])
+        self.assertEqual(dict(cart.items.values_list('product__slug', 'quantity')), {'manette': 3, 'casque': 1})
+        cart.refresh_from_db()
+        self.assertEqual((cart.items_count, cart.total_price), (4, Decimal('115.00')))
+        # Le badge est relu depuis le panier fusionné
+        self.assertNotIn(CART_COUNT_SESSION_KEY, self.client.session)
+
+    def test_login_adopts_anonymous_cart(self):
+        self.add(self.headset, 2)
+        anonymous = Cart.objects.get()
+
+        self.client.login(username='joueur', password='motdepasse')
+
+        anonymous.refresh_from_db()
+        self.assertEqual((anonymous.user, anonymous.session_key, anonymous.items_count), (self.user, None, 2))
+
+    def test_cleanup_deletes_only_abandoned_carts(self):
+        old = timezone.now() - timedelta(days=ABANDONED_CART_DAYS + 1)
+        abandoned = [Cart.objects.create(session_key=f'visiteur-{index}') for index in range(3)]
+        for cart in abandoned:
+            CartItem.objects.create(cart=cart, product=self.controller, quantity=1, price=self.controller.price)
+        user_cart = Cart.objects.create(user=self.user)
+        recent = Cart.objects.create(session_key='visiteur-actif')
+        Cart.objects.filter(pk__in=[cart.pk for cart in abandoned] + [user_cart.pk]).update(updated_at=old)
+
+        output = StringIO()
+        call_command('cleanup_abandoned_carts', '--dry-run', stdout=output)
+        self.assertIn('3 paniers', output.getvalue())
+        self.assertEqual(Cart.objects.count(), 5)
+
+        call_command('cleanup_abandoned_carts', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(set(Cart.objects.all()), {user_cart, recent})
+        self.assertFalse(CartItem.objects.exists())
+
+        call_command('cleanup_abandoned_carts', '--include-users', stdout=StringIO())
+        self.assertEqual(list(Cart.objects.all()), [recent])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogFacetTests(TestCase):
+    """Comptes par facette : chaque facette est comptée sans son propre filtre"""
+
+    def setUp(self):
+        accessories = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        consoles = ProductCategory.objects.create(name='Consoles', slug='consoles')
+        controllers = ProductCategory.objects.create(name='Manettes', slug='manettes', parent=consoles)
+        pro = create_product(controllers, 'manette-pro', '20000', tags=['sans-fil', 'pro'], stock=0)
+        basic = create_product(controllers, 'manette-basic', '4000', tags=['filaire'], is_featured=True)
+        create_product(consoles, 'console', '100000', tags=['pro'])
+        headset = create_product(accessories, 'casque', '12000', tags=['sans-fil'])
+        create_product(accessories, 'ancien-casque', '8000', tags=['sans-fil'], status='inactive')
+        for product, colors in ((pro, ['Noir', 'Blanc']), (basic, ['Noir']), (headset, ['Rouge'])):
+            for color in colors:
+                ProductVariant.objects.create(product=product, name='Couleur', value=color)
+        # L'arbre des catégories est rechargé après validation ; ici, via une nouvelle version
+        cache.clear()
+
+    def facets(self, query=''):
+        return browse_catalog(QueryDict(query))[2]
+
+    def test_counts_without_filters(self):
+        facets = self.facets()
+        self.assertEqual(
+            [(entry['slug'], entry['depth'], entry['count']) for entry in facets['categories']],
+            [('accessoires', 0, 1), ('consoles', 0, 3), ('manettes', 1, 2)],
+        )
+        self.assertEqual([bucket['count'] for bucket in facets['prices']], [1, 1, 1, 0, 1])
+        self.assertEqual([(tag['value'], tag['count']) for tag in facets['tags']], [('pro', 2), ('sans-fil', 2), ('filaire', 1)])
+        self.assertEqual(
+            [(value['value'], value['count']) for value in facets['attributes'][0]['values']],
+            [('Noir', 2), ('Blanc', 1), ('Rouge', 1)],
+        )
+        self.assertEqual((facets['featured']['count'], facets['in_stock']['count']), (1, 3))
+
+    def test_selected_facet_keeps_its_other_values(self):
+        products, filters, facets = browse_catalog(QueryDict('tag=pro'))
+        self.assertEqual({product.slug for product in products}, {'manette-pro', 'console'})
+        self.assertEqual(
+            [(tag['value'], tag['count'], tag['selected']) for tag in facets['tags']],
+            [('pro', 2, True), ('sans-fil', 2, False), ('filaire', 1, False)],
+        )
+        self.assertEqual([(entry['slug'], entry['count']) for entry in facets['categories']], [('consoles', 2), ('manettes', 1)])
+        self.assertEqual([bucket['count'] for bucket in facets['prices']], [0, 0, 1, 0, 1])
+
+    def test_attribute_and_category_filters(self):
+        products, _, facets = browse_catalog(QueryDict('attr=Couleur:Noir&category=consoles'))
+        self.assertEqual({product.slug for product in products}, {'manette-pro', 'manette-basic'})
+        self.assertEqual(
+            [(value['value'], value['count'], value['selected']) for value in facets['attributes'][0]['values']],
+            [('Noir', 2, True), ('Blanc', 1, False)],
+        )
+        self.assertEqual(
+            [(entry['slug'], entry['count'], entry['selected']) for entry in facets['categories']],
+            [('consoles', 2, True), ('manettes', 2, False)],
+        )
+
+    def test_flag_facets_count_with_the_other_flag(self):
+        products, _, facets = browse_catalog(QueryDict('in_stock=1'))
+        self.assertEqual(products.count(), 3)
+        self.assertEqual((facets['featured']['count'], facets['in_stock']['count']), (1, 3))
+
+    def test_facet_index_follows_variant_changes(self):
+        ProductVariant.objects.filter(value='Rouge').delete()
+        self.assertEqual(
+            [value['value'] for value in self.facets()['attributes'][0]['values']], ['Noir', 'Blanc']
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProductSearchTests(TestCase):
+    """Recherche des produits classée par BM25 : nom, puis tags, résumé et description"""
+
+    def setUp(self):
+        self.category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        create_product(self.category, 'casque', description='<p>Compatible <strong>manette</strong> et console</p>')
+        create_product(self.category, 'support', tags=['manette', 'rangement'])
+        create_product(self.category, 'manette', short_description='Sans fil')
+        cache.clear()
+
+    def slugs(self, query, **kwargs):
+        return [product.slug for product in search_products(query, **kwargs)]
+
+    def test_name_ranks_above_tags_and_description(self):
+        self.assertEqual(self.slugs('manette'), ['manette', 'support', 'casque'])
+        self.assertEqual(self.slugs('manette', limit=1, offset=1), ['support'])
+        # Le balisage HTML de la description n'est pas indexé
+        self.assertEqual(self.slugs('strong'), [])
+
+    def test_inactive_products_do_not_shorten_pages(self):
+        for index in range(6):
+            create_product(self.category, f'manette-{index}', status='inactive')
+        self.assertEqual(self.slugs('manette', limit=2), ['manette', 'support'])
+
+    def test_index_follows_renames_and_deletions(self):
+        product = Product.objects.get(slug='manette')
+        product.name = 'Joystick'
+        product.save()
+        self.assertEqual(self.slugs('joystick'), ['manette'])
+        self.assertEqual(self.slugs('manette'), ['support', 'casque'])
+
+        product.delete()
+        self.assertEqual(self.slugs('joystick'), [])
+
+    def test_autocomplete_matches_name_prefixes_and_is_cached(self):
+        self.assertEqual(autocomplete_products('man'), [('Manette', 'manette')])
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete_products('MAN'), [('Manette', 'manette')])
+        self.assertEqual(autocomplete_products('sup'), [('Support', 'support')])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CategoryTreeTests(TestCase):
+    """Arbre des catégories à chemin matérialisé, sous-arbres masqués par une catégorie inactive"""
+
+    def setUp(self):
+        self.consoles = ProductCategory.objects.create(name='Consoles', slug='consoles')
+        self.accessories = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.controllers = ProductCategory.objects.create(name='Manettes', slug='manettes', parent=self.consoles)
+        self.wireless = ProductCategory.objects.create(name='Sans fil', slug='sans-fil', parent=self.controllers)
+        create_product(self.consoles, 'console')
+        create_product(self.controllers, 'manette')
+        create_product(self.wireless, 'manette-sans-fil')
+        cache.clear()
+
+    def test_moving_category_moves_its_subtree(self):
+        self.controllers.parent = self.accessories
+        self.controllers.save()
+
+        self.wireless.refresh_from_db()
+        self.assertTrue(self.wireless.path.startswith(self.accessories.path))
+        self.assertEqual(self.wireless.depth, 2)
+        with self.assertRaises(ValueError):
+            self.accessories.parent = self.wireless
+            self.accessories.save()
+
+    def test_root_counts_include_descendants(self):
+        self.assertEqual(
+            [(category['slug'], category['subcategories_count'], category['products_count']) for category in top_categories()],
+            [('accessoires', 0, 0), ('consoles', 1, 3)],
+        )
+        products, _, _ = browse_catalog(QueryDict(), category=self.consoles)
+        self.assertEqual({product.slug for product in products}, {'console', 'manette', 'manette-sans-fil'})
+
+    def test_inactive_category_hides_its_subtree(self):
+        # L'arbre en cache est invalidé après validation de la modification
+        self.controllers.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.controllers.save()
+
+        tree = get_category_tree()
+        self.assertIsNone(tree.get('manettes'))
+        self.assertIsNone(tree.get('sans-fil'))
+        self.assertEqual(top_categories()[1]['products_count'], 1)
+        products, _, _ = browse_catalog(QueryDict(), category=self.consoles)
+        self.assertEqual([product.slug for product in products], ['console'])
+
+    def test_tree_is_cached_until_invalidated(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            get_category_tree()
+        invalidate_category_tree()
+        with self.assertNumQueries(1):
+            get_category_tree()
+
+
+class RecommendationTests(TestCase):
+    """Voisins précalculés : achats communs (cosinus) et tags partagés (Jaccard)"""
+
+    def setUp(self):
+        self.category = ProductCategory.objects.create(name='Accessoires', slug='accessoires')
+        self.controller = create_product(self.category, 'manette', tags=['Sans-fil'])
+        self.headset = create_product(self.category, 'casque')
+        self.cable = create_product(self.category, 'cable')
+        self.console = create_product(self.category, 'console', tags=['sans-fil '])
+        self.stand = create_product(self.category, 'support')
+        create_product(self.category, 'ancienne-manette', tags=['sans-fil'], status='inactive')
+
+    def order(self, *products, payment_status='paid'):
+        order = Order.objects.create(subtotal=0, total_amount=0, payment_status=payment_status, **CUSTOMER)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.name, product_price=1, quantity=1, total_price=1)
+            for product in products
+        ])
+
+    def test_similarity_formulas(self):
+        co_purchase = co_purchase_similarity([{'a', 'b'}, {'a', 'b'}, {'a', 'c'}])
+        self.assertAlmostEqual(co_purchase['a']['b'], 2 / math.sqrt(3 * 2))
+        self.assertAlmostEqual(co_purchase['c']['a'], 1 / math.sqrt(3 * 1))
+        self.assertNotIn('c', co_purchase['b'])
+
+        tags = tag_similarity({'a': {'x', 'y'}, 'b': {'y'}, 'c': {'z'}})
+        self.assertEqual(tags['a']['b'], 0.5)
+        self.assertNotIn('c', tags)
+
+    def test_related_products_use_precomputed_neighbours(self):
+        self.order(self.controller, self.headset)
+        self.order(self.controller, self.headset)
+        self.order(self.controller, self.cable)
+        # Commande impayée : ignorée
+        self.order(self.controller, self.stand, payment_status='pending')
+
+        self.assertEqual(compute_recommendations(dry_run=True), (4, 6))
+        self.assertFalse(ProductRecommendation.objects.exists())
+        compute_recommendations()
+
+        self.assertEqual(
+            list(self.controller.recommendations.order_by('rank').values_list('recommended__slug', flat=True)),
+            ['casque', 'cable', 'console'],
+        )
+        # Les voisins manquants sont complétés par les nouveautés de la catégorie
+        self.assertEqual([product.slug for product in get_related_products(self.controller)], [
+            'casque', 'cable', 'console', 'support',
+        ])
@@ -11,6 +11,7 @@ urlpatterns = [
     path('product/<uuid:post_id>/', views.product_detail, name='product_detail'),
     path('delete/<uuid:post_id>/', views.delete_post, name='delete_post'),
     path('logout/', views.logout_view, name='logout'),
+    path('api/posts/search/', views.search_posts_api, name='search_posts_api'),
     
     # Transactions gaming
     path('initiate-transaction/<uuid:post_id>/', views.initiate_transaction, name='initiate_transaction'),
@@ -33,12 +34,17 @@ urlpatterns = [
     path('chat/list/', views.chat_list, name='chat_list'),
     path('notifications/', views.notifications, name='notifications'),
     path('notifications/mark-read/<uuid:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/mark-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('api/notifications/', views.notifications_api, name='notifications_api'),
     
     # Chat privé et groupes
     path('chat/search/', views.user_search, name='user_search'),
+    path('api/users/search/', views.user_search_api, name='user_search_api'),
     path('chat/private/<int:user_id>/', views.private_chat, name='private_chat'),
     path('chat/private/<uuid:conversation_id>/send/', views.send_private_message, name='send_private_message'),
     path('chat/private/<uuid:conversation_id>/messages/', views.get_private_messages, name='get_private_messages'),
+    path('chat/transaction/<uuid:chat_id>/send/', views.send_transaction_message, name='send_message'),
+    path('chat/transaction/<uuid:chat_id>/messages/', views.get_transaction_messages, name='get_messages'),
     
     # Groupes
     path('chat/groups/', views.group_list, name='group_list'),
@@ -65,6 +71,8 @@ urlpatterns = [
     # Pages principales boutique
     path('shop/', views.shop_home, name='shop_home'),
     path('shop/products/', views.shop_products, name='shop_products'),
+    path('api/shop/search/', views.shop_search_api, name='shop_search_api'),
+    path('api/shop/autocomplete/', views.shop_autocomplete_api, name='shop_autocomplete_api'),
     path('shop/product/<slug:slug>/', views.shop_product_detail, name='shop_product_detail'),
     path('shop/category/<slug:slug>/', views.shop_category, name='shop_category'),
     
@@ -98,6 +106,7 @@ urlpatterns = [
     path('webhooks/shopify/products/create/', webhook_handlers.shopify_product_create_webhook, name='shopify_product_create_webhook'),
     path('webhooks/shopify/products/update/', webhook_handlers.shopify_product_update_webhook, name='shopify_product_update_webhook'),
     path('webhooks/shopify/products/delete/', webhook_handlers.shopify_product_delete_webhook, name='shopify_product_delete_webhook'),
+    path('webhooks/shopify/inventory-levels/', webhook_handlers.shopify_inventory_level_webhook, name='shopify_inventory_level_webhook'),
     
     # === URLs HIGHLIGHTS ===
     
@@ -1,27 +1,53 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Q, Count, F
+from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.cache import never_cache
 from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
 import json
 import logging
+from asgiref.sync import sync_to_async
 
 from .models import (
     Profile, Post, PostImage, PostVideo, Transaction, Chat, Message, Notification,
     Product, ProductCategory, Cart, CartItem, Order, OrderItem, ShopCinetPayTransaction,
     ProductVariant, UserReputation, SellerPaymentInfo, Highlight, HighlightLike, 
-    HighlightComment, HighlightView, HighlightShare, UserSubscription
+    HighlightComment, HighlightView, HighlightShare, UserSubscription, FriendRequest,
+    PrivateMessage, GroupMessage, Group, GroupMembership
 )
 from .shopify_utils import create_shopify_order_from_blizz_order, sync_products_from_shopify
+from .catalog_utils import browse_catalog, get_category_tree, top_categories, with_images
+from .recommendation_utils import get_related_products
+from .cart_utils import get_cart, get_cart_items, get_or_create_cart, place_order, refresh_cart_totals, remember_cart_count
+from .chat_utils import (
+    CHAT_HISTORY_LIMIT, CHAT_LONG_POLL_TIMEOUT, chat_channel, chat_messages_queryset, get_chat_broker,
+    get_chat_messages, get_inbox, get_or_create_conversation, mark_group_read, mark_private_read,
+    serialize_chat_message, serialize_inbox_entry, user_can_access_chat
+)
 from .cinetpay_utils import CinetPayAPI, handle_cinetpay_notification, convert_currency_for_cinetpay
+from .inventory_utils import OutOfStock
+from .notification_utils import (
+    get_cached_unread_notification_count, get_notifications, mark_notifications_read, serialize_notification,
+    mark_notification_read as mark_user_notification_read
+)
+from .reputation_utils import attach_seller_badges, get_user_reputation_summary
+from .search_utils import (
+    PRODUCT_SEARCH_LIMIT, autocomplete_products, decode_cursor, search_posts, search_products
+)
+from .shop_cache_utils import cached_fragment
+from .social_utils import (
+    get_friend_suggestions, get_friends, get_profile_stats, search_users, serialize_user_result
+)
 from django.db.models import Exists, OuterRef
 import re
 
@@ -30,14 +56,66 @@ logger = logging.getLogger(__name__)
 # ===== Vues existantes simples (stubs pour garantir l'import) =====
 
 def index(request):
-	posts = Post.objects.all().order_by('-created_at')[:20]
-	return render(request, 'index.html', {'posts': posts})
+	posts, next_cursor = search_posts(request.GET)
+	posts = attach_seller_badges(posts)
+	next_page_query = None
+	if next_cursor:
+		query = request.GET.copy()
+		query['cursor'] = next_cursor
+		next_page_query = query.urlencode()
+	context = {
+		'posts': posts,
+		'game_choices': Post.GAME_CHOICES,
+		'current_filters': request.GET.dict(),
+		'next_page_query': next_page_query,
+	}
+	return render(request, 'index.html', context)
+
+def search_posts_api(request):
+    """API de recherche des annonces avec filtres et pagination par curseur (AJAX)"""
+    try:
+        posts, next_cursor = search_posts(request.GET)
+        posts_data = [{
+            'id': str(post.id),
+            'title': post.title,
+            'caption': post.caption,
+            'game': post.get_game_display_name(),
+            'game_type': post.game_type,
+            'price': str(post.price),
+            'coins': post.coins,
+            'level': post.level,
+            'coins_value': post.coins_value,
+            'level_value': post.level_value,
+            'is_sold': post.is_sold,
+            'is_verified': post.is_verified,
+            'banner': post.banner.url if post.has_banner else None,
+            'author': post.author.username if post.author else post.user,
+            'created_at': post.created_at.isoformat(),
+        } for post in posts]
+        return JsonResponse({'success': True, 'posts': posts_data, 'next_cursor': next_cursor})
+    except Exception as e:
+        logger.error(f"Erreur search_posts_api: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
 
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(User.objects.select_related('profile'), username=username)
     prof = getattr(user, 'profile', None)
-    user_posts = Post.objects.filter(author=user).order_by('-created_at')
-    return render(request, 'profile.html', {'profile': prof, 'user_obj': user, 'posts': user_posts})
+    stats = get_profile_stats(user)
+    user_posts = Post.objects.filter(author=user).prefetch_related('images').order_by('-created_at', '-id')
+    paginator = Paginator(user_posts, 12)
+    # Le total est déjà connu par les statistiques : évite un COUNT supplémentaire
+    paginator.count = stats['posts_count']
+    posts = paginator.get_page(request.GET.get('page'))
+    context = {
+        'profile': prof,
+        'user_profile': prof,
+        'user_obj': user,
+        'posts': posts,
+        'stats': stats,
+        'total_sales': stats['sales_count'],
+        'reputation_summary': get_user_reputation_summary(user),
+    }
+    return render(request, 'profile.html', context)
 
 @login_required
 def settings(request):
@@ -126,37 +204,195 @@ def cinetpay_payment_failed(request, transaction_id):
 
 # ===== Chat, notifications et amis (stubs basiques pour éviter les erreurs d'import) =====
 
+@login_required
 def chat_home(request):
-    return render(request, 'chat/chat_home.html')
+    try:
+        all_chats = [serialize_inbox_entry(entry, request.user) for entry in get_inbox(request.user)]
+        return render(request, 'chat/chat_home.html', {'all_chats': all_chats})
+    except Exception as e:
+        logger.error(f"Erreur lors du chargement de la boîte de réception: {e}")
+        messages.error(request, 'Erreur lors du chargement des conversations')
+        return redirect('index')
 
+@login_required
 def chat_list(request):
-    return render(request, 'chat_list.html')
+    chats = Chat.objects.select_related(
+        'transaction__post', 'transaction__buyer', 'transaction__seller'
+    ).order_by('-created_at')
+    return render(request, 'chat_list.html', {
+        'buyer_chats': chats.filter(transaction__buyer=request.user),
+        'seller_chats': chats.filter(transaction__seller=request.user),
+    })
 
 def notifications(request):
-    notes = Notification.objects.filter(user=request.user) if request.user.is_authenticated else []
-    return render(request, 'notifications.html', {'notifications': notes})
+    notes, next_cursor = [], None
+    unread_only = request.GET.get('unread') == '1'
+    if request.user.is_authenticated:
+        notes, next_cursor = get_notifications(request.user, request.GET.get('cursor'), unread_only)
+    return render(request, 'notifications.html', {
+        'notifications': notes,
+        'next_cursor': next_cursor,
+        'unread_only': unread_only,
+    })
 
+@login_required
 def mark_notification_read(request, notification_id):
-    note = get_object_or_404(Notification, id=notification_id, user=request.user)
-    note.is_read = True
-    note.save()
+    get_object_or_404(Notification, id=notification_id, user=request.user)
+    mark_user_notification_read(request.user, notification_id)
     return redirect('notifications')
 
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    """Marque tout comme lu, ou jusqu'au curseur transmis (dernière notification affichée)"""
+    updated = mark_notifications_read(request.user, request.POST.get('cursor'))
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': True,
+            'updated': updated,
+            'unread_count': get_cached_unread_notification_count(request.user),
+        })
+    return redirect('notifications')
+
+@login_required
+def notifications_api(request):
+    """API du fil de notifications paginé par curseur (AJAX)"""
+    try:
+        notes, next_cursor = get_notifications(
+            request.user, request.GET.get('cursor'), request.GET.get('unread') == '1'
+        )
+        return JsonResponse({
+            'success': True,
+            'notifications': [serialize_notification(note) for note in notes],
+            'next_cursor': next_cursor,
+            'unread_count': get_cached_unread_notification_count(request.user),
+        })
+    except Exception as e:
+        logger.error(f"Erreur notifications_api: {e}")
+        return JsonResponse({'success': False, 'error': str(e), 'notifications': []})
+
 def user_search(request):
-    q = request.GET.get('q', '')
-    users = User.objects.filter(username__icontains=q)[:20]
-    return render(request, 'chat/user_search.html', {'users': users})
+    query = request.GET.get('q', '')
+    game_filter = request.GET.get('game', '')
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return user_search_api(request)
+    users = [serialize_user_result(user) for user in search_users(query, request.user, game_filter)]
+    return render(request, 'chat/user_search.html', {
+        'users': users,
+        'query': query,
+        'game_filter': game_filter,
+        'game_choices': Profile.GAME_CHOICES,
+    })
+
+def user_search_api(request):
+    """API de recherche d'utilisateurs pour la saisie en temps réel (AJAX)"""
+    try:
+        query = request.GET.get('q', '')
+        users = search_users(query, request.user, request.GET.get('game', ''))
+        # La requête est renvoyée pour que le client ignore les réponses arrivées dans le désordre
+        response = JsonResponse({
+            'success': True,
+            'query': query,
+            'users': [serialize_user_result(user) for user in users],
+        })
+        response['Cache-Control'] = 'private, max-age=30'
+        return response
+    except Exception as e:
+        logger.error(f"Erreur user_search_api: {e}")
+        return JsonResponse({'success': False, 'error': str(e), 'users': []})
 
+@login_required
 def private_chat(request, user_id):
-    other = get_object_or_404(User, id=user_id)
-    return render(request, 'chat/private_chat.html', {'other': other})
+    other_user = get_object_or_404(User.objects.select_related('profile'), id=user_id)
+    if other_user == request.user:
+        messages.error(request, 'Vous ne pouvez pas discuter avec vous-même')
+        return redirect('chat_home')
+    conversation = get_or_create_conversation(request.user, other_user)
+    chat_messages = chat_messages_queryset('private', conversation.id).select_related('sender').order_by('-created_at', '-id')
+    return render(request, 'chat/private_chat.html', {
+        'conversation': conversation,
+        'other_user': other_user,
+        'other_user_profile': getattr(other_user, 'profile', None),
+        'chat_messages': list(chat_messages[:CHAT_HISTORY_LIMIT])[::-1],
+    })
+
+def _send_chat_message(request, kind, chat_id, create_message):
+    """Enregistre un message (AJAX) ; boîte de réception et diffusion suivent par signaux"""
+    try:
+        if not user_can_access_chat(request.user, kind, chat_id):
+            return JsonResponse({'success': False, 'error': 'Accès refusé'}, status=403)
+        content = request.POST.get('content', '').strip()
+        if not content:
+            return JsonResponse({'success': False, 'error': 'Message vide'})
+        with db_transaction.atomic():
+            message = create_message(content)
+        data = serialize_chat_message(message)
+        data['is_own'] = True
+        return JsonResponse({'success': True, 'message': data})
+    except Exception as e:
+        logger.error(f"Erreur lors de l'envoi du message {kind} {chat_id}: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
 
 @require_POST
 def send_private_message(request, conversation_id):
-    return JsonResponse({'success': True})
+    return _send_chat_message(
+        request, 'private', conversation_id,
+        lambda content: PrivateMessage.objects.create(
+            conversation_id=conversation_id, sender=request.user, content=content
+        ),
+    )
+
+async def _chat_messages_response(request, kind, chat_id):
+    """
+    Historique incrémental d'une discussion (AJAX).
+    ?since=<curseur> ne renvoie que les nouveaux messages ; ?wait=<secondes> fait attendre
+    la requête (long-poll) jusqu'à l'arrivée d'un message si aucun n'est disponible.
+    Vue asynchrone : l'attente n'occupe aucun thread.
+    """
+    try:
+        user = await request.auser()
+        if not await sync_to_async(user_can_access_chat)(user, kind, chat_id):
+            return JsonResponse({'success': False, 'error': 'Accès refusé'}, status=403)
 
-def get_private_messages(request, conversation_id):
-    return JsonResponse({'messages': []})
+        since = request.GET.get('since') or None
+        try:
+            wait = min(max(float(request.GET.get('wait', 0)), 0), CHAT_LONG_POLL_TIMEOUT)
+        except ValueError:
+            wait = 0
+
+        broker = get_chat_broker()
+        channel = chat_channel(kind, chat_id)
+        # Version relevée avant la lecture : un message publié entre les deux réveille l'attente
+        version = broker.version(channel)
+        result = await sync_to_async(get_chat_messages)(kind, chat_id, since)
+        if wait and not result['messages'] and await broker.wait_async(channel, wait, version):
+            result = await sync_to_async(get_chat_messages)(kind, chat_id, since)
+
+        # Les messages renvoyés au participant sont lus
+        if kind == 'group' and result['messages']:
+            await sync_to_async(mark_group_read)(user, chat_id, decode_cursor(result['cursor'], 'created_at'))
+        elif kind == 'private' and result['messages']:
+            await sync_to_async(mark_private_read)(user, chat_id)
+
+        for message in result['messages']:
+            message['is_own'] = message['sender_id'] == user.id
+        return JsonResponse({'success': True, **result})
+    except Exception as e:
+        logger.error(f"Erreur lors du chargement des messages {kind} {chat_id}: {e}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+async def get_private_messages(request, conversation_id):
+    return await _chat_messages_response(request, 'private', conversation_id)
+
+@require_POST
+def send_transaction_message(request, chat_id):
+    return _send_chat_message(
+        request, 'transaction', chat_id,
+        lambda content: Message.objects.create(chat_id=chat_id, sender=request.user, content=content),
+    )
+
+async def get_transaction_messages(request, chat_id):
+    return await _chat_messages_response(request, 'transaction', chat_id)
 
 def group_list(request):
     return render(request, 'chat/group_list.html')
@@ -165,14 +401,33 @@ def group_list(request):
 def create_group(request):
     return render(request, 'chat/create_group.html')
 
+@login_required
 def group_chat(request, group_id):
-    return render(request, 'chat/group_chat.html')
+    group = get_object_or_404(Group, id=group_id, is_active=True)
+    membership = GroupMembership.objects.filter(group=group, user=request.user, is_active=True).first()
+    if membership is None:
+        messages.error(request, "Vous n'êtes pas membre de ce groupe")
+        return redirect('group_list')
+    chat_messages = chat_messages_queryset('group', group.id).select_related('sender').order_by('-created_at', '-id')
+    response = render(request, 'chat/group_chat.html', {
+        'group': group,
+        'membership': membership,
+        'members_count': group.memberships.filter(is_active=True).count(),
+        'chat_messages': list(chat_messages[:CHAT_HISTORY_LIMIT])[::-1],
+    })
+    # L'historique affiché est lu : le filigrane avance jusqu'au dernier message
+    mark_group_read(request.user, group.id)
+    return response
 
+@require_POST
 def send_group_message(request, group_id):
-    return JsonResponse({'success': True})
+    return _send_chat_message(
+        request, 'group', group_id,
+        lambda content: GroupMessage.objects.create(group_id=group_id, sender=request.user, content=content),
+    )
 
-def get_group_messages(request, group_id):
-    return JsonResponse({'messages': []})
+async def get_group_messages(request, group_id):
+    return await _chat_messages_response(request, 'group', group_id)
 
 def group_members(request, group_id):
     return render(request, 'chat/group_members.html')
@@ -192,8 +447,21 @@ def promote_member(request, group_id):
 def leave_group(request, group_id):
     return JsonResponse({'success': True})
 
+@login_required
 def friend_requests(request):
-    return render(request, 'chat/friends.html')
+    try:
+        pending = FriendRequest.objects.filter(status='pending')
+        context = {
+            'friends': get_friends(request.user),
+            'pending_received': pending.filter(to_user=request.user).select_related('from_user'),
+            'pending_sent': pending.filter(from_user=request.user).select_related('to_user'),
+            'suggestions': get_friend_suggestions(request.user),
+        }
+        return render(request, 'chat/friends.html', context)
+    except Exception as e:
+        logger.error(f"Erreur lors du chargement des amis: {e}")
+        messages.error(request, 'Erreur lors du chargement des amis')
+        return redirect('index')
 
 def send_friend_request(request, user_id):
     return redirect('friend_requests')
@@ -211,43 +479,37 @@ def cancel_friend_request(request, request_id):
 
 def shop_home(request):
     try:
-        categories = ProductCategory.objects.filter(is_active=True, parent=None)[:6]
-        featured_products = Product.objects.filter(status='active', is_featured=True)[:8]
-        new_products = Product.objects.filter(status='active').order_by('-created_at')[:8]
-        context = {
-            'categories': categories,
-            'featured_products': featured_products,
-            'new_products': new_products,
-        }
-        return render(request, 'shop/home.html', context)
+        def render_content():
+            return render_to_string('shop/home_content.html', {
+                'categories': top_categories(limit=6),
+                'featured_products': with_images(Product.objects.filter(status='active', is_featured=True))[:8],
+                'new_products': with_images(Product.objects.filter(status='active').order_by('-created_at'))[:8],
+            })
+        # Le contenu du catalogue est mis en cache ; la page (panier, notifications) reste propre au visiteur
+        return render(request, 'shop/home.html', {'content': cached_fragment('home', {}, render_content)})
     except Exception as e:
         logger.error(f"Erreur dans shop_home: {e}")
         messages.error(request, "Erreur lors du chargement de la boutique")
         return redirect('index')
 
+def _catalog_querystring(request):
+    """Paramètres de navigation sans la page, pour les liens de pagination"""
+    query = request.GET.copy()
+    query.pop('page', None)
+    return query.urlencode()
+
 def shop_products(request):
     try:
-        products = Product.objects.filter(status='active')
-        categories = ProductCategory.objects.filter(is_active=True)
-        category_slug = request.GET.get('category')
-        if category_slug:
-            products = products.filter(category__slug=category_slug)
-        min_price = request.GET.get('min_price')
-        if min_price:
-            products = products.filter(price__gte=min_price)
-        max_price = request.GET.get('max_price')
-        if max_price:
-            products = products.filter(price__lte=max_price)
-        sort = request.GET.get('sort', '-created_at')
-        if sort in ['name', '-name', 'price', '-price', '-created_at', 'created_at']:
-            products = products.order_by(sort)
+        products, filters, facets = browse_catalog(request.GET)
         paginator = Paginator(products, 12)
         page_number = request.GET.get('page')
         products = paginator.get_page(page_number)
         context = {
             'products': products,
-            'categories': categories,
-            'current_sort': sort,
+            'facets': facets,
+            'filters': filters,
+            'current_sort': filters['sort'],
+            'querystring': _catalog_querystring(request),
         }
         return render(request, 'shop/products.html', context)
     except Exception as e:
@@ -255,21 +517,72 @@ def shop_products(request):
         messages.error(request, "Erreur lors du chargement des produits")
         return redirect('shop_home')
 
+def shop_search_api(request):
+    """API de recherche plein texte des produits, classés par pertinence (AJAX)"""
+    try:
+        query = request.GET.get('q', '')
+        try:
+            limit = min(max(int(request.GET.get('limit', PRODUCT_SEARCH_LIMIT)), 1), 50)
+            offset = max(int(request.GET.get('offset', 0)), 0)
+        except ValueError:
+            limit, offset = PRODUCT_SEARCH_LIMIT, 0
+        products = search_products(query, limit=limit, offset=offset)
+        return JsonResponse({
+            'success': True,
+            'query': query,
+            'products': [{
+                'id': str(product.id),
+                'name': product.name,
+                'slug': product.slug,
+                'short_description': product.short_description,
+                'price': str(product.price),
+                'category': product.category.name,
+                'url': reverse('shop_product_detail', args=[product.slug]),
+            } for product in products],
+            'next_offset': offset + limit if len(products) == limit else None,
+        })
+    except Exception as e:
+        logger.error(f"Erreur shop_search_api: {e}")
+        return JsonResponse({'success': False, 'error': str(e), 'products': []})
+
+def shop_autocomplete_api(request):
+    """Suggestions de produits pendant la saisie (AJAX)"""
+    try:
+        query = request.GET.get('q', '')
+        response = JsonResponse({
+            'success': True,
+            'query': query,
+            'suggestions': [
+                {'name': name, 'url': reverse('shop_product_detail', args=[slug])}
+                for name, slug in autocomplete_products(query)
+            ],
+        })
+        response['Cache-Control'] = 'public, max-age=60'
+        return response
+    except Exception as e:
+        logger.error(f"Erreur shop_autocomplete_api: {e}")
+        return JsonResponse({'success': False, 'error': str(e), 'suggestions': []})
+
 def shop_product_detail(request, slug):
     try:
-        product = get_object_or_404(Product, slug=slug, status='active')
-        # Récupérer toutes les images du produit pour le carrousel
-        product_images = product.images.all().order_by('order')
-        # Si pas d'images, utiliser l'image principale
-        if not product_images.exists() and product.featured_image:
-            product_images = [product.featured_image]
-        related_products = Product.objects.filter(category=product.category, status='active').exclude(id=product.id)[:4]
-        context = {
-            'product': product,
-            'product_images': product_images,
-            'related_products': related_products,
-        }
-        return render(request, 'shop/product_detail.html', context)
+        def render_content():
+            product = get_object_or_404(with_images(Product.objects.select_related('category')), slug=slug, status='active')
+            # Images du carrousel, déjà chargées dans l'ordre par le prefetch
+            product_images = list(product.images.all())
+            # Si pas d'images, utiliser l'image principale
+            if not product_images and product.featured_image:
+                product_images = [product.featured_image]
+            related_products = get_related_products(product)
+            context = {
+                'product': product,
+                'product_images': product_images,
+                'related_products': related_products,
+            }
+            return {
+                'product': {'id': str(product.id), 'name': product.name},
+                'content': render_to_string('shop/product_detail_content.html', context),
+            }
+        return render(request, 'shop/product_detail.html', cached_fragment('product', {'slug': slug}, render_content))
     except Exception as e:
         logger.error(f"Erreur dans shop_product_detail: {e}")
         messages.error(request, "Produit non trouvé")
@@ -277,28 +590,42 @@ def shop_product_detail(request, slug):
 
 def shop_category(request, slug):
     try:
-        category = get_object_or_404(ProductCategory, slug=slug, is_active=True)
-        products = Product.objects.filter(category=category, status='active')
-        min_price = request.GET.get('min_price')
-        if min_price:
-            products = products.filter(price__gte=min_price)
-        max_price = request.GET.get('max_price')
-        if max_price:
-            products = products.filter(price__lte=max_price)
-        sort = request.GET.get('sort', '-created_at')
-        if sort in ['name', '-name', 'price', '-price', '-created_at']:
-            products = products.order_by(sort)
-        paginator = Paginator(products, 12)
-        page_number = request.GET.get('page')
-        products = paginator.get_page(page_number)
-        context = {
-            'category': category,
-            'products': products,
-            'current_sort': sort,
-            'price_min': min_price,
-            'price_max': max_price,
-        }
-        return render(request, 'shop/category.html', context)
+        tree = get_category_tree()
+        category = tree.get(slug)
+        if category is None:
+            raise Http404("Catégorie introuvable")
+
+        def render_content():
+            products, filters, facets = browse_catalog(request.GET, category=category)
+            paginator = Paginator(products, 12)
+            page_number = request.GET.get('page')
+            products = paginator.get_page(page_number)
+            # Sous-catégories directes ayant des produits correspondant aux filtres
+            entries = facets['categories']
+            selected = next((i for i, entry in enumerate(entries) if entry['selected']), None)
+            subcategories = []
+            if selected is not None:
+                depth = entries[selected]['depth']
+                for entry in entries[selected + 1:]:
+                    if entry['depth'] <= depth:
+                        break
+                    if entry['depth'] == depth + 1:
+                        subcategories.append(entry)
+            return render_to_string('shop/category_content.html', {
+                'category': category,
+                'breadcrumbs': tree.ancestors(category),
+                'subcategories': subcategories,
+                'products': products,
+                'facets': facets,
+                'filters': filters,
+                'current_sort': filters['sort'],
+                'price_min': filters['min_price'] or '',
+                'price_max': filters['max_price'] or '',
+                'querystring': _catalog_querystring(request),
+            })
+
+        content = cached_fragment(f'category:{category.pk.hex}', request.GET, render_content)
+        return render(request, 'shop/category.html', {'category': category, 'content': content})
     except Exception as e:
         logger.error(f"Erreur dans shop_category: {e}")
         messages.error(request, "Catégorie non trouvée")
@@ -306,17 +633,6 @@ def shop_category(request, slug):
 
 # ===== Panier =====
 
-def get_or_create_cart(request):
-    if request.user.is_authenticated:
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-    else:
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.create()
-            session_key = request.session.session_key
-        cart, _ = Cart.objects.get_or_create(session_key=session_key)
-    return cart
-
 @require_POST
 def add_to_cart(request):
     try:
@@ -333,24 +649,29 @@ def add_to_cart(request):
         else:
             price = product.price
         cart = get_or_create_cart(request)
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            variant=variant,
-            defaults={'quantity': quantity, 'price': price}
-        )
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        return JsonResponse({'success': True, 'message': 'Produit ajouté au panier', 'cart_count': cart.get_total_items()})
+        with db_transaction.atomic():
+            cart_item, created = CartItem.objects.get_or_create(
+                cart=cart,
+                product=product,
+                variant=variant,
+                defaults={'quantity': quantity, 'price': price}
+            )
+            if not created:
+                CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
+            refresh_cart_totals(cart)
+        remember_cart_count(request, cart)
+        return JsonResponse({'success': True, 'message': 'Produit ajouté au panier', 'cart_count': cart.items_count})
     except Exception as e:
         logger.error(f"Erreur add_to_cart: {e}")
         return JsonResponse({'success': False, 'message': "Erreur lors de l'ajout au panier"})
 
 def cart_view(request):
     try:
-        cart = get_or_create_cart(request)
-        return render(request, 'shop/cart.html', {'cart': cart})
+        cart = get_cart(request)
+        if cart is None:
+            return render(request, 'shop/cart.html', {'cart': None, 'cart_items': []})
+        remember_cart_count(request, cart)
+        return render(request, 'shop/cart.html', {'cart': cart, 'cart_items': get_cart_items(cart)})
     except Exception as e:
         logger.error(f"Erreur cart_view: {e}")
         messages.error(request, "Erreur lors du chargement du panier")
@@ -361,14 +682,21 @@ def update_cart_item(request):
     try:
         item_id = request.POST.get('item_id')
         quantity = int(request.POST.get('quantity', 1))
-        cart = get_or_create_cart(request)
+        cart = get_cart(request)
         cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
-        return JsonResponse({'success': True})
+        with db_transaction.atomic():
+            if quantity > 0:
+                cart_item.quantity = quantity
+                cart_item.save(update_fields=['quantity', 'updated_at'])
+            else:
+                cart_item.delete()
+            refresh_cart_totals(cart)
+        remember_cart_count(request, cart)
+        return JsonResponse({
+            'success': True,
+            'cart_count': cart.items_count,
+            'cart_total': str(cart.total_price),
+        })
     except Exception as e:
         logger.error(f"Erreur update_cart_item: {e}")
         return JsonResponse({'success': False, 'message': 'Erreur lors de la mise à jour'})
@@ -377,10 +705,17 @@ def update_cart_item(request):
 def remove_from_cart(request):
     try:
         item_id = request.POST.get('item_id')
-        cart = get_or_create_cart(request)
+        cart = get_cart(request)
         cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        cart_item.delete()
-        return JsonResponse({'success': True})
+        with db_transaction.atomic():
+            cart_item.delete()
+            refresh_cart_totals(cart)
+        remember_cart_count(request, cart)
+        return JsonResponse({
+            'success': True,
+            'cart_count': cart.items_count,
+            'cart_total': str(cart.total_price),
+        })
     except Exception as e:
         logger.error(f"Erreur remove_from_cart: {e}")
         return JsonResponse({'success': False, 'message': 'Erreur lors de la suppression'})
@@ -389,43 +724,35 @@ def remove_from_cart(request):
 
 def checkout(request):
     try:
-        cart = get_or_create_cart(request)
-        if cart.is_empty:
+        cart = get_cart(request)
+        if cart is None or cart.is_empty:
             messages.warning(request, 'Votre panier est vide')
             return redirect('cart_view')
         if request.method == 'POST':
+            customer = {
+                'customer_email': request.POST.get('email'),
+                'customer_phone': request.POST.get('phone'),
+                'customer_first_name': request.POST.get('first_name'),
+                'customer_last_name': request.POST.get('last_name'),
+                'shipping_address_line1': request.POST.get('address_line1'),
+                'shipping_address_line2': request.POST.get('address_line2', ''),
+                'shipping_city': request.POST.get('city'),
+                'shipping_state': request.POST.get('state'),
+                'shipping_postal_code': request.POST.get('postal_code'),
+                'shipping_country': request.POST.get('country'),
+            }
             try:
-                order = Order.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    customer_email=request.POST.get('email'),
-                    customer_phone=request.POST.get('phone'),
-                    customer_first_name=request.POST.get('first_name'),
-                    customer_last_name=request.POST.get('last_name'),
-                    shipping_address_line1=request.POST.get('address_line1'),
-                    shipping_address_line2=request.POST.get('address_line2', ''),
-                    shipping_city=request.POST.get('city'),
-                    shipping_state=request.POST.get('state'),
-                    shipping_postal_code=request.POST.get('postal_code'),
-                    shipping_country=request.POST.get('country'),
-                    subtotal=cart.get_total_price(),
-                    total_amount=cart.get_total_price(),
-                )
-                for cart_item in cart.items.all():
-                    OrderItem.objects.create(
-                        order=order,
-                        product=cart_item.product,
-                        variant=cart_item.variant,
-                        product_name=cart_item.product.name,
-                        product_price=cart_item.price,
-                        quantity=cart_item.quantity,
-                        total_price=cart_item.get_total_price()
-                    )
-                cart.items.all().delete()
+                order = place_order(cart, request.user, customer)
+                remember_cart_count(request, cart)
                 return redirect('shop_payment', order_id=order.id)
+            except OutOfStock:
+                messages.error(request, "Un ou plusieurs articles de votre panier ne sont plus disponibles en quantité suffisante")
+                return redirect('cart_view')
             except Exception as e:
                 logger.error(f"Erreur lors de la création de commande: {e}")
                 messages.error(request, 'Erreur lors de la création de la commande')
-        return render(request, 'shop/checkout.html', {'cart': cart})
+        cart_items = get_cart_items(cart)
+        return render(request, 'shop/checkout.html', {'cart': cart, 'cart_items': cart_items})
     except Exception as e:
         logger.error(f"Erreur checkout: {e}")
         messages.error(request, 'Erreur lors du processus de commande')
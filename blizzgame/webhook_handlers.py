@@ -12,6 +12,7 @@ from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.conf import settings
+from .inventory_utils import apply_shopify_inventory_level
 from .models import Order, ShopifyIntegration
 from .shopify_utils import update_order_from_shopify_webhook, upsert_product_from_shopify_payload, deactivate_product_by_shopify_id
 
@@ -122,6 +123,28 @@ def shopify_product_delete_webhook(request):
         logger.error(f"Erreur product_delete_webhook: {e}")
         return HttpResponse("Internal error", status=500)
 
+@csrf_exempt
+@require_POST
+def shopify_inventory_level_webhook(request):
+    """
+    Webhook inventory_levels/update : met à jour le stock local de l'article
+    """
+    try:
+        integration = ShopifyIntegration.objects.filter(is_active=True).first()
+        if not integration:
+            return HttpResponse("No active integration", status=400)
+        if integration.webhook_secret and not verify_shopify_webhook(request, integration.webhook_secret):
+            return HttpResponse("Invalid signature", status=401)
+        data = json.loads(request.body)
+        inventory_item_id = data.get('inventory_item_id')
+        if inventory_item_id:
+            updated = apply_shopify_inventory_level(inventory_item_id, data.get('available'))
+            logger.info(f"Niveau de stock Shopify {inventory_item_id}: {data.get('available')} ({updated} articles)")
+        return HttpResponse("OK", status=200)
+    except Exception as e:
+        logger.error(f"Erreur inventory_level_webhook: {e}")
+        return HttpResponse("Internal error", status=500)
+
 @csrf_exempt
 @require_POST
 def shopify_fulfillment_webhook(request):
@@ -2,6 +2,8 @@
 ASGI config for socialgame project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections go to the BLIZZ chat gateway.
+Serve with an ASGI server that supports WebSockets (uvicorn, daphne, ...).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'socialgame.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from blizzgame.chat_gateway import websocket_application  # noqa: E402  (after django.setup())
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
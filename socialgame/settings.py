@@ -74,6 +74,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'blizzgame.context_processors.notifications',
+                'blizzgame.context_processors.cart',
             ],
         },
     },